@@ -134,10 +134,10 @@ def show_about_page():
                 Uses <span class="highlight">PyPDF2</span> for PDFs and <span class="highlight">python-docx</span> for Word files.
             </li>
             <li><span class="highlight">Chunking</span><br>
-                Splits documents using <span class="highlight">LangChain’s RecursiveCharacterTextSplitter</span> with:
+                Splits documents in a single pass at <span class="highlight">section, page, line and sentence boundaries</span> with:
                 <ul class="feature-list">
-                    <li><span class="highlight">Chunk size:</span> 1000 tokens</li>
-                    <li><span class="highlight">Overlap:</span> 200 tokens</li>
+                    <li><span class="highlight">Chunk size:</span> 1000 characters</li>
+                    <li><span class="highlight">Overlap:</span> 200 characters (none across sections)</li>
                 </ul>
             </li>
             <li><span class="highlight">Embeddings</span><br>
@@ -187,7 +187,7 @@ def show_about_page():
 
     <div class="tech-card">
         <h3>🔗 LangChain</h3>
-        <p>- <span class="highlight">Key Tools:</span> RecursiveCharacterTextSplitter, FAISS, create_stuff_documents_chain</p>
+        <p>- <span class="highlight">Key Tools:</span> FAISS, create_stuff_documents_chain</p>
         <p>- <span class="highlight">Role:</span> Powers document parsing, chunking, embedding, and chain creation</p>
     </div>
 
@@ -0,0 +1,103 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from config import ANSWER_CACHE_SIZE, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL_SECONDS
+
+
+# Function to fingerprint the retrieved context chunks
+def context_key(docs):
+    digest = hashlib.sha256()
+    for doc in docs:
+        digest.update(doc.page_content.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+# Function to replay a cached answer as a stream of small pieces
+def replay(answer):
+    for piece in re.findall(r"\S+\s*|\s+", answer):
+        yield piece
+
+
+# Caches answers by question embedding. A new question reuses an answer when it
+# is within the cosine threshold of a cached question and the retrieved context
+# is identical. Entries expire after a TTL, measured with `clock`, and are
+# dropped on index changes.
+class AnswerCache:
+    def __init__(self, threshold=ANSWER_CACHE_THRESHOLD, ttl=ANSWER_CACHE_TTL_SECONDS, maxsize=ANSWER_CACHE_SIZE,
+                 clock=time.monotonic):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def _purge_expired(self):
+        cutoff = self.clock() - self.ttl
+        expired = [key for key, entry in self._entries.items() if entry["created"] < cutoff]
+        for key in expired:
+            del self._entries[key]
+
+    def lookup(self, question_vector, context, version):
+        vector = _unit(question_vector)
+        with self._lock:
+            self._check_version(version)
+            self._purge_expired()
+            best_key, best_score = None, self.threshold
+            for key, entry in self._entries.items():
+                if entry["context"] != context:
+                    continue
+                score = float(np.dot(vector, entry["vector"]))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return self._entries[best_key]["answer"]
+
+    def store(self, question_vector, context, version, answer):
+        with self._lock:
+            self._check_version(version)
+            self._entries[self._next_id] = {
+                "vector": _unit(question_vector),
+                "context": context,
+                "answer": answer,
+                "created": self.clock(),
+            }
+            self._next_id += 1
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
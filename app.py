@@ -1,384 +1,461 @@
 import streamlit as st
-from PyPDF2 import PdfReader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import asyncio
 import os
-import shutil
 import datetime
-from docx import Document
-
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
-import google.generativeai as genai
-from langchain_community.vectorstores import FAISS
-from langchain_core.prompts import PromptTemplate
-from dotenv import load_dotenv
-import io
+import functools
+import re
+import textwrap
+import uuid
 
 from about import show_about_page
+from config import ANSWER_CACHE_ENABLED, SHARED_NAMESPACE
+from engine import Engine
+from jobs import DONE, FAILED, QUEUED, RUNNING, get_job_queue
+from streaming import coalesce
+from telemetry import span, telemetry
+
+# Cyberpunk styling of the main page
+APP_CSS = """
+<style>
+    /* Sidebar styles */
+    .stSidebar {
+        border-right: 2px solid #ffe600 !important;
+    }
 
-# Load .env only if running locally
-load_dotenv()
-
-# Get API key from Streamlit secrets if available, else fallback to .env
-try:
-    api_key = st.secrets["GOOGLE_API_KEY"]
-except Exception:
-    st.warning("Using API key from .env file")
-    api_key = os.getenv("GOOGLE_API_KEY")
-
-# Configure Google Generative AI
-genai.configure(api_key=api_key)
-
-# Function to extract text from uploaded files
-def extract_text_from_file(uploaded_file):
-    text = ""
-    if uploaded_file.type == "application/pdf":
-        pdf_reader = PdfReader(uploaded_file)
-        for page in pdf_reader.pages:
-            text += page.extract_text()
-    elif uploaded_file.type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-        doc = Document(io.BytesIO(uploaded_file.getvalue()))
-        for para in doc.paragraphs:
-            text += para.text + "\n"
-    return text
-
-# Function to process multiple files
-def files_to_text(files):
-    text = ""
-    for file in files:
-        text += extract_text_from_file(file)
-    return text
-
-# Function to split text into chunks
-def get_text_chunks(text):
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-    )
-    return text_splitter.split_text(text)
+    .stFileUploader {
+        border: 2px solid #ffe600 !important;
+        border-radius: 18px !important;
+        animation: cyber-border-anim 3s linear infinite;
+        box-shadow: 0 0 18px 2px rgba(255, 230, 0, 0.4);
+        padding: 12px 10px 12px 10px;
+        background: rgba(40, 40, 10, 0.12);
+        margin-bottom: 18px;
+        transition: box-shadow 0.3s;
+    }
 
-# Function to create a vector store from text chunks
-def get_vectorstore(text_chunks):
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/gemini-embedding-001")
-    vectorstore = FAISS.from_texts(text_chunks, embeddings)
-    vectorstore.save_local("faiss_index")    
+    .stFileUploader:hover {
+        box-shadow: 0 0 32px 6px rgba(255, 230, 0, 0.7);
+        border: 2px solid #ffae00 !important;
+    }
 
-def build_prompt_and_model():
-    Prompt_template = """
-        You are a friendly assistant that can understand and reply in English, Hinglish, and any local language supported by Gemini. 
-        Always answer based on the provided context; if the answer is not in the context, say exactly "Answer is not available in the provided context" and do not fabricate details.
-        Keep the tone concise, helpful, and add fitting emojis for warmth and clarity. If the user greets, thanks, or chats casually, respond briefly and politely.
+    div.stButton > button:first-child {
+        background: linear-gradient(90deg, #ffe600, #ffae00) !important;
+        color: #222 !important;
+        border: none !important;
+        border-radius: 25px !important;
+        padding: 10px 25px !important;
+        font-weight: bold;
+        transition: all 0.3s ease;
+        width: 100%;
+        margin: 8px 0 !important;
+        box-shadow: 0 0 10px rgba(255, 230, 0, 0.5) !important;
+        display: block !important;
+    }
 
-        Context:
-        {context}
+    div.stButton > button:first-child:hover {
+        transform: translateY(-3px);
+        box-shadow: 0 0 20px rgba(255, 230, 0, 0.8) !important;
+    }
 
-        Question:
-        {question}
+    div.stDownloadButton > button:first-child {
+        background: linear-gradient(90deg, #ffe600, #ffae00) !important;
+        color: #222 !important;
+        border: none !important;
+        border-radius: 25px !important;
+        padding: 10px 25px !important;
+        font-weight: bold;
+        transition: all 0.3s ease;
+        width: 100%;
+        margin: 8px 0 !important;
+        box-shadow: 0 0 10px rgba(255, 230, 0, 0.5) !important;
+        display: block !important;
+    }
 
-        Answer:
-        """
+    div.stDownloadButton > button:first-child:hover {
+        transform: translateY(-3px);
+        box-shadow: 0 0 20px rgba(255, 230, 0, 0.8) !important;
+    }
 
-    model = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.3)
-    prompt = PromptTemplate(template=Prompt_template, input_variables=["context", "question"])
-    return prompt, model
-
-# Function to handle user input and generate streaming response
-def streaming_user_input(user_question):
-    if not os.path.exists("faiss_index"):
-        yield "Error: Please upload and process documents first."
-        return
-
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/gemini-embedding-001")
-    new_db = FAISS.load_local("faiss_index", embeddings, allow_dangerous_deserialization=True)
-    docs = new_db.similarity_search(user_question, k=3)
-    prompt, model = build_prompt_and_model()
-
-    # Combine retrieved docs into a single context string
-    context_text = "\n\n".join(doc.page_content for doc in docs)
-    full_prompt = prompt.format(context=context_text, question=user_question)
-
-    # Stream model output directly
-    for chunk in model.stream(full_prompt):
-        # Prefer plain content over repr to keep output human-friendly
-        content = getattr(chunk, "content", None)
-        if content is None:
-            content = str(chunk)
-        yield content
-
-# Function to export chat with timestamps
-def export_chat():
-    if not st.session_state.messages:
-        return None
-    
-    chat_text = ""
-    for message in st.session_state.messages:
-        timestamp = message.get("timestamp", "")
-        role = message["role"].capitalize()
-        content = message["content"]
-        chat_text += f"{timestamp}{role}: {content}\n\n"
-    
-    return chat_text
+    /* Ensure sidebar action buttons span full width (but do not touch the uploader) */
+    [data-testid="stSidebar"] div.stButton > button:first-child,
+    [data-testid="stSidebar"] div.stDownloadButton > button:first-child {
+        width: 100% !important;
+        display: block !important;
+    }
 
-def main():
-    if "page" not in st.session_state:
-        st.session_state.page = "main"
+    .cyber-header {
+        font-family: 'Arial', sans-serif;
+        font-size: 2.8rem;
+        text-align: center;
+        background: linear-gradient(270deg, #ffe600, #ffae00, #fff700, #ffd700);
+        background-size: 300% 300%;
+        -webkit-background-clip: text;
+        -webkit-text-fill-color: transparent;
+        text-shadow: 0 0 10px rgba(255, 230, 0, 0.7);
+        margin-bottom: 1.5rem;
+        animation: gradient-shift 3s ease infinite, glow-pulse 1.5s ease infinite alternate;
+    }
 
-    st.set_page_config(page_title="DocBlinker", page_icon=":book:", layout="wide")
+    @keyframes gradient-shift {
+        0% { background-position: 0% 50%; }
+        50% { background-position: 100% 50%; }
+        100% { background-position: 0% 50%; }
+    }
 
-    # Add cyberpunk styling
-    st.markdown("""
-    <style>
-        /* Sidebar styles */
-        .stSidebar {
-            border-right: 2px solid #ffe600 !important;
-        }
+    @keyframes glow-pulse {
+        0% { text-shadow: 0 0 10px rgba(255, 230, 0, 0.7); }
+        100% { text-shadow: 0 0 20px rgba(255, 230, 0, 0.9), 
+                         0 0 30px rgba(255, 174, 0, 0.7),
+                         0 0 40px rgba(255, 247, 0, 0.5); }
+    }
 
-        .stFileUploader {
-            border: 2px solid #ffe600 !important;
-            border-radius: 18px !important;
-            animation: cyber-border-anim 3s linear infinite;
-            box-shadow: 0 0 18px 2px rgba(255, 230, 0, 0.4);
-            padding: 12px 10px 12px 10px;
-            background: rgba(40, 40, 10, 0.12);
-            margin-bottom: 18px;
-            transition: box-shadow 0.3s;
-        }
+    .chat-management-title {
+        font-family: 'Arial', sans-serif;
+        font-size: 1.4rem;
+        color: #ffe600;
+        text-align: center;
+        letter-spacing: 2px;
+        margin: 15px 0;
+    }
 
-        .stFileUploader:hover {
-            box-shadow: 0 0 32px 6px rgba(255, 230, 0, 0.7);
-            border: 2px solid #ffae00 !important;
-        }
-        
-        div.stButton > button:first-child {
-            background: linear-gradient(90deg, #ffe600, #ffae00) !important;
-            color: #222 !important;
-            border: none !important;
-            border-radius: 25px !important;
-            padding: 10px 25px !important;
-            font-weight: bold;
-            transition: all 0.3s ease;
-            width: 100%;
-            margin: 8px 0 !important;
-            box-shadow: 0 0 10px rgba(255, 230, 0, 0.5) !important;
-            display: block !important;
-        }
-        
-        div.stButton > button:first-child:hover {
-            transform: translateY(-3px);
-            box-shadow: 0 0 20px rgba(255, 230, 0, 0.8) !important;
-        }
-        
-        div.stDownloadButton > button:first-child {
-            background: linear-gradient(90deg, #ffe600, #ffae00) !important;
-            color: #222 !important;
-            border: none !important;
-            border-radius: 25px !important;
-            padding: 10px 25px !important;
-            font-weight: bold;
-            transition: all 0.3s ease;
-            width: 100%;
-            margin: 8px 0 !important;
-            box-shadow: 0 0 10px rgba(255, 230, 0, 0.5) !important;
-            display: block !important;
-        }
-        
-        div.stDownloadButton > button:first-child:hover {
-            transform: translateY(-3px);
-            box-shadow: 0 0 20px rgba(255, 230, 0, 0.8) !important;
-        }
+    /* Main area styles - REMOVED BACKGROUNDS */
+    .stApp {
+        color: #fffbe0 !important;
+    }
 
-        /* Ensure sidebar action buttons span full width (but do not touch the uploader) */
-        [data-testid="stSidebar"] div.stButton > button:first-child,
-        [data-testid="stSidebar"] div.stDownloadButton > button:first-child {
-            width: 100% !important;
-            display: block !important;
-        }
-        
-        .cyber-header {
-            font-family: 'Arial', sans-serif;
-            font-size: 2.8rem;
-            text-align: center;
-            background: linear-gradient(270deg, #ffe600, #ffae00, #fff700, #ffd700);
-            background-size: 300% 300%;
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            text-shadow: 0 0 10px rgba(255, 230, 0, 0.7);
-            margin-bottom: 1.5rem;
-            animation: gradient-shift 3s ease infinite, glow-pulse 1.5s ease infinite alternate;
-        }
-        
-        @keyframes gradient-shift {
-            0% { background-position: 0% 50%; }
-            50% { background-position: 100% 50%; }
-            100% { background-position: 0% 50%; }
-        }
-        
-        @keyframes glow-pulse {
-            0% { text-shadow: 0 0 10px rgba(255, 230, 0, 0.7); }
-            100% { text-shadow: 0 0 20px rgba(255, 230, 0, 0.9), 
-                             0 0 30px rgba(255, 174, 0, 0.7),
-                             0 0 40px rgba(255, 247, 0, 0.5); }
-        }
-        
-        .chat-management-title {
-            font-family: 'Arial', sans-serif;
-            font-size: 1.4rem;
-            color: #ffe600;
-            text-align: center;
-            letter-spacing: 2px;
-            margin: 15px 0;
-        }
-        
-        /* Main area styles - REMOVED BACKGROUNDS */
-        .stApp {
-            color: #fffbe0 !important;
-        }
-        
-        .main-header {
-            font-family: 'Arial', sans-serif;
-            font-size: 2.5rem;
-            text-align: center;
-            background: linear-gradient(270deg, #ffe600, #ffae00, #fff700, #ffd700);
-            background-size: 300% 300%;
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            text-shadow: 0 0 15px rgba(255, 230, 0, 0.8);
-            margin: 1rem 0 2rem 0;
-            padding: 0.5rem;
-            animation: gradient-shift 3s ease infinite, glow-pulse 1.5s ease infinite alternate;
-        }
-        
-        /* Message styles - UPDATED FOR ALIGNMENT */
-        .user-message {
-            border-right: 4px solid #ffe600 !important;
-            border-radius: 15px 0 15px 15px !important;
-            padding: 15px !important;
-            margin: 15px 0 15px auto !important;
-            color: inherit !important;
-            max-width: 70%;
-            width: fit-content;
-            text-align: right;
-            background-color: rgba(255, 255, 224, 0.1) !important;
-        }
-        
-        .assistant-message {
-            border-left: 4px solid #ffae00 !important;
-            border-radius: 0 15px 15px 15px !important;
-            padding: 15px !important;
-            margin: 15px auto 15px 0 !important;
-            color: inherit !important;
-            max-width: 70%;  
-            width: fit-content; 
-            text-align: left; 
-            background-color: rgba(255, 255, 224, 0.08) !important; 
-        }
-        
-        .chat-timestamp {
-            font-size: 0.75rem !important;
-            color: #ffe600 !important;
-            margin-bottom: 5px !important;
-            text-shadow: 0 0 5px rgba(255, 230, 0, 0.7) !important;
-        }
-        
-        /* User timestamp specific style */
-        .user-timestamp {
-            display: flex;
-            justify-content: flex-end; /* Align to the right */
-            width: 100%;
+    .main-header {
+        font-family: 'Arial', sans-serif;
+        font-size: 2.5rem;
+        text-align: center;
+        background: linear-gradient(270deg, #ffe600, #ffae00, #fff700, #ffd700);
+        background-size: 300% 300%;
+        -webkit-background-clip: text;
+        -webkit-text-fill-color: transparent;
+        text-shadow: 0 0 15px rgba(255, 230, 0, 0.8);
+        margin: 1rem 0 2rem 0;
+        padding: 0.5rem;
+        animation: gradient-shift 3s ease infinite, glow-pulse 1.5s ease infinite alternate;
+    }
+
+    /* Message styles - UPDATED FOR ALIGNMENT */
+    .user-message {
+        border-right: 4px solid #ffe600 !important;
+        border-radius: 15px 0 15px 15px !important;
+        padding: 15px !important;
+        margin: 15px 0 15px auto !important;
+        color: inherit !important;
+        max-width: 70%;
+        width: fit-content;
+        text-align: right;
+        background-color: rgba(255, 255, 224, 0.1) !important;
+    }
+
+    .assistant-message {
+        border-left: 4px solid #ffae00 !important;
+        border-radius: 0 15px 15px 15px !important;
+        padding: 15px !important;
+        margin: 15px auto 15px 0 !important;
+        color: inherit !important;
+        max-width: 70%;  
+        width: fit-content; 
+        text-align: left; 
+        background-color: rgba(255, 255, 224, 0.08) !important; 
+    }
+
+    .chat-timestamp {
+        font-size: 0.75rem !important;
+        color: #ffe600 !important;
+        margin-bottom: 5px !important;
+        text-shadow: 0 0 5px rgba(255, 230, 0, 0.7) !important;
+    }
+
+    /* User timestamp specific style */
+    .user-timestamp {
+        display: flex;
+        justify-content: flex-end; /* Align to the right */
+        width: 100%;
+    }
+
+    /* Input styling - REMOVED BACKGROUND */
+    .stChatInput {
+        background: transparent !important;
+        border: 2px solid #ffe600 !important;
+        border-radius: 25px !important;
+        # padding: 15px 20px !important;
+        box-shadow: 0 0 15px rgba(255, 230, 0, 0.3) inset, 0 0 10px rgba(255, 230, 0, 0.2) !important;
+        margin-top: 20px;
+        max-width: 800px;
+        margin-left: auto !important;
+        margin-right: auto !important;
+    }
+
+    .stChatInput:focus-within {
+        box-shadow: 0 0 20px rgba(255, 230, 0, 0.5) inset, 0 0 15px rgba(255, 230, 0, 0.4) !important;
+        border: 2px solid #ffae00 !important;
+    }
+
+    .stTextInput input {
+        color: #ffe600 !important;
+        background: transparent !important;
+        font-size: 1.1rem !important;
+    }
+
+    .stTextInput input::placeholder {
+        color: #ffe600 !important;
+        opacity: 0.8 !important;
+    }
+
+    .stChatMessage {
+        margin-bottom: 1.5rem !important;
+    }
+
+    /* Added for message spacing */
+    .message-container {
+        margin-bottom: 20px;
+        width: 100%;
+    }
+
+    /* Main content container */
+    .main-content {
+        max-width: 1200px;
+        margin: 0 auto;
+        padding: 20px; /* Added top/bottom padding */
+    }
+
+    /* Chat area container */
+    .chat-area {
+        padding: 20px;
+        margin: 0 20px; /* Added horizontal margin */
+    }
+
+    /* Adjustments for smaller screens */
+    @media (max-width: 768px) {
+        .user-message, .assistant-message {
+            max-width: 85%;
         }
-        
-        /* Input styling - REMOVED BACKGROUND */
+
         .stChatInput {
-            background: transparent !important;
-            border: 2px solid #ffe600 !important;
-            border-radius: 25px !important;
-            # padding: 15px 20px !important;
-            box-shadow: 0 0 15px rgba(255, 230, 0, 0.3) inset, 0 0 10px rgba(255, 230, 0, 0.2) !important;
-            margin-top: 20px;
-            max-width: 800px;
-            margin-left: auto !important;
-            margin-right: auto !important;
+            max-width: 95%;
         }
-        
-        .stChatInput:focus-within {
-            box-shadow: 0 0 20px rgba(255, 230, 0, 0.5) inset, 0 0 15px rgba(255, 230, 0, 0.4) !important;
-            border: 2px solid #ffae00 !important;
-        }
-        
-        .stTextInput input {
-            color: #ffe600 !important;
-            background: transparent !important;
-            font-size: 1.1rem !important;
-        }
-        
-        .stTextInput input::placeholder {
-            color: #ffe600 !important;
-            opacity: 0.8 !important;
-        }
-        
-        .stChatMessage {
-            margin-bottom: 1.5rem !important;
-        }
-        
-        /* Added for message spacing */
-        .message-container {
-            margin-bottom: 20px;
-            width: 100%;
-        }
-        
-        /* Main content container */
+
         .main-content {
-            max-width: 1200px;
-            margin: 0 auto;
-            padding: 20px; /* Added top/bottom padding */
+            padding: 10px;
         }
-        
-        /* Chat area container */
+
         .chat-area {
-            padding: 20px;
-            margin: 0 20px; /* Added horizontal margin */
+            padding: 10px;
+            margin: 0 10px;
         }
-        
-        /* Adjustments for smaller screens */
-        @media (max-width: 768px) {
-            .user-message, .assistant-message {
-                max-width: 85%;
-            }
-            
-            .stChatInput {
-                max-width: 95%;
-            }
-            
-            .main-content {
-                padding: 10px;
-            }
-            
-            .chat-area {
-                padding: 10px;
-                margin: 0 10px;
-            }
-        }
-    </style>
-    """, unsafe_allow_html=True)
-
-    # Add CSS for sidebar responsiveness
-    st.markdown("""
-    <style>
-    [data-testid="stSidebar"][aria-expanded="true"] {
-        min-width: 425px;
     }
-    @media (max-width: 900px) {
-        [data-testid="stSidebar"][aria-expanded="true"] {
-            min-width: 100vw !important;
-        }
+</style>
+"""
+
+# CSS for sidebar responsiveness
+SIDEBAR_CSS = """
+<style>
+[data-testid="stSidebar"][aria-expanded="true"] {
+    min-width: 425px;
+}
+@media (max-width: 900px) {
+    [data-testid="stSidebar"][aria-expanded="true"] {
+        min-width: 100vw !important;
     }
-    </style>
-    """, unsafe_allow_html=True)
+}
+</style>
+"""
+
+# Function to shrink a <style> block: drops comments and collapses whitespace
+@st.cache_data(show_spinner=False)
+def minify_css(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    return re.sub(r"\s+", " ", css).strip()
+
+# Function to make the Google API key available to the Gemini clients.
+# Prefers Streamlit secrets, falling back to the environment / .env file.
+def configure_api_key():
+    try:
+        api_key = st.secrets["GOOGLE_API_KEY"]
+    except Exception:
+        st.warning("Using API key from .env file")
+        api_key = os.getenv("GOOGLE_API_KEY")
+
+    # The Gemini clients read the key from the environment when first created,
+    # so the SDK itself is not imported (or configured) here
+    if api_key:
+        os.environ["GOOGLE_API_KEY"] = api_key
+
+# Each browser session gets its own index namespace, unless the app serves a
+# shared collection published by a separate ingestion worker
+def get_engine():
+    if SHARED_NAMESPACE:
+        return Engine(SHARED_NAMESPACE)
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = get_session_id()
+    return Engine(st.session_state.session_id)
+
+# Function to get the session's namespace id. It is kept in the URL so a browser
+# refresh reconnects to the same index and its background ingestion jobs. Only
+# ids of the form the app generates are accepted, so a URL cannot point a
+# session at the default namespace or a CLI collection and upload into or
+# reset it.
+def get_session_id():
+    session_id = st.query_params.get("session")
+    if not is_session_id(session_id):
+        session_id = uuid.uuid4().hex
+        st.query_params["session"] = session_id
+    return session_id
+
+# Function to check that a value is a random (version 4) uuid in hex, and not
+# the name of a pinned collection
+def is_session_id(value):
+    try:
+        parsed = uuid.UUID(hex=value)
+    except (TypeError, ValueError):
+        return False
+    if parsed.hex != value or parsed.version != 4:
+        return False
+    return value != SHARED_NAMESPACE and not Engine(value).is_pinned()
+
+# Shows the session's ingestion jobs. Only a session with a queued or running
+# job polls the job table; the state is read once when the session starts (a
+# refreshed page may reconnect to running jobs) and set again on submit.
+def show_ingest_jobs():
+    if "ingest_jobs_active" not in st.session_state:
+        jobs = get_job_queue().jobs(get_engine().namespace, limit=5)
+        st.session_state.ingest_jobs_active = any(job["status"] in (QUEUED, RUNNING) for job in jobs)
+        st.session_state.reported_jobs = {job["id"] for job in jobs if job["status"] in (DONE, FAILED)}
+    if st.session_state.ingest_jobs_active:
+        poll_ingest_jobs()
+
+# Polls the session's active jobs every second without re-running the rest of
+# the page. The chat keeps answering from the current index until a job
+# publishes the new version.
+@st.fragment(run_every=1.0)
+def poll_ingest_jobs():
+    jobs = get_job_queue().jobs(get_engine().namespace, limit=5)
+    active = [job for job in jobs if job["status"] in (QUEUED, RUNNING)]
+    for job in active:
+        names = ", ".join(file["name"] for file in job["files"])
+        if job["status"] == QUEUED:
+            st.caption(f"Queued: {names}")
+            continue
+        done = sum(pages for pages, _ in job["progress"].values())
+        total = sum(total for _, total in job["progress"].values())
+        st.progress(done / total if total else 0.0, text=f"Processing {names}: page {done}/{total}")
+
+    # Report jobs that finished since the last check
+    finished = [job for job in jobs if job["status"] in (DONE, FAILED)]
+    new = [job for job in finished if job["id"] not in st.session_state.reported_jobs]
+    for job in new:
+        st.session_state.reported_jobs.add(job["id"])
+        if job["status"] == DONE:
+            result = job["result"]
+            st.session_state.ingest_message = (
+                f"Documents processed successfully! Added {result['added']}, "
+                f"removed {result['removed']}, unchanged {result['unchanged']}."
+            )
+            st.session_state.last_ingest_trace = result["timings"]
+        else:
+            st.session_state.ingest_error = f"Processing failed: {job['error']}"
+
+    # Re-run the whole page so the document picker reflects the new index
+    # version, and so polling stops once no job is left
+    if not active:
+        st.session_state.ingest_jobs_active = False
+    if new or not active:
+        st.rerun()
+
+# Function to stream an answer into the assistant's chat bubble. Tokens are
+# coalesced so the bubble is re-rendered on a time/size budget, not per token.
+# If Streamlit stops the run (new question, session closed), leaving the loop
+# closes the stream and cancels the model request.
+async def stream_answer(placeholder, question, response_timestamp, use_answer_cache, sources=None):
+    parts = []
+    stream = get_engine().answer_async(question, use_answer_cache=use_answer_cache, sources=sources)
+    async for text in coalesce(stream):
+        parts.append(text)
+        placeholder.markdown(message_html("assistant", "".join(parts), response_timestamp), unsafe_allow_html=True)
+    return "".join(parts)
+
+# Function to render one chat bubble as HTML
+def message_html(role, content, timestamp):
+    if role == "user":
+        html = f"""
+        <div class="message-container">
+            <div class="user-message">
+                <div class="user-timestamp">
+                    <div class="chat-timestamp">{timestamp}USER</div>
+                </div>
+                {content}
+            </div>
+        </div>
+        """
+    else:
+        html = f"""
+        <div class="message-container">
+            <div class="assistant-message">
+                <div class="chat-timestamp">{timestamp}ASSISTANT</div>
+                {content}
+            </div>
+        </div>
+        """
+    return textwrap.dedent(html)
+
+# Function to add a message to the chat history. Each bubble is rendered once
+# and appended to the cached history HTML, so a rerun costs the same however
+# long the conversation is.
+def add_message(role, content, timestamp):
+    st.session_state.messages.append({"role": role, "content": content, "timestamp": timestamp})
+    st.session_state.chat_html += message_html(role, content, timestamp)
+
+def clear_messages():
+    st.session_state.messages = []
+    st.session_state.chat_html = ""
+
+# Function to export chat with timestamps. It is handed to the download button
+# with the message list bound, and only runs when the user downloads.
+def export_chat(messages):
+    return "".join(
+        f"{message.get('timestamp', '')}{message['role'].capitalize()}: {message['content']}\n\n"
+        for message in messages
+    )
+
+# Button callbacks run before the next script run, so these actions take
+# effect without forcing an extra rerun
+def go_to_page(page):
+    st.session_state.page = page
+
+def clear_chat():
+    clear_messages()
+    st.session_state.chat_cleared = True
+
+def reset_session():
+    if not SHARED_NAMESPACE:
+        # Stop the session's ingestion jobs so they do not republish the index
+        queue = get_job_queue()
+        for job in queue.jobs(get_engine().namespace):
+            queue.cancel(job["id"])
+        get_engine().clear()
+    clear_messages()
+    st.session_state.show_reset_message = True
+
+def main():
+    if "page" not in st.session_state:
+        st.session_state.page = "main"
+
+    st.set_page_config(page_title="DocBlinker", page_icon=":book:", layout="wide")
+    with span("page_setup"):
+        configure_api_key()
+
+        # Add cyberpunk styling and sidebar responsiveness. Streamlit only keeps
+        # elements emitted by the current run, so the styles are re-sent on every
+        # rerun; they are minified once per process to keep that payload small.
+        st.markdown(minify_css(APP_CSS), unsafe_allow_html=True)
+        st.markdown(minify_css(SIDEBAR_CSS), unsafe_allow_html=True)
 
     if st.session_state.page == "about":
         show_about_page()
-        if st.button("⬅ Back to Chat", key="back_btn"):
-            st.session_state.page = "main"
-            st.rerun()
+        st.button("⬅ Back to Chat", key="back_btn", on_click=go_to_page, args=("main",))
     else:
         # Create main content container
         st.markdown('<div class="main-content">', unsafe_allow_html=True)
@@ -388,60 +465,33 @@ def main():
 
         # Initialize session state
         if 'cleared' not in st.session_state:
-            if os.path.exists("faiss_index"):
-                shutil.rmtree("faiss_index")
+            st.session_state.session_id = get_session_id()
             st.session_state.cleared = True
-            st.session_state.messages = []
+            clear_messages()
         
         # Create chat container with margins
         st.markdown('<div class="chat-area">', unsafe_allow_html=True)
         
-        # Display chat messages with custom styling
-        for message in st.session_state.messages:
-            timestamp = message.get("timestamp", "")
-            if message["role"] == "user":
-                st.markdown(f"""
-                <div class="message-container">
-                    <div class="user-message">
-                        <div class="user-timestamp">
-                            <div class="chat-timestamp">{timestamp}USER</div>
-                        </div>
-                        {message["content"]}
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
-            else:
-                st.markdown(f"""
-                <div class="message-container">
-                    <div class="assistant-message">
-                        <div class="chat-timestamp">{timestamp}ASSISTANT</div>
-                        {message["content"]}
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
+        # Display the chat history as a single block with custom styling
+        if st.session_state.chat_html:
+            st.markdown(st.session_state.chat_html, unsafe_allow_html=True)
         
         st.markdown('</div>', unsafe_allow_html=True) 
 
         # Input at bottom
         user_question = st.chat_input("Enter your question about the documents...", key="user_input")
         
-        # Handle user input
+        # Handle user input: show the question straight away and answer it in
+        # this same run
         if user_question:
             timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S - ")
-            # Add user message to chat history
-            st.session_state.messages.append({
-                "role": "user", 
-                "content": user_question,
-                "timestamp": timestamp
-            })
-            
-            # Rerun to immediately show user message
-            st.rerun()
+            add_message("user", user_question, timestamp)
+            st.markdown(message_html("user", user_question, timestamp), unsafe_allow_html=True)
 
-        # Process AI response after displaying user message
+        # Answer the last question; this also picks up a question whose run
+        # was stopped before the answer finished
         if st.session_state.messages and st.session_state.messages[-1]["role"] == "user":
             user_question = st.session_state.messages[-1]["content"]
-            timestamp = st.session_state.messages[-1]["timestamp"]
 
             response_timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S - ")
 
@@ -450,24 +500,16 @@ def main():
             # Show spinner and stream output in the same chat bubble
             with assistant_placeholder:
                 with st.spinner("Assistant is typing..."):
-                    streamed_text = ""
-                    for chunk in streaming_user_input(user_question):
-                        streamed_text += chunk
-                        assistant_placeholder.markdown(f'''
-                        <div class="message-container">
-                            <div class="assistant-message">
-                                <div class="chat-timestamp">{response_timestamp}ASSISTANT</div>
-                                {streamed_text}
-                            </div>
-                        </div>
-                        ''', unsafe_allow_html=True)
-            # Add the final response to chat history
-            st.session_state.messages.append({
-                "role": "assistant",
-                "content": streamed_text,
-                "timestamp": response_timestamp
-            })
-            st.rerun()
+                    use_answer_cache = st.session_state.get("use_answer_cache", ANSWER_CACHE_ENABLED)
+                    sources = st.session_state.get("source_filter") or None
+                    with telemetry.trace("turn") as trace:
+                        streamed_text = asyncio.run(stream_answer(
+                            assistant_placeholder, user_question, response_timestamp, use_answer_cache, sources
+                        ))
+                    st.session_state.last_turn_trace = trace.to_dict()
+            # Add the final response to chat history; the streamed bubble
+            # already shows it, so there is no need to rerun
+            add_message("assistant", streamed_text, response_timestamp)
         
         # Close main content container
         st.markdown('</div>', unsafe_allow_html=True)
@@ -476,74 +518,151 @@ def main():
             # DocBlinker header
             st.markdown('<div class="cyber-header">DOCBLINKER</div>', unsafe_allow_html=True)
             
-            uploaded_files = st.file_uploader("Upload documents (PDF or Word) and click Submit & Process", 
-                                            type=["pdf", "docx"], accept_multiple_files=True)
+            if SHARED_NAMESPACE:
+                st.caption(f"Answering from the shared '{SHARED_NAMESPACE}' collection.")
+                uploaded_files = None
+            else:
+                uploaded_files = st.file_uploader("Upload documents (PDF or Word) and click Submit & Process", 
+                                                type=["pdf", "docx"], accept_multiple_files=True)
             
-            # Process button
-            if st.button("Submit and Process", key="process_btn", use_container_width=True):
-                with st.spinner("Processing..."):
-                    if uploaded_files:
-                        if os.path.exists("faiss_index"):
-                            shutil.rmtree("faiss_index")
-
-                        text = files_to_text(uploaded_files)
-                        text_chunks = get_text_chunks(text)
-                        get_vectorstore(text_chunks)
-                        st.success("Documents processed successfully!")
-                    else:
-                        st.error("Please upload at least one document.")
+            # Process button: ingestion runs as a background job
+            if not SHARED_NAMESPACE and st.button("Submit and Process", key="process_btn", use_container_width=True):
+                if uploaded_files:
+                    get_job_queue().submit(get_engine().namespace, uploaded_files)
+                    # Start polling; show_ingest_jobs() below runs in this same script run
+                    st.session_state.ingest_jobs_active = True
+                else:
+                    st.error("Please upload at least one document.")
+            if not SHARED_NAMESPACE:
+                show_ingest_jobs()
+            if st.session_state.get("ingest_message"):
+                st.success(st.session_state.pop("ingest_message"))
+            if st.session_state.get("ingest_error"):
+                st.error(st.session_state.pop("ingest_error"))
+
+            # Restrict answers to some of the processed documents
+            indexed_sources = get_engine().sources()
+            st.session_state.source_filter = [
+                source for source in st.session_state.get("source_filter", []) if source in indexed_sources
+            ]
+            if indexed_sources:
+                st.multiselect(
+                    "Search only these documents",
+                    indexed_sources,
+                    key="source_filter",
+                    placeholder="All documents",
+                )
 
             # Chat management section
             st.divider()
             st.markdown('<div class="chat-management-title">CHAT MANAGEMENT</div>', unsafe_allow_html=True)
 
-            # Export chat button
-            chat_text = export_chat()
-
-            if chat_text:
+            # Export chat button: the text is only built when the user downloads it
+            if st.session_state.messages:
                 st.download_button(
                     label="Export Chat",
-                    data=chat_text,
+                    data=functools.partial(export_chat, st.session_state.messages),
                     file_name=f"chat_history_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
                     mime="text/plain",
                     key="download_chat",
                     use_container_width=True,
-                    on_click=lambda: st.toast("Chat history cleared!", icon="✅"),
+                    on_click="ignore",
                 )       
             
             # Clear chat button
-            if st.button("Clear Chat", key="clear_chat", use_container_width=True):
-                st.session_state.messages = []
-                st.session_state.chat_cleared = True
-                st.toast("Chat history cleared!", icon="✅")
-                st.rerun()
+            st.button("Clear Chat", key="clear_chat", use_container_width=True, on_click=clear_chat)
 
-            # Show success message after rerun
+            # Show success message after clearing
             if st.session_state.get("chat_cleared", False):
                 st.toast("Chat history cleared!", icon="✅")
                 st.session_state.chat_cleared = False 
         
             # Reset session button
-            if st.button("Reset Session", key="reset_session", use_container_width=True):
-                if os.path.exists("faiss_index"):
-                    shutil.rmtree("faiss_index")
-                st.session_state.messages = []
-                st.session_state.show_reset_message = True
-                st.rerun()
+            st.button("Reset Session", key="reset_session", use_container_width=True, on_click=reset_session)
 
             # Show reset message after rerun
             if st.session_state.get("show_reset_message", False):
                 st.toast("Session reset complete!", icon="✅")
                 st.session_state.show_reset_message = False
 
+            # Index cache statistics
+            with st.expander("Index Cache"):
+                st.checkbox(
+                    "Reuse answers for repeated questions",
+                    value=ANSWER_CACHE_ENABLED,
+                    key="use_answer_cache",
+                )
+                index_manager = get_engine().index_manager
+                stats = index_manager.stats()
+                st.caption(
+                    f"Hits: {stats['hits']} | Misses: {stats['misses']} | "
+                    f"Hit rate: {stats['hit_rate']:.0%}"
+                )
+                st.caption(
+                    f"Index type: {stats['index_type'] or '-'} | "
+                    f"Last load: {stats['last_load_seconds']:.2f}s | "
+                    f"Load time saved: {stats['load_seconds_saved']:.2f}s"
+                )
+                # Only once this process has embedded something: building the
+                # client imports the Gemini SDK
+                embeddings = get_engine().registry.loaded_embeddings()
+                if embeddings is not None:
+                    cache_stats = embeddings.cache.stats()
+                    st.caption(
+                        f"Embedding cache: {cache_stats['entries']}/{cache_stats['max_entries']} entries | "
+                        f"Hit rate: {cache_stats['hit_rate']:.0%}"
+                    )
+                    scheduler_stats = embeddings.embeddings.stats()
+                    st.caption(
+                        f"Embedding throughput: {scheduler_stats['chunks_per_second']:.1f} chunks/s | "
+                        f"Requests: {scheduler_stats['requests']} | Retries: {scheduler_stats['retries']}"
+                    )
+                retrieval_stats = index_manager.retrieval_cache.stats()
+                st.caption(
+                    f"Retrieval cache: {retrieval_stats['results']['size']}/{retrieval_stats['results']['maxsize']} | "
+                    f"Result hit rate: {retrieval_stats['results']['hit_rate']:.0%} | "
+                    f"Query embedding hit rate: {retrieval_stats['query_vectors']['hit_rate']:.0%}"
+                )
+                answer_stats = index_manager.answer_cache.stats()
+                st.caption(
+                    f"Answer cache: {answer_stats['size']}/{answer_stats['maxsize']} | "
+                    f"Hit rate: {answer_stats['hit_rate']:.0%}"
+                )
+
+            # Timing breakdown of the last question and ingest run
+            if st.checkbox("Show timing breakdown", key="show_debug_panel"):
+                traces = (
+                    ("Last turn", st.session_state.get("last_turn_trace")),
+                    ("Last ingest", st.session_state.get("last_ingest_trace")),
+                    ("Previous script run", telemetry.last.get("rerun")),
+                )
+                for label, trace in traces:
+                    if trace is None:
+                        continue
+                    st.markdown(f"**{label}** ({trace['total']:.3f}s total)")
+                    rows = [{"stage": name, "seconds": round(seconds, 4)} for name, seconds in trace["stages"].items()]
+                    untraced = trace["total"] - sum(trace["stages"].values())
+                    rows.append({"stage": "other (UI, untraced)", "seconds": round(untraced, 4)})
+                    for name, seconds in trace["marks"].items():
+                        rows.append({"stage": f"{name} (since start)", "seconds": round(seconds, 4)})
+                    st.table(rows)
+                st.download_button(
+                    label="Download Metrics",
+                    data=telemetry.prometheus_text(),
+                    file_name="docblinker_metrics.txt",
+                    mime="text/plain",
+                    key="download_metrics",
+                    use_container_width=True,
+                )
+
             # About section
             st.divider()
             st.markdown('<div class="chat-management-title">PROJECT INFO</div>', unsafe_allow_html=True)
             
             # Button to navigate to About page
-            if st.button("About Project", key="about_btn", use_container_width=True):
-                st.session_state.page = "about"
-                st.rerun()
+            st.button("About Project", key="about_btn", use_container_width=True, on_click=go_to_page, args=("about",))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Time every script run (cold start and reruns) for the timing panel and metrics
+    with telemetry.trace("rerun"):
+        main()
\ No newline at end of file
@@ -0,0 +1,35 @@
+from config import (
+    BACKEND,
+    CHAT_MODEL,
+    EMBEDDING_MODEL,
+    FAKE_EMBED_DIM,
+    FAKE_EMBED_LATENCY,
+    FAKE_FIRST_TOKEN_LATENCY,
+)
+
+
+# Function to name the embedding model, used to key cached embeddings
+def embedding_model_name():
+    return "fake" if BACKEND == "fake" else EMBEDDING_MODEL
+
+
+# Function to create the embeddings client for the configured backend
+def create_embeddings():
+    if BACKEND == "fake":
+        from fakes import FakeEmbeddings
+
+        return FakeEmbeddings(dim=FAKE_EMBED_DIM, latency=FAKE_EMBED_LATENCY)
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+    return GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL)
+
+
+# Function to create the chat model for the configured backend
+def create_chat_model():
+    if BACKEND == "fake":
+        from fakes import FakeChatModel
+
+        return FakeChatModel(first_token_latency=FAKE_FIRST_TOKEN_LATENCY)
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(model=CHAT_MODEL, temperature=0.3)
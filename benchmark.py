@@ -0,0 +1,305 @@
+import argparse
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+# Vocabulary for generated fixture text, including identifier-like tokens
+_WORDS = (
+    "contract clause supplier payment invoice delivery warranty liability termination "
+    "notice period schedule pump valve pressure sensor firmware error code manual "
+    "section table figure device install maintenance safety operator customer"
+).split()
+
+_PDF_LINES_PER_PAGE = 45
+
+
+def _sentence(rng):
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(8, 18))]
+    if rng.random() < 0.2:
+        words.append(f"E-{rng.randint(1000, 9999)}")
+    return " ".join(words).capitalize() + "."
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+# Function to generate a text PDF with the given number of pages
+def make_pdf(pages, seed=0):
+    rng = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_refs = []
+    for _ in range(pages):
+        lines = []
+        while len(lines) < _PDF_LINES_PER_PAGE:
+            sentence = _sentence(rng)
+            lines.extend(sentence[i:i + 90] for i in range(0, len(sentence), 90))
+        body = " T* ".join(f"({_pdf_escape(line)}) Tj" for line in lines[:_PDF_LINES_PER_PAGE])
+        stream = f"BT /F1 9 Tf 40 800 Td 12 TL {body} ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+    kids = " ".join(f"{ref} 0 R" for ref in page_refs).encode("ascii")
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages)
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+# Function to generate a Word document with the given number of paragraphs
+def make_docx(paragraphs, seed=0):
+    from docx import Document
+
+    rng = random.Random(seed)
+    doc = Document()
+    for i in range(paragraphs):
+        if i % 20 == 0:
+            doc.add_heading(f"Section {i // 20 + 1}", level=1)
+        doc.add_paragraph(" ".join(_sentence(rng) for _ in range(rng.randint(2, 6))))
+    out = io.BytesIO()
+    doc.save(out)
+    return out.getvalue()
+
+
+def make_fixtures(pdf_files, pdf_pages, docx_files, docx_paragraphs, seed=0):
+    from extraction import DOCX_TYPE, PDF_TYPE, SourceFile
+
+    files = []
+    for i in range(pdf_files):
+        files.append(SourceFile(f"fixture_{i}.pdf", PDF_TYPE, make_pdf(pdf_pages, seed + i)))
+    for i in range(docx_files):
+        files.append(SourceFile(f"fixture_{i}.docx", DOCX_TYPE, make_docx(docx_paragraphs, seed + 1000 + i)))
+    return files
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Function to generate documents of 20 pages of blank-line separated
+# paragraphs, about `megabytes` of text in all
+def _paragraph_pages(megabytes, rng):
+    documents, size = [], 0
+    while size < megabytes * 1e6:
+        pages = []
+        for page_number in range(1, 21):
+            paragraphs = [" ".join(_sentence(rng) for _ in range(rng.randint(2, 6))) for _ in range(rng.randint(3, 8))]
+            pages.append((page_number, "\n\n".join(paragraphs)))
+            size += len(pages[-1][1])
+        documents.append(pages)
+    return documents
+
+
+# Function to generate documents of 20 pages that are each a single line
+def _long_line_pages(megabytes, rng):
+    documents, size = [], 0
+    while size < megabytes * 1e6:
+        pages = []
+        for page_number in range(1, 21):
+            pages.append((page_number, " ".join(_sentence(rng) for _ in range(rng.randint(20, 60)))))
+            size += len(pages[-1][1])
+        documents.append(pages)
+    return documents
+
+
+# Function to time the splitter against RecursiveCharacterTextSplitter on the
+# same documents, best of three runs each. speedup_vs_recursive is the
+# baseline's time over the splitter's: a little under 1 on paragraph text,
+# where both cut at blank lines, and about 10 on text with long lines.
+def _splitting_results(text_splitter, documents):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    baseline = RecursiveCharacterTextSplitter(chunk_size=text_splitter.chunk_size, chunk_overlap=text_splitter.chunk_overlap)
+    runs = {
+        "splitter": lambda: [chunk for pages in documents for chunk, _ in text_splitter.split_pages(pages)],
+        "baseline_recursive": lambda: [
+            chunk for pages in documents for chunk in baseline.split_text("\n".join(text for _, text in pages))
+        ],
+    }
+    megabytes = sum(len(text) for pages in documents for _, text in pages) / 1e6
+    results = {"mb": megabytes}
+    for name, run in runs.items():
+        seconds = float("inf")
+        for _ in range(3):
+            start = time.perf_counter()
+            chunks = run()
+            seconds = min(seconds, time.perf_counter() - start)
+        results[name] = {
+            "chunks": len(chunks),
+            "seconds": seconds,
+            "chunks_per_second": len(chunks) / seconds,
+            "mb_per_second": megabytes / seconds,
+            "mean_chunk_chars": sum(map(len, chunks)) / max(len(chunks), 1),
+        }
+    results["speedup_vs_recursive"] = results["baseline_recursive"]["seconds"] / results["splitter"]["seconds"]
+    return results
+
+
+# Function to run every pipeline stage against fixtures and the fake backend
+def run_benchmark(args):
+    from engine import Engine, get_extraction_pool, get_text_splitter
+    from extraction import iter_pages, spill_to_disk
+    from index_factory import build_index, reconstruct_all
+    from telemetry import peak_rss_bytes, telemetry
+
+    files = make_fixtures(args.pdf_files, args.pdf_pages, args.docx_files, args.docx_paragraphs, args.seed)
+    pool = get_extraction_pool()
+    results = {"commit": _git_commit(), "config": vars(args)}
+
+    # Extraction
+    start = time.perf_counter()
+    documents = []
+    page_count = 0
+    for file in files:
+        with spill_to_disk(file) as path:
+            pages = list(iter_pages(path, file.type, pool))
+        page_count += len(pages)
+        documents.append(pages)
+    seconds = time.perf_counter() - start
+    results["extraction"] = {"pages": page_count, "seconds": seconds, "pages_per_second": page_count / seconds}
+
+    # Splitting, against LangChain's recursive splitter over the joined text:
+    # the extracted fixtures, then generated paragraph text and text with
+    # long lines (no line breaks within a page)
+    text_splitter = get_text_splitter()
+    results["splitting"] = _splitting_results(text_splitter, documents)
+    rng = random.Random(args.seed)
+    results["splitting_paragraphs"] = _splitting_results(text_splitter, _paragraph_pages(args.split_mb, rng))
+    results["splitting_long_lines"] = _splitting_results(text_splitter, _long_line_pages(args.split_mb, rng))
+
+    # Ingestion: embedding plus index build
+    engine = Engine("benchmark")
+    index_manager = engine.index_manager
+    embeddings = index_manager.get_embeddings()
+    start = time.perf_counter()
+    with telemetry.trace("ingest"):
+        engine.ingest_files(files)
+    seconds = time.perf_counter() - start
+    embedding_stats = embeddings.embeddings.stats()
+    vectorstore, _ = index_manager.get_vectorstore()
+    vectors = reconstruct_all(vectorstore.index)
+    build_start = time.perf_counter()
+    build_index(vectors)
+    results["ingest"] = {
+        "seconds": seconds,
+        "embedding_seconds": embedding_stats["seconds"],
+        "embedding_chunks_per_second": embedding_stats["chunks_per_second"],
+        "embedding_requests": embedding_stats["requests"],
+        "index_build_seconds": time.perf_counter() - build_start,
+        "index_type": index_manager.stats()["index_type"],
+        "peak_rss_bytes": peak_rss_bytes(),
+    }
+
+    # Retrieval, with unique questions so no cache is hit
+    rng = random.Random(args.seed)
+    latencies = []
+    for i in range(args.queries):
+        question = f"{i} " + " ".join(rng.choice(_WORDS) for _ in range(8))
+        start = time.perf_counter()
+        with telemetry.trace("query"):
+            engine.query(question, k=3)
+        latencies.append(time.perf_counter() - start)
+    results["retrieval"] = {
+        "queries": args.queries,
+        "p50_ms": 1000 * _percentile(latencies, 50),
+        "p95_ms": 1000 * _percentile(latencies, 95),
+    }
+
+    # Full answer turns: time to first token and total time
+    first_token, total = [], []
+    for i in range(args.answers):
+        question = f"answer {i} " + " ".join(rng.choice(_WORDS) for _ in range(8))
+        start = time.perf_counter()
+        first = None
+        with telemetry.trace("turn"):
+            for _ in engine.answer(question, use_answer_cache=False):
+                if first is None:
+                    first = time.perf_counter() - start
+        total.append(time.perf_counter() - start)
+        first_token.append(first or 0.0)
+    results["answer"] = {
+        "turns": args.answers,
+        "ttft_p50_ms": 1000 * _percentile(first_token, 50),
+        "ttft_p95_ms": 1000 * _percentile(first_token, 95),
+        "total_p50_ms": 1000 * _percentile(total, 50),
+    }
+
+    # Mean time per traced stage
+    stages = {}
+    for (kind, stage), histogram in telemetry.histograms.items():
+        stages.setdefault(kind, {})[stage] = 1000 * histogram.sum / histogram.count
+    results["stages_mean_ms"] = stages
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline DocBlinker ingest/query benchmark (no network access)")
+    parser.add_argument("--pdf-files", type=int, default=4)
+    parser.add_argument("--pdf-pages", type=int, default=50)
+    parser.add_argument("--docx-files", type=int, default=2)
+    parser.add_argument("--docx-paragraphs", type=int, default=400)
+    parser.add_argument("--split-mb", type=float, default=6.7, help="Megabytes of generated text per splitting run")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--answers", type=int, default=20)
+    parser.add_argument("--embed-dim", type=int, default=768)
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Fake seconds per embedding request")
+    parser.add_argument("--first-token-latency", type=float, default=0.0, help="Fake model seconds to first token")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    # Everything runs against fakes in a throwaway directory
+    workdir = tempfile.mkdtemp(prefix="docblinker-bench-")
+    os.environ["DOCBLINKER_BACKEND"] = "fake"
+    os.environ["DOCBLINKER_INDEX_DIR"] = os.path.join(workdir, "faiss_index")
+    os.environ["DOCBLINKER_EMBEDDING_CACHE_DIR"] = os.path.join(workdir, "embedding_cache")
+    os.environ["DOCBLINKER_FAKE_EMBED_DIM"] = str(args.embed_dim)
+    os.environ["DOCBLINKER_FAKE_EMBED_LATENCY"] = str(args.embed_latency)
+    os.environ["DOCBLINKER_FAKE_FIRST_TOKEN_LATENCY"] = str(args.first_token_latency)
+    os.environ.setdefault("DOCBLINKER_EMBED_REQUESTS_PER_MINUTE", "1000000")
+    os.environ.setdefault("GOOGLE_API_KEY", "offline")
+
+    results = run_benchmark(args)
+    output = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,436 @@
+import functools
+import json
+import math
+import os
+import re
+import shutil
+import unicodedata
+import uuid
+from collections import Counter
+
+import numpy as np
+
+# Lexical index layout inside an index version directory. Each segment is a
+# read-only inverted index over a set of chunks, memory-mapped on load:
+#   lexical/segments.json            k1, b and the segments with their live document
+#                                    count and total length
+#   lexical/<seg>.terms.npy          uint8: the segment's terms, UTF-8, sorted and concatenated
+#   lexical/<seg>.term_offsets.npy   int64: term i is terms[term_offsets[i]:term_offsets[i + 1]]
+#   lexical/<seg>.postings.npy       int64: term i occurs in docs[postings[i]:postings[i + 1]]
+#   lexical/<seg>.docs.npy           int32: document numbers, ascending within a term
+#   lexical/<seg>.freqs.npy          int32: the term's frequency in each of those documents
+#   lexical/<seg>.ids.npy            bytes: sorted chunk ids; a document's number is its rank
+#   lexical/<seg>.lengths.npy        int32: term count of each document
+#   lexical/<seg>.deleted-<id>.npy   optional bool: documents removed after the segment was written
+# Segment files are never modified: a save hard-links the unchanged ones into
+# the new version directory, writes added documents as a new segment and a
+# changed deletion mask under a new name, and merges segments as they pile up.
+LEXICAL_DIR = "lexical"
+SEGMENTS_FILE = "segments.json"
+_SEGMENT_PARTS = ("terms", "term_offsets", "postings", "docs", "freqs", "ids", "lengths")
+
+# Segments whose live document counts are within this factor of each other are
+# merged once there are this many, so each document is rewritten about
+# log(corpus / batch) times in all rather than on every save
+_MERGE_FACTOR = 4
+
+
+# Function to compile the token patterns: words in any script plus identifiers
+# such as "12.3.4", "SKU-1234" or "ERR_42". Combining marks (e.g. Devanagari
+# vowel signs) are not \w, so they are added explicitly; compiled on first use
+# to keep the scan of the Unicode tables out of the app's import time.
+@functools.lru_cache(maxsize=None)
+def _patterns():
+    marks = re.escape("".join(chr(c) for c in range(0x300, 0x10000) if unicodedata.category(chr(c)).startswith("M")))
+    word = f"[\\w{marks}]+"
+    token = re.compile(f"{word}(?:[._\\-/:#]{word})*")
+    part = re.compile(f"(?:[^\\W_]|[{marks}])+")
+    return token, part
+
+
+# Function to split text into normalized, case-folded terms. Compound
+# identifiers are kept whole and also indexed by their parts, so "SKU-1234"
+# matches "1234".
+def tokenize(text):
+    token_re, part_re = _patterns()
+    terms = []
+    for token in token_re.findall(unicodedata.normalize("NFKC", text).casefold()):
+        terms.append(token)
+        parts = part_re.findall(token)
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+
+# One memory-mapped segment of a lexical index. Terms are found by binary
+# search over the sorted term table and chunk ids by np.searchsorted, so
+# opening a segment reads no postings into memory.
+class _Segment:
+    def __init__(self, path, entry):
+        self.path = path
+        self.name = entry["name"]
+        for part in _SEGMENT_PARTS:
+            setattr(self, part, np.load(self._file(part), mmap_mode="r"))
+        self.deleted_file = entry["deleted"]
+        self.deleted = None
+        if self.deleted_file:
+            self.deleted = np.load(os.path.join(path, self.deleted_file), mmap_mode="r")
+        # Live (not deleted) document count and total term count
+        self.live_docs = entry["docs"]
+        self.live_length = entry["length"]
+
+    def _file(self, part):
+        return os.path.join(self.path, f"{self.name}.{part}.npy")
+
+    def _term(self, i):
+        return self.terms[self.term_offsets[i]:self.term_offsets[i + 1]].tobytes()
+
+    # Function to find a term's number, or None when the segment lacks it
+    def find(self, term):
+        key = term.encode("utf-8")
+        low, high = 0, len(self.term_offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self.term_offsets) - 1 and self._term(low) == key:
+            return low
+        return None
+
+    # Function to get the (document numbers, frequencies) of a term's live postings
+    def postings_of(self, term):
+        i = self.find(term)
+        if i is None:
+            return self.docs[:0], self.freqs[:0]
+        start, end = self.postings[i], self.postings[i + 1]
+        docs, freqs = self.docs[start:end], self.freqs[start:end]
+        if self.deleted is not None:
+            live = ~self.deleted[docs]
+            docs, freqs = docs[live], freqs[live]
+        return docs, freqs
+
+    def doc_id(self, number):
+        return self.ids[number].decode("utf-8")
+
+    # Function to get the document numbers of the live documents among ids (bytes array)
+    def locate(self, ids):
+        numbers = np.searchsorted(self.ids, ids)
+        found = numbers < len(self.ids)
+        numbers, ids = numbers[found], ids[found]
+        numbers = numbers[self.ids[numbers] == ids]
+        if self.deleted is not None:
+            numbers = numbers[~self.deleted[numbers]]
+        return numbers
+
+    # Function to mark documents as deleted. The deletion mask is copied out of
+    # the mapped file first, so published segment files are never modified.
+    def delete(self, numbers):
+        if not len(numbers):
+            return
+        if self.deleted is None:
+            self.deleted = np.zeros(len(self.ids), dtype=bool)
+        elif not self.deleted.flags.writeable:
+            self.deleted = np.array(self.deleted)
+        self.deleted[numbers] = True
+        self.live_docs -= len(numbers)
+        self.live_length -= int(self.lengths[numbers].sum())
+
+    # Function to add the segment to a version's lexical directory by linking
+    # its files; a deletion mask changed in memory is written to a new file.
+    # Returns its segments.json entry.
+    def save(self, path):
+        if path != self.path:
+            for part in _SEGMENT_PARTS:
+                _link(self._file(part), os.path.join(path, f"{self.name}.{part}.npy"))
+        deleted_file = self.deleted_file
+        if self.deleted is not None and self.deleted.flags.writeable:
+            deleted_file = f"{self.name}.deleted-{uuid.uuid4().hex[:8]}.npy"
+            np.save(os.path.join(path, deleted_file), self.deleted)
+        elif deleted_file and path != self.path:
+            _link(os.path.join(self.path, deleted_file), os.path.join(path, deleted_file))
+        return {"name": self.name, "docs": self.live_docs, "length": self.live_length, "deleted": deleted_file}
+
+    # Function to list the segment's postings for merging, see _write_segment()
+    def flat(self):
+        blob = self.terms.tobytes()
+        offsets = self.term_offsets.tolist()
+        terms = [blob[start:end] for start, end in zip(offsets, offsets[1:])]
+        term_index = np.repeat(np.arange(len(terms)), np.diff(self.postings))
+        live = None if self.deleted is None else ~self.deleted
+        return terms, self.ids, self.lengths, term_index, self.docs, self.freqs, live
+
+
+# Function to hard-link an immutable file into another directory, copying it
+# where links are not possible (e.g. across file systems)
+def _link(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+# Function to write postings as a segment. `terms` are sorted UTF-8 terms and
+# `ids` sorted chunk ids; posting j is the pair (terms[term_index[j]],
+# ids[doc_index[j]]) with frequency freqs[j]. Returns the segment's name.
+def _write_segment(path, terms, ids, lengths, term_index, doc_index, freqs):
+    name = f"seg-{uuid.uuid4().hex[:12]}"
+    order = np.lexsort((doc_index, term_index))
+    term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum([len(term) for term in terms], out=term_offsets[1:])
+    postings = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_index, minlength=len(terms)), out=postings[1:])
+    arrays = {
+        "terms": np.frombuffer(b"".join(terms), dtype=np.uint8),
+        "term_offsets": term_offsets,
+        "postings": postings,
+        "docs": np.asarray(doc_index, dtype=np.int32)[order],
+        "freqs": np.asarray(freqs, dtype=np.int32)[order],
+        "ids": ids,
+        "lengths": np.asarray(lengths, dtype=np.int32),
+    }
+    for part, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.{part}.npy"), array)
+    return name
+
+
+# Function to merge the live postings of several sources (see _Segment.flat();
+# `live` is a mask of the documents to keep, or None for all) into one
+# segment. Returns its segments.json entry.
+def _merge_segments(path, sources):
+    all_terms = sorted(set().union(*(terms for terms, *_ in sources)))
+    term_number = {term: i for i, term in enumerate(all_terms)}
+    ids, lengths, term_index, doc_index, freqs = [], [], [], [], []
+    doc_count = 0
+    for terms, source_ids, source_lengths, source_terms, source_docs, source_freqs, live in sources:
+        kept = np.arange(len(source_ids)) if live is None else np.flatnonzero(live)
+        number = np.full(len(source_ids), -1, dtype=np.int64)
+        number[kept] = np.arange(doc_count, doc_count + len(kept))
+        doc_count += len(kept)
+        ids.append(np.asarray(source_ids)[kept])
+        lengths.append(np.asarray(source_lengths)[kept])
+        remap = np.fromiter((term_number[term] for term in terms), dtype=np.int64, count=len(terms))
+        docs = number[source_docs]
+        keep = docs >= 0
+        term_index.append(remap[np.asarray(source_terms)[keep]])
+        doc_index.append(docs[keep])
+        freqs.append(np.asarray(source_freqs)[keep])
+
+    # Number documents by chunk id and drop terms left without postings
+    ids, lengths = np.concatenate(ids), np.concatenate(lengths)
+    order = np.argsort(ids, kind="stable")
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    term_index = np.concatenate(term_index)
+    used, term_index = np.unique(term_index, return_inverse=True)
+    name = _write_segment(
+        path,
+        [all_terms[i] for i in used],
+        ids[order],
+        lengths[order],
+        term_index,
+        rank[np.concatenate(doc_index)],
+        np.concatenate(freqs),
+    )
+    return {"name": name, "docs": len(ids), "length": int(lengths.sum()), "deleted": None}
+
+
+# Function to group the parts of an index to merge on save, by their live
+# document counts: _MERGE_FACTOR parts of the same size class are merged
+def _merge_groups(sizes):
+    levels = {}
+    for i, size in enumerate(sizes):
+        levels.setdefault(int(math.log(max(size, 1), _MERGE_FACTOR)), []).append(i)
+    return [group for _, group in sorted(levels.items()) if len(group) >= _MERGE_FACTOR]
+
+
+# Inverted index scoring chunks with Okapi BM25. Documents can be added and
+# removed by chunk id, so it is updated incrementally alongside FAISS. Saved
+# documents live in memory-mapped segments; documents added since are kept
+# in memory until the next save(), which writes only them and the deletions.
+class BM25Index:
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.doc_lengths = {}
+        self._total_length = 0
+        self._segments = []
+
+    def __len__(self):
+        return len(self.doc_lengths) + sum(segment.live_docs for segment in self._segments)
+
+    def _total(self):
+        return self._total_length + sum(segment.live_length for segment in self._segments)
+
+    def add(self, doc_id, text):
+        self.remove(doc_id)
+        terms = tokenize(text)
+        for term, freq in Counter(terms).items():
+            self.postings.setdefault(term, {})[doc_id] = freq
+        self.doc_lengths[doc_id] = len(terms)
+        self._total_length += len(terms)
+
+    def remove(self, doc_id):
+        self.remove_many([doc_id])
+
+    def remove_many(self, doc_ids):
+        doc_ids = set(doc_ids)
+        if self._segments and doc_ids:
+            keys = np.array([doc_id.encode("utf-8") for doc_id in doc_ids])
+            for segment in self._segments:
+                segment.delete(segment.locate(keys))
+        doc_ids &= self.doc_lengths.keys()
+        if not doc_ids:
+            return
+        for term in list(self.postings):
+            docs = self.postings[term]
+            for doc_id in doc_ids.intersection(docs):
+                del docs[doc_id]
+            if not docs:
+                del self.postings[term]
+        for doc_id in doc_ids:
+            self._total_length -= self.doc_lengths.pop(doc_id)
+
+    # Return [(doc_id, score)] of the k best matching documents, only among
+    # `allowed` ids when given
+    def search(self, query, k, allowed=None):
+        n_docs = len(self)
+        if not n_docs:
+            return []
+        avg_length = self._total() / n_docs or 1.0
+        scores = Counter()
+        matches = [([], []) for _ in self._segments]
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term, {})
+            found = [segment.postings_of(term) for segment in self._segments]
+            df = len(docs) + sum(len(numbers) for numbers, _ in found)
+            if not df:
+                continue
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc_id, freq in docs.items():
+                if allowed is not None and doc_id not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * freq * (self.k1 + 1) / (freq + norm)
+            for segment, (numbers, freqs), (segment_docs, segment_scores) in zip(self._segments, found, matches):
+                if not len(numbers):
+                    continue
+                freqs = freqs.astype(np.float64)
+                norm = self.k1 * (1 - self.b + self.b * segment.lengths[numbers] / avg_length)
+                segment_docs.append(numbers)
+                segment_scores.append(idf * freqs * (self.k1 + 1) / (freqs + norm))
+
+        results = scores.most_common(k)
+        for segment, (segment_docs, segment_scores) in zip(self._segments, matches):
+            if segment_docs:
+                results.extend(self._top(segment, segment_docs, segment_scores, k, allowed))
+        results.sort(key=lambda result: result[1], reverse=True)
+        return results[:k]
+
+    # Function to sum a segment's per-term scores by document and take the k
+    # best. With `allowed`, candidates are checked in score order until k pass.
+    @staticmethod
+    def _top(segment, segment_docs, segment_scores, k, allowed):
+        numbers, inverse = np.unique(np.concatenate(segment_docs), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(segment_scores))
+        if allowed is None and len(totals) > k:
+            best = np.argpartition(-totals, k)[:k]
+            order = best[np.argsort(-totals[best], kind="stable")]
+        else:
+            order = np.argsort(-totals, kind="stable")
+        results = []
+        for i in order:
+            doc_id = segment.doc_id(numbers[i])
+            if allowed is not None and doc_id not in allowed:
+                continue
+            results.append((doc_id, float(totals[i])))
+            if len(results) == k:
+                break
+        return results
+
+    # Function to list the in-memory postings for merging, see _write_segment()
+    def _pending(self):
+        ids = sorted(self.doc_lengths, key=lambda doc_id: doc_id.encode("utf-8"))
+        number = {doc_id: i for i, doc_id in enumerate(ids)}
+        terms = sorted(self.postings, key=lambda term: term.encode("utf-8"))
+        term_index, doc_index, freqs = [], [], []
+        for i, term in enumerate(terms):
+            for doc_id, freq in self.postings[term].items():
+                term_index.append(i)
+                doc_index.append(number[doc_id])
+                freqs.append(freq)
+        return (
+            [term.encode("utf-8") for term in terms],
+            np.array([doc_id.encode("utf-8") for doc_id in ids]),
+            [self.doc_lengths[doc_id] for doc_id in ids],
+            np.asarray(term_index, dtype=np.int64),
+            np.asarray(doc_index, dtype=np.int64),
+            np.asarray(freqs, dtype=np.int64),
+            None,
+        )
+
+    # Function to write the index into a version directory. Unchanged segments
+    # are linked rather than rewritten, so the cost is proportional to the
+    # changes plus any merge. Afterwards the index is backed by the written
+    # segments, so the next save() only writes what changed since this one.
+    def save(self, index_dir):
+        path = os.path.join(index_dir, LEXICAL_DIR)
+        os.makedirs(path, exist_ok=True)
+        # None stands for the documents held in memory
+        parts = [segment for segment in self._segments if segment.live_docs]
+        if self.doc_lengths:
+            parts.append(None)
+        groups = _merge_groups([len(self.doc_lengths) if part is None else part.live_docs for part in parts])
+        merged = {i for group in groups for i in group}
+        # Segments that are mostly deleted are compacted
+        compacted = [
+            i for i, part in enumerate(parts)
+            if part is not None and i not in merged and part.live_docs * 2 < len(part.ids)
+        ]
+        if compacted:
+            groups.append(compacted)
+            merged.update(compacted)
+
+        segments = []
+        for i, part in enumerate(parts):
+            if i in merged:
+                continue
+            if part is None:
+                segments.append(_merge_segments(path, [self._pending()]))
+            else:
+                segments.append(part.save(path))
+        for group in groups:
+            sources = [self._pending() if parts[i] is None else parts[i].flat() for i in group]
+            segments.append(_merge_segments(path, sources))
+        with open(os.path.join(path, SEGMENTS_FILE), "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "segments": segments}, f)
+
+        self._segments = [_Segment(path, segment) for segment in segments]
+        self.postings = {}
+        self.doc_lengths = {}
+        self._total_length = 0
+
+    # Function to open a saved index, or an empty one if the directory has
+    # none; its segments are memory-mapped
+    @classmethod
+    def load(cls, index_dir):
+        path = os.path.join(index_dir, LEXICAL_DIR)
+        segments_path = os.path.join(path, SEGMENTS_FILE)
+        if not os.path.exists(segments_path):
+            return cls()
+        with open(segments_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        index = cls(state["k1"], state["b"])
+        index._segments = [_Segment(path, segment) for segment in state["segments"]]
+        return index
+
+
+# Function to merge several ranked id lists with reciprocal rank fusion
+def reciprocal_rank_fusion(rankings, k=60):
+    scores = Counter()
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += 1.0 / (k + rank + 1)
+    return [doc_id for doc_id, _ in scores.most_common()]
@@ -0,0 +1,147 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from config import CONTEXT_CANDIDATES
+from engine import DEFAULT_NAMESPACE, Engine
+from extraction import find_documents
+from telemetry import peak_rss_bytes, telemetry
+
+
+def _print_progress(file_name, pages_done, total_pages):
+    sys.stderr.write(f"\r{file_name}: page {pages_done}/{total_pages}")
+    if pages_done >= total_pages:
+        sys.stderr.write("\n")
+
+
+def _collect_paths(sources):
+    paths = []
+    for source in sources:
+        paths.extend(find_documents(source) if os.path.isdir(source) else [source])
+    return paths
+
+
+def cmd_ingest(engine, args):
+    paths = _collect_paths(args.sources)
+    engine.pin()
+    with telemetry.trace("ingest") as trace:
+        added, removed, unchanged = engine.ingest(paths, progress=_print_progress, remove_missing=not args.keep_missing)
+    print(json.dumps({
+        "namespace": engine.namespace,
+        "documents": len(paths),
+        "added": len(added),
+        "removed": len(removed),
+        "unchanged": len(unchanged),
+        "timings": trace.to_dict(),
+        "peak_rss_bytes": peak_rss_bytes(),
+    }, indent=2))
+
+
+# Ingestion worker for multi-process serving: re-ingests the sources whenever a
+# file is added, removed or modified. Each change publishes a new index version,
+# which app workers (DOCBLINKER_SHARED_NAMESPACE) pick up without a restart.
+def cmd_watch(engine, args):
+    engine.pin()
+    signature = None
+    while True:
+        paths = _collect_paths(args.sources)
+        current = sorted((path, os.stat(path).st_size, os.stat(path).st_mtime_ns) for path in paths)
+        if current != signature:
+            with telemetry.trace("ingest") as trace:
+                added, removed, _ = engine.ingest(paths, remove_missing=not args.keep_missing)
+            signature = current
+            if added or removed:
+                print(json.dumps({
+                    "namespace": engine.namespace,
+                    "version": engine.index_manager.version,
+                    "added": len(added),
+                    "removed": len(removed),
+                    "seconds": trace.total,
+                }), flush=True)
+        time.sleep(args.interval)
+
+
+def cmd_query(engine, args):
+    docs = engine.query(args.question, k=args.k, sources=args.source)
+    if docs is None:
+        sys.exit(f"No index in namespace '{engine.namespace}'")
+    print(json.dumps([{"id": doc.id, "metadata": doc.metadata, "text": doc.page_content} for doc in docs], indent=2))
+
+
+def cmd_answer(engine, args):
+    for piece in engine.answer(args.question, k=args.k, use_answer_cache=not args.no_cache, sources=args.source):
+        sys.stdout.write(piece)
+        sys.stdout.flush()
+    sys.stdout.write("\n")
+
+
+def cmd_sources(engine, args):
+    print(json.dumps(engine.sources(), indent=2))
+
+
+def cmd_stats(engine, args):
+    index_manager = engine.index_manager
+    index_manager.get_vectorstore()
+    stats = index_manager.stats()
+    if args.recall_queries:
+        stats["vector_recall"] = index_manager.vector_recall(queries=args.recall_queries, k=args.k)
+    print(json.dumps(stats, indent=2))
+
+
+def cmd_clear(engine, args):
+    engine.clear()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DocBlinker headless ingestion and query tool")
+    parser.add_argument("--namespace", default=DEFAULT_NAMESPACE, help="Index namespace (collection) to use")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="Ingest PDF/DOCX files or directories")
+    ingest.add_argument("sources", nargs="+")
+    ingest.add_argument("--keep-missing", action="store_true", help="Do not delete indexed documents that are not listed")
+    ingest.set_defaults(func=cmd_ingest)
+
+    watch = commands.add_parser("watch", help="Re-ingest files or directories whenever they change")
+    watch.add_argument("sources", nargs="+")
+    watch.add_argument("--keep-missing", action="store_true", help="Do not delete indexed documents that are not listed")
+    watch.add_argument("--interval", type=float, default=5.0, help="Seconds between checks")
+    watch.set_defaults(func=cmd_watch)
+
+    query = commands.add_parser("query", help="Print the chunks retrieved for a question")
+    query.add_argument("question")
+    query.add_argument("-k", type=int, default=3)
+    query.add_argument("--source", action="append", help="Only search this document (repeatable)")
+    query.set_defaults(func=cmd_query)
+
+    answer = commands.add_parser("answer", help="Stream the answer to a question")
+    answer.add_argument("question")
+    answer.add_argument("-k", type=int, default=CONTEXT_CANDIDATES, help="Chunks retrieved before context packing")
+    answer.add_argument("--no-cache", action="store_true", help="Bypass the answer cache")
+    answer.add_argument("--source", action="append", help="Only search this document (repeatable)")
+    answer.set_defaults(func=cmd_answer)
+
+    sources = commands.add_parser("sources", help="List the indexed documents")
+    sources.set_defaults(func=cmd_sources)
+
+    stats = commands.add_parser("stats", help="Print index statistics, including bytes per chunk")
+    stats.add_argument(
+        "--recall-queries",
+        type=int,
+        default=0,
+        help="Also measure recall@k of compact vector storage with this many queries",
+    )
+    stats.add_argument("-k", type=int, default=10)
+    stats.set_defaults(func=cmd_stats)
+
+    clear = commands.add_parser("clear", help="Delete the namespace's index")
+    clear.set_defaults(func=cmd_clear)
+
+    args = parser.parse_args(argv)
+    args.func(Engine(args.namespace), args)
+
+
+if __name__ == "__main__":
+    main()
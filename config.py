@@ -0,0 +1,134 @@
+import os
+
+from dotenv import load_dotenv
+
+# Settings are read from the environment when this module is imported, so a
+# local .env file is loaded first (variables already set take precedence)
+load_dotenv()
+
+# Directory where the FAISS index is stored
+INDEX_DIR = os.getenv("DOCBLINKER_INDEX_DIR", "faiss_index")
+
+# Google models used for embeddings and answers
+EMBEDDING_MODEL = "models/gemini-embedding-001"
+CHAT_MODEL = "gemini-2.5-flash"
+
+# "google" for the Gemini APIs, "fake" for deterministic offline stand-ins
+BACKEND = os.getenv("DOCBLINKER_BACKEND", "google")
+FAKE_EMBED_DIM = int(os.getenv("DOCBLINKER_FAKE_EMBED_DIM", "768"))
+FAKE_EMBED_LATENCY = float(os.getenv("DOCBLINKER_FAKE_EMBED_LATENCY", "0"))
+FAKE_FIRST_TOKEN_LATENCY = float(os.getenv("DOCBLINKER_FAKE_FIRST_TOKEN_LATENCY", "0"))
+
+# Persistent embedding cache (content-addressed, LRU-bounded)
+EMBEDDING_CACHE_DIR = os.getenv("DOCBLINKER_EMBEDDING_CACHE_DIR", "embedding_cache")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("DOCBLINKER_EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+
+# Document extraction and ingestion pipeline
+EXTRACTION_WORKERS = int(os.getenv("DOCBLINKER_EXTRACTION_WORKERS", str(os.cpu_count() or 1)))
+PAGES_PER_TASK = int(os.getenv("DOCBLINKER_PAGES_PER_TASK", "8"))
+# Page ranges extracted ahead of the splitter; bounds text held in memory
+EXTRACTION_MAX_INFLIGHT = int(os.getenv("DOCBLINKER_EXTRACTION_MAX_INFLIGHT", str(2 * EXTRACTION_WORKERS)))
+# Uploads are copied here for the extraction workers (system temp dir when empty)
+SPILL_DIR = os.getenv("DOCBLINKER_SPILL_DIR", "")
+# Chunk size and overlap between neighbouring chunks, in characters
+CHUNK_SIZE = int(os.getenv("DOCBLINKER_CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.getenv("DOCBLINKER_CHUNK_OVERLAP", "200"))
+
+# OCR of scanned PDF pages (needs pytesseract, Pillow and the tesseract binary).
+# Pages with fewer extracted characters than OCR_MIN_CHARS are OCR'd; results
+# are cached by page image hash.
+OCR_ENABLED = os.getenv("DOCBLINKER_OCR", "1") == "1"
+OCR_LANGUAGE = os.getenv("DOCBLINKER_OCR_LANGUAGE", "eng")
+OCR_MIN_CHARS = int(os.getenv("DOCBLINKER_OCR_MIN_CHARS", "16"))
+OCR_CACHE_DIR = os.getenv("DOCBLINKER_OCR_CACHE_DIR", "ocr_cache")
+
+# Embedding requests: texts per request, parallel requests, rate limit and retries
+EMBED_BATCH_SIZE = int(os.getenv("DOCBLINKER_EMBED_BATCH_SIZE", "100"))
+EMBED_CONCURRENCY = int(os.getenv("DOCBLINKER_EMBED_CONCURRENCY", "4"))
+EMBED_REQUESTS_PER_MINUTE = float(os.getenv("DOCBLINKER_EMBED_REQUESTS_PER_MINUTE", "100"))
+EMBED_MAX_RETRIES = int(os.getenv("DOCBLINKER_EMBED_MAX_RETRIES", "6"))
+
+# Memory budget for the ingest pipeline. Batches of chunks are flushed to the
+# index before they outgrow a quarter of it.
+MEMORY_BUDGET_MB = int(os.getenv("DOCBLINKER_MEMORY_BUDGET_MB", "512"))
+# Rough bytes per in-flight chunk: its text plus a 3072-d embedding as Python floats
+_BYTES_PER_CHUNK = CHUNK_SIZE * 2 + 3072 * 32
+
+# Chunks collected before they are embedded and added to the index
+INGEST_BATCH_SIZE = max(1, min(
+    EMBED_BATCH_SIZE * EMBED_CONCURRENCY,
+    MEMORY_BUDGET_MB * 1024 * 1024 // 4 // _BYTES_PER_CHUNK,
+))
+
+# LRU caches for query embeddings and top-k retrieval results
+RETRIEVAL_CACHE_SIZE = int(os.getenv("DOCBLINKER_RETRIEVAL_CACHE_SIZE", "256"))
+
+# Semantic answer cache: replay answers for near-identical questions
+ANSWER_CACHE_ENABLED = os.getenv("DOCBLINKER_ANSWER_CACHE", "1") == "1"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("DOCBLINKER_ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("DOCBLINKER_ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_SIZE = int(os.getenv("DOCBLINKER_ANSWER_CACHE_SIZE", "512"))
+
+# FAISS index type: "auto", "flat", "ivf", "hnsw" or "ivfpq"
+FAISS_INDEX_TYPE = os.getenv("DOCBLINKER_FAISS_INDEX_TYPE", "auto")
+# Chunk counts at which "auto" switches from flat to IVF and from IVF to IVF-PQ
+FAISS_IVF_MIN_CHUNKS = int(os.getenv("DOCBLINKER_FAISS_IVF_MIN_CHUNKS", "20000"))
+FAISS_IVFPQ_MIN_CHUNKS = int(os.getenv("DOCBLINKER_FAISS_IVFPQ_MIN_CHUNKS", "200000"))
+# Recall vs latency knobs: IVF lists probed and HNSW candidate list size
+FAISS_NPROBE = int(os.getenv("DOCBLINKER_FAISS_NPROBE", "16"))
+FAISS_EF_SEARCH = int(os.getenv("DOCBLINKER_FAISS_EF_SEARCH", "64"))
+
+# Compact serving vectors: "float32" (exact), "float16" or "int8", optionally
+# reduced to VECTOR_DIM dimensions (0 keeps all) by "truncate" (Matryoshka) or
+# "pca". Searches re-score VECTOR_RESCORE_FACTOR * k candidates against the
+# exact vectors, which stay memory-mapped on disk.
+VECTOR_STORAGE = os.getenv("DOCBLINKER_VECTOR_STORAGE", "float32")
+VECTOR_DIM = int(os.getenv("DOCBLINKER_VECTOR_DIM", "0"))
+VECTOR_REDUCTION = os.getenv("DOCBLINKER_VECTOR_REDUCTION", "truncate")
+VECTOR_RESCORE_FACTOR = int(os.getenv("DOCBLINKER_VECTOR_RESCORE_FACTOR", "4"))
+
+# Index snapshots: chunk text compression ("zstd" needs the zstandard package,
+# otherwise "none") and whether read-only loads memory-map the vectors
+SNAPSHOT_COMPRESSION = os.getenv("DOCBLINKER_SNAPSHOT_COMPRESSION", "zstd")
+SNAPSHOT_MMAP = os.getenv("DOCBLINKER_SNAPSHOT_MMAP", "1") == "1"
+
+# Per-session index namespaces: idle sessions are deleted after SESSION_IDLE_SECONDS
+SESSION_IDLE_SECONDS = float(os.getenv("DOCBLINKER_SESSION_IDLE_SECONDS", "3600"))
+SESSION_GC_INTERVAL_SECONDS = float(os.getenv("DOCBLINKER_SESSION_GC_INTERVAL_SECONDS", "300"))
+# Superseded index versions are kept this long for readers still using them
+VERSION_GRACE_SECONDS = float(os.getenv("DOCBLINKER_VERSION_GRACE_SECONDS", "120"))
+# How often a loaded index checks whether another process published a new version
+VERSION_CHECK_SECONDS = float(os.getenv("DOCBLINKER_VERSION_CHECK_SECONDS", "2"))
+# Serve every app session from this read-only collection, published by a
+# separate ingestion worker (cli.py watch); per-session uploads when empty
+SHARED_NAMESPACE = os.getenv("DOCBLINKER_SHARED_NAMESPACE", "")
+
+# Hybrid retrieval: BM25 + vector results merged with reciprocal rank fusion
+HYBRID_SEARCH = os.getenv("DOCBLINKER_HYBRID_SEARCH", "1") == "1"
+HYBRID_CANDIDATES = int(os.getenv("DOCBLINKER_HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.getenv("DOCBLINKER_RRF_K", "60"))
+
+# Answer context: chunks retrieved per question, then deduplicated, reranked by
+# maximal marginal relevance (1.0 = relevance only) and packed to a token budget
+CONTEXT_CANDIDATES = int(os.getenv("DOCBLINKER_CONTEXT_CANDIDATES", "8"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("DOCBLINKER_CONTEXT_TOKEN_BUDGET", "750"))
+CONTEXT_MMR_LAMBDA = float(os.getenv("DOCBLINKER_CONTEXT_MMR_LAMBDA", "0.7"))
+# Chunks with fewer new characters than this after removing overlap are dropped
+CONTEXT_MIN_CHARS = int(os.getenv("DOCBLINKER_CONTEXT_MIN_CHARS", "100"))
+
+# Background ingestion jobs: SQLite queue, uploaded files and checkpoints
+JOBS_DB = os.getenv("DOCBLINKER_JOBS_DB", "ingest_jobs.sqlite3")
+JOBS_DIR = os.getenv("DOCBLINKER_JOBS_DIR", "ingest_jobs")
+JOB_WORKERS = int(os.getenv("DOCBLINKER_JOB_WORKERS", "1"))
+# A running job whose worker has not reported for this long is picked up again
+JOB_STALE_SECONDS = float(os.getenv("DOCBLINKER_JOB_STALE_SECONDS", "300"))
+# Minimum time between checkpoints of a running job
+CHECKPOINT_INTERVAL_SECONDS = float(os.getenv("DOCBLINKER_CHECKPOINT_INTERVAL_SECONDS", "30"))
+
+# Append one JSON line per traced turn / ingest to this file (disabled when empty)
+TELEMETRY_JSONL = os.getenv("DOCBLINKER_TELEMETRY_JSONL", "")
+
+# Async answer streaming: token queue bound and UI update coalescing budget
+STREAM_QUEUE_SIZE = int(os.getenv("DOCBLINKER_STREAM_QUEUE_SIZE", "64"))
+UI_UPDATE_INTERVAL_SECONDS = float(os.getenv("DOCBLINKER_UI_UPDATE_INTERVAL_SECONDS", "0.1"))
+UI_UPDATE_CHARS = int(os.getenv("DOCBLINKER_UI_UPDATE_CHARS", "400"))
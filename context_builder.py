@@ -0,0 +1,119 @@
+import math
+
+import numpy as np
+
+from config import CONTEXT_MIN_CHARS, CONTEXT_MMR_LAMBDA, CONTEXT_TOKEN_BUDGET
+
+# Rough characters per token for Gemini's tokenizer on English text
+CHARS_PER_TOKEN = 4
+
+
+# Function to estimate the prompt tokens of a text without calling the API
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+# Function to order candidates by maximal marginal relevance: each pick trades
+# similarity to the question against similarity to the chunks already picked
+def mmr_order(query_vector, doc_vectors, lambda_mult=CONTEXT_MMR_LAMBDA):
+    query = _normalize(np.asarray(query_vector, dtype=np.float32))
+    docs = _normalize(np.asarray(doc_vectors, dtype=np.float32))
+    relevance = docs @ query
+    similarity = docs @ docs.T
+    redundancy = np.zeros(len(docs), dtype=np.float32)
+    remaining = list(range(len(docs)))
+    order = []
+    while remaining:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        best = max(remaining, key=lambda i: scores[i])
+        order.append(best)
+        remaining.remove(best)
+        redundancy = np.maximum(redundancy, similarity[best])
+    return order
+
+
+# Function to find the longest part of [start, end) not covered by any span
+def _uncovered(start, end, covered):
+    segments = [(start, end)]
+    for a, b in covered:
+        remaining = []
+        for s, e in segments:
+            if b <= s or a >= e:
+                remaining.append((s, e))
+                continue
+            if s < a:
+                remaining.append((s, a))
+            if b < e:
+                remaining.append((b, e))
+        segments = remaining
+    return max(segments, key=lambda segment: segment[1] - segment[0], default=None)
+
+
+# Function to cut the text a chunk shares with chunks already in the context.
+# Chunks carry their document offsets, so overlap between neighbouring chunks
+# is found exactly; chunks without offsets are only dropped as exact repeats.
+def _deduplicate(doc, covered, seen):
+    metadata = doc.metadata
+    if "doc" not in metadata or "start" not in metadata:
+        return None if doc.page_content in seen else doc
+    start, end = metadata["start"], metadata["end"]
+    segment = _uncovered(start, end, covered.get(metadata["doc"], ()))
+    if segment is None or segment[1] - segment[0] < min(CONTEXT_MIN_CHARS, end - start):
+        return None
+    if segment == (start, end):
+        return doc
+    from langchain_core.documents import Document
+
+    text = doc.page_content[segment[0] - start:segment[1] - start]
+    metadata = dict(metadata, start=segment[0], end=segment[1], tokens=estimate_tokens(text))
+    return Document(page_content=text, metadata=metadata, id=doc.id)
+
+
+# Function to build the answer context from retrieved chunks: rerank them by
+# MMR when their vectors are known, strip overlapping text and pack as many
+# distinct chunks as fit the token budget
+def build_context(docs, query_vector=None, doc_vectors=None, token_budget=CONTEXT_TOKEN_BUDGET):
+    if not docs:
+        return docs
+    if query_vector is not None and doc_vectors is not None and len(docs) > 1:
+        order = mmr_order(query_vector, doc_vectors)
+    else:
+        order = list(range(len(docs)))
+
+    packed = []
+    used = 0
+    covered = {}
+    seen = set()
+    for i in order:
+        doc = _deduplicate(docs[i], covered, seen)
+        if doc is None:
+            continue
+        # The splitter stores each chunk's token count with it
+        tokens = doc.metadata.get("tokens")
+        if tokens is None:
+            tokens = estimate_tokens(doc.page_content)
+        if used + tokens > token_budget:
+            continue
+        packed.append(doc)
+        used += tokens
+        seen.add(docs[i].page_content)
+        if "doc" in docs[i].metadata and "start" in docs[i].metadata:
+            covered.setdefault(docs[i].metadata["doc"], []).append((docs[i].metadata["start"], docs[i].metadata["end"]))
+
+    # Never send an empty context: fall back to the best chunk, truncated
+    if not packed:
+        from langchain_core.documents import Document
+
+        best = docs[order[0]]
+        packed = [Document(
+            page_content=best.page_content[:token_budget * CHARS_PER_TOKEN],
+            metadata=best.metadata,
+            id=best.id,
+        )]
+    return packed
@@ -0,0 +1,267 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config import EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_ENTRIES
+from telemetry import span
+
+# Rows added to the vector file each time it needs to grow
+_GROW_ROWS = 1024
+
+try:
+    import fcntl
+except ImportError:  # Windows: the cache is only shared safely within one process
+    fcntl = None
+
+
+# Function to build the cache key for a chunk embedded by a given model
+def embedding_key(model, text):
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+# Function to identify the version of a file that os.replace() swapped in
+def _file_version(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+# On-disk embedding cache: a memory-mapped float32 matrix plus a
+# hash -> row index kept in least-recently-used order.
+#
+# Several processes (app job workers, cli.py watch, the CLI) share one cache
+# directory. Every read and write holds a flock() on the LOCK file and first
+# reloads index.json if another process replaced it, and every write persists
+# the index before releasing the lock, so two processes never hand out the
+# same row. The vector file is only ever grown or atomically replaced, never
+# shrunk or deleted, so other processes' memory maps stay valid.
+class EmbeddingCache:
+    def __init__(self, cache_dir=EMBEDDING_CACHE_DIR, max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._lock_path = os.path.join(cache_dir, "LOCK")
+        self._index_path = os.path.join(cache_dir, "index.json")
+        self._vectors_path = os.path.join(cache_dir, "vectors.f32")
+        self._entries = OrderedDict()
+        self._free_rows = []
+        self._dim = None
+        self._capacity = 0
+        self._vectors = None
+        self._index_version = None
+        # Keys read since the last write, re-applied to the LRU order after a reload
+        self._touched = OrderedDict()
+
+    # Context manager holding the in-process lock and a shared (reads) or
+    # exclusive (writes) flock(), with the state reloaded from disk
+    @contextmanager
+    def _locked(self, exclusive):
+        with self._lock:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self._lock_path, "a", encoding="utf-8") as f:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                try:
+                    self._refresh()
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    # Reload index.json and remap the vectors if another process changed them
+    def _refresh(self):
+        index_version = _file_version(self._index_path)
+        if index_version is not None and index_version == self._index_version:
+            return
+        self._index_version = index_version
+        self._entries = OrderedDict()
+        self._free_rows = []
+        self._dim = None
+        self._capacity = 0
+        if index_version is None:
+            self._vectors = None
+            return
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            dim = state["dim"]
+            entries = OrderedDict((key, row) for key, row in state["entries"])
+            capacity = os.path.getsize(self._vectors_path) // (dim * 4)
+            if any(not 0 <= row < capacity for row in entries.values()):
+                raise ValueError("index refers to rows past the end of the vector file")
+        except (OSError, ValueError, KeyError, TypeError, ZeroDivisionError):
+            # Corrupt or partial: start over, the next write replaces both files
+            self._vectors = None
+            return
+
+        self._dim = dim
+        self._capacity = capacity
+        self._entries = entries
+        for key in self._touched:
+            if key in entries:
+                entries.move_to_end(key)
+        used = set(entries.values())
+        self._free_rows = [row for row in range(capacity) if row not in used]
+        # The file may have grown or been replaced by another process
+        self._vectors = None
+        if capacity:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, dim))
+
+    # Start an empty cache for vectors of `dim` dimensions, e.g. when the file
+    # is corrupt or the dimension changed. The vector file is replaced rather
+    # than deleted or truncated, as other processes may have it mapped.
+    def _reset(self, dim):
+        self._vectors = None
+        tmp_path = f"{self._vectors_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb"):
+            pass
+        os.replace(tmp_path, self._vectors_path)
+        self._entries = OrderedDict()
+        self._free_rows = []
+        self._dim = dim
+        self._capacity = 0
+
+    def _grow(self):
+        new_capacity = min(self._capacity + _GROW_ROWS, self.max_entries)
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        # Growing keeps the existing rows in place for other processes' maps
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(new_capacity * self._dim * 4)
+        self._vectors = np.memmap(
+            self._vectors_path, dtype=np.float32, mode="r+", shape=(new_capacity, self._dim)
+        )
+        self._free_rows.extend(range(self._capacity, new_capacity))
+        self._capacity = new_capacity
+
+    # Function to pick a row for a new entry; returns (row, evicted key or None)
+    def _allocate_row(self):
+        if not self._free_rows and self._capacity < self.max_entries:
+            self._grow()
+        if self._free_rows:
+            return self._free_rows.pop(), None
+        # Cache is full: evict the least recently used entry and reuse its row
+        key, row = self._entries.popitem(last=False)
+        return row, key
+
+    # Write the vectors and the LRU index to disk (including the order of
+    # entries read since the last write), leaving out the `exclude` keys;
+    # called with the exclusive lock held
+    def _write_index(self, exclude=()):
+        if self._vectors is not None:
+            self._vectors.flush()
+        entries = [(key, row) for key, row in self._entries.items() if key not in exclude]
+        tmp_path = f"{self._index_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": self._dim, "entries": entries}, f)
+        os.replace(tmp_path, self._index_path)
+        self._index_version = _file_version(self._index_path)
+        self._touched.clear()
+
+    # Function to look up several keys at once; returns a vector or None per key
+    def get_many(self, keys):
+        with self._locked(exclusive=False):
+            vectors = []
+            for key in keys:
+                row = self._entries.get(key)
+                if row is None:
+                    self.misses += 1
+                    vectors.append(None)
+                    continue
+                self._entries.move_to_end(key)
+                self._touched[key] = None
+                self.hits += 1
+                vectors.append(self._vectors[row].tolist())
+            return vectors
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    # Function to store (key, vector) pairs and persist them before other
+    # processes can allocate rows
+    def put_many(self, items):
+        with self._locked(exclusive=True):
+            pending = OrderedDict()
+            new_keys = set()
+            evicted = False
+            for key, vector in items:
+                if len(vector) != self._dim:
+                    self._reset(len(vector))
+                    pending.clear()
+                    new_keys.clear()
+
+                if key not in self._entries:
+                    row, evicted_key = self._allocate_row()
+                    if evicted_key is not None:
+                        evicted = True
+                        pending.pop(evicted_key, None)
+                        new_keys.discard(evicted_key)
+                    self._entries[key] = row
+                    new_keys.add(key)
+                self._entries.move_to_end(key)
+                pending[key] = vector
+
+            # Persist the index without the evicted keys before their rows are
+            # overwritten, so a crash in between cannot leave a key mapped to
+            # another text's vector
+            if evicted:
+                self._write_index(exclude=new_keys)
+            for key, vector in pending.items():
+                self._vectors[self._entries[key]] = np.asarray(vector, dtype=np.float32)
+            self._write_index()
+
+    def put(self, key, vector):
+        self.put_many([(key, vector)])
+
+    def stats(self):
+        with self._locked(exclusive=False):
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Embeddings wrapper that only sends cache misses to the underlying client
+class CachedEmbeddings(Embeddings):
+    def __init__(self, embeddings, cache, model):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model
+
+    def embed_documents(self, texts):
+        keys = [embedding_key(self.model, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+
+        # Embed each distinct missing text once
+        missing = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None and key not in missing:
+                missing[key] = text
+
+        if missing:
+            with span("embed"):
+                new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), new_vectors))
+            self.cache.put_many(computed.items())
+            vectors = [computed[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+
+        return vectors
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
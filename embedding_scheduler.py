@@ -0,0 +1,119 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.embeddings import Embeddings
+
+from config import (
+    EMBED_BATCH_SIZE,
+    EMBED_CONCURRENCY,
+    EMBED_MAX_RETRIES,
+    EMBED_REQUESTS_PER_MINUTE,
+)
+
+
+# Token bucket limiting how many requests can start per second
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# Function to tell whether an exception is a quota / HTTP 429 error
+def is_rate_limit_error(exc):
+    for attr in ("status_code", "code"):
+        if getattr(exc, attr, None) == 429:
+            return True
+    message = f"{type(exc).__name__} {exc}".lower()
+    return "429" in message or "resourceexhausted" in message or "resource exhausted" in message or "quota" in message
+
+
+# Embeddings wrapper that splits documents into batches, sends them on a bounded
+# thread pool under a token-bucket rate limit and retries only failed batches
+# with exponential backoff on 429 errors.
+class EmbeddingScheduler(Embeddings):
+    def __init__(
+        self,
+        embeddings,
+        batch_size=EMBED_BATCH_SIZE,
+        max_workers=EMBED_CONCURRENCY,
+        requests_per_minute=EMBED_REQUESTS_PER_MINUTE,
+        max_retries=EMBED_MAX_RETRIES,
+        base_delay=1.0,
+        max_delay=60.0,
+    ):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.bucket = TokenBucket(requests_per_minute / 60.0, capacity=max_workers)
+        self._lock = threading.Lock()
+        self.chunks = 0
+        self.requests = 0
+        self.retries = 0
+        self.seconds = 0.0
+
+    def _call_with_retry(self, fn, *args):
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            with self._lock:
+                self.requests += 1
+            try:
+                return fn(*args)
+            except Exception as exc:
+                if not is_rate_limit_error(exc) or attempt == self.max_retries:
+                    raise
+                with self._lock:
+                    self.retries += 1
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+                time.sleep(delay * random.uniform(0.5, 1.0))
+
+    def _embed_batch(self, batch):
+        return self._call_with_retry(self.embeddings.embed_documents, batch)
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        start = time.perf_counter()
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1:
+            results = [self._embed_batch(batches[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as pool:
+                results = list(pool.map(self._embed_batch, batches))
+
+        with self._lock:
+            self.chunks += len(texts)
+            self.seconds += time.perf_counter() - start
+        return [vector for batch in results for vector in batch]
+
+    def embed_query(self, text):
+        return self._call_with_retry(self.embeddings.embed_query, text)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "chunks": self.chunks,
+                "requests": self.requests,
+                "retries": self.retries,
+                "seconds": self.seconds,
+                "chunks_per_second": self.chunks / self.seconds if self.seconds else 0.0,
+            }
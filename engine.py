@@ -0,0 +1,361 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from answer_cache import context_key, replay
+from config import (
+    ANSWER_CACHE_ENABLED,
+    CHUNK_OVERLAP,
+    CHUNK_SIZE,
+    CONTEXT_CANDIDATES,
+    EXTRACTION_WORKERS,
+    INGEST_BATCH_SIZE,
+    STREAM_QUEUE_SIZE,
+)
+from context_builder import build_context
+from extraction import SourceFile, batched, count_pages, iter_pages, open_stream, spill_to_disk
+from ingest import chunk_ids_for, stream_hash
+from splitter import TextSplitter
+from streaming import END, chunk_text, produce_tokens
+from telemetry import mark, span, timed_iter
+
+# LangChain, FAISS and the Gemini SDK are imported on first use: the app imports
+# this module on every cold start, usually long before a document is processed.
+
+DEFAULT_NAMESPACE = "default"
+NO_INDEX_MESSAGE = "Error: Please upload and process documents first."
+
+_registry = None
+_extraction_pool = None
+_lock = threading.Lock()
+
+
+# Shared registry so each index is loaded once per process, not per question
+def get_index_registry():
+    global _registry
+    with _lock:
+        if _registry is None:
+            from index_manager import IndexRegistry
+
+            _registry = IndexRegistry()
+        return _registry
+
+
+# Shared process pool for CPU-bound PDF parsing. Workers are started from a
+# fork server (or spawned where that is unavailable) rather than forked, since
+# forking a threaded server can copy locks held by other threads.
+def get_extraction_pool():
+    global _extraction_pool
+    with _lock:
+        if _extraction_pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _extraction_pool = ProcessPoolExecutor(
+                max_workers=EXTRACTION_WORKERS, mp_context=multiprocessing.get_context(method)
+            )
+        return _extraction_pool
+
+
+# Function to create the text splitter used for chunking
+def get_text_splitter():
+    return TextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+
+# Function to build the answer prompt template
+def build_prompt():
+    Prompt_template = """
+        You are a friendly assistant that can understand and reply in English, Hinglish, and any local language supported by Gemini. 
+        Always answer based on the provided context; if the answer is not in the context, say exactly "Answer is not available in the provided context" and do not fabricate details.
+        Keep the tone concise, helpful, and add fitting emojis for warmth and clarity. If the user greets, thanks, or chats casually, respond briefly and politely.
+        Each context passage starts with a [number] and its source; cite the passages you use by their [number].
+
+        Context:
+        {context}
+
+        Question:
+        {question}
+
+        Answer:
+        """
+
+    from langchain_core.prompts import PromptTemplate
+
+    return PromptTemplate(template=Prompt_template, input_variables=["context", "question"])
+
+
+# Function to describe where a chunk comes from, e.g. "report.pdf, p. 3-4"
+def cite(doc):
+    metadata = doc.metadata
+    if "source" not in metadata:
+        return "unknown source"
+    page, page_end = metadata.get("page"), metadata.get("page_end")
+    if page is None:
+        return metadata["source"]
+    pages = f"p. {page}" if page_end in (None, page) else f"p. {page}-{page_end}"
+    return f"{metadata['source']}, {pages}"
+
+
+# Function to format the numbered source list appended to an answer
+def format_sources(docs):
+    if not docs:
+        return ""
+    return "\n\nSources:\n" + "\n".join(f"[{number}] {cite(doc)}" for number, doc in enumerate(docs, 1))
+
+
+# Headless ingestion and question answering over one index namespace.
+# The Streamlit app, the CLI and batch jobs all drive the pipeline through it.
+class Engine:
+    def __init__(self, namespace=DEFAULT_NAMESPACE, registry=None):
+        self.namespace = namespace
+        self.registry = registry or get_index_registry()
+
+    @property
+    def index_manager(self):
+        return self.registry.get(self.namespace)
+
+    # Ingest documents from file paths; see ingest_files()
+    def ingest(self, paths, progress=None, remove_missing=True):
+        return self.ingest_files([SourceFile.from_path(path) for path in paths], progress, remove_missing)
+
+    # Update the index with only the documents that changed. With remove_missing,
+    # indexed documents not among `files` are deleted. Returns the added, removed
+    # and unchanged file hashes. progress(file_name, pages_done, total_pages) is
+    # called as pages are extracted, and check_cancelled() before each batch is
+    # embedded and before publishing; either may raise to abort the run. With an
+    # IngestCheckpoint, progress is saved after documents are added and an
+    # interrupted run resumes from it.
+    def ingest_files(self, files, progress=None, remove_missing=True, checkpoint=None, check_cancelled=None):
+        from langchain_community.vectorstores import FAISS
+
+        from index_factory import supports_removal, to_flat
+        from snapshot import ArenaDocstore
+
+        index_manager = self.index_manager
+        with index_manager.writing():
+            manifest = index_manager.load_manifest()
+            uploads = {}
+            for file in files:
+                with open_stream(file) as stream:
+                    uploads[stream_hash(stream)] = file
+            added, removed, unchanged = manifest.diff(uploads)
+            if not remove_missing:
+                removed = []
+            if not added and not removed:
+                return added, removed, unchanged
+
+            # Work on a private copy; queries keep using the live index until save()
+            base_version = index_manager.store.current_version(self.namespace)
+            with span("load_index"):
+                restored = checkpoint.load(base_version, index_manager.get_embeddings()) if checkpoint else None
+                if restored is not None:
+                    vectorstore, manifest, lexical_index = restored
+                else:
+                    vectorstore, manifest, lexical_index = index_manager.load_for_update()
+
+            # Delete vectors of documents that are no longer uploaded. Indexes that
+            # cannot delete in place are flattened; save() rebuilds the right type.
+            for doc_hash in removed:
+                if doc_hash not in manifest.documents:
+                    continue
+                ids = manifest.remove(doc_hash)
+                if ids and vectorstore is not None:
+                    with span("delete"):
+                        if not supports_removal(vectorstore.index):
+                            vectorstore.index = to_flat(vectorstore.index)
+                        vectorstore.delete(ids)
+                        lexical_index.remove_many(ids)
+
+            # Stream pages of each new document from disk through the splitter
+            # and flush them to the index in memory-bounded batches
+            text_splitter = get_text_splitter()
+            for doc_hash in added:
+                if doc_hash in manifest.documents:
+                    continue
+                file = uploads[doc_hash]
+                with spill_to_disk(file) as path:
+                    total_pages = count_pages(path, file.type)
+
+                    def page_texts():
+                        pages = iter_pages(path, file.type, get_extraction_pool())
+                        for page_number, text in timed_iter(pages, "extract"):
+                            if progress:
+                                progress(file.name, page_number, total_pages)
+                            yield page_number, text
+
+                    ids = []
+                    chunks = timed_iter(text_splitter.split_pages(page_texts()), "split")
+                    for batch in batched(chunks, INGEST_BATCH_SIZE):
+                        if check_cancelled:
+                            check_cancelled()
+                        texts = [text for text, _ in batch]
+                        metadatas = [dict(metadata, source=file.name, doc=doc_hash) for _, metadata in batch]
+                        batch_ids = chunk_ids_for(doc_hash, len(batch), start=len(ids))
+                        with span("index_add"):
+                            if vectorstore is None:
+                                vectorstore = FAISS.from_texts(
+                                    texts,
+                                    index_manager.get_embeddings(),
+                                    metadatas=metadatas,
+                                    ids=batch_ids,
+                                    docstore=ArenaDocstore(),
+                                )
+                            else:
+                                vectorstore.add_texts(texts, metadatas=metadatas, ids=batch_ids)
+                        with span("lexical_index"):
+                            for chunk_id, text in zip(batch_ids, texts):
+                                lexical_index.add(chunk_id, text)
+                        ids.extend(batch_ids)
+                manifest.add(doc_hash, file.name, ids)
+                if checkpoint and vectorstore is not None:
+                    with span("checkpoint"):
+                        checkpoint.save(base_version, vectorstore, manifest, lexical_index)
+
+            if check_cancelled:
+                check_cancelled()
+            with span("save"):
+                if vectorstore is None or not vectorstore.index_to_docstore_id:
+                    index_manager.clear()
+                else:
+                    index_manager.save(vectorstore, manifest, lexical_index, base_version)
+        return added, removed, unchanged
+
+    # Return the top-k chunks for a question, or None when there is no index.
+    # `sources` limits the search to the named documents.
+    def query(self, question, k=3, sources=None):
+        return self.index_manager.similarity_search(question, k=k, sources=sources)
+
+    # Return the names of the indexed documents
+    def sources(self):
+        return self.index_manager.sources()
+
+    # Function to retrieve k candidate chunks and pack them into the answer
+    # context: (docs, index version); docs is None without an index
+    def _retrieve(self, question, k, sources=None):
+        index_manager = self.index_manager
+        docs, version = index_manager.retrieve(question, k, sources)
+        if docs:
+            with span("context_pack"):
+                docs = build_context(docs, index_manager.embed_query(question), index_manager.chunk_vectors(docs))
+        return docs, version
+
+    # Function to look up a cached answer; also returns the key to store a new one under
+    def _lookup_answer(self, question, docs, version):
+        index_manager = self.index_manager
+        cache_key = (index_manager.embed_query(question), context_key(docs), version)
+        with span("answer_cache"):
+            return index_manager.answer_cache.lookup(*cache_key), cache_key
+
+    def _store_answer(self, cache_key, answer):
+        self.index_manager.answer_cache.store(*cache_key, answer)
+
+    # The chat model is created once per process and kept by the registry
+    def _prepare_model(self):
+        with span("model_prepare"):
+            return build_prompt(), self.registry.get_chat_model()
+
+    @staticmethod
+    def _format_prompt(prompt, docs, question):
+        with span("prompt_format"):
+            # Combine retrieved docs into a single context string, each labelled with its source
+            context_text = "\n\n".join(
+                f"[{number}] {cite(doc)}\n{doc.page_content}" for number, doc in enumerate(docs, 1)
+            )
+            return prompt.format(context=context_text, question=question)
+
+    # Stream the answer to a question as text pieces, ending with the sources
+    # of the context. k candidate chunks are retrieved and packed into the
+    # context by _retrieve(). `sources` limits the search to the named documents.
+    def answer(self, question, k=CONTEXT_CANDIDATES, use_answer_cache=ANSWER_CACHE_ENABLED, sources=None):
+        docs, version = self._retrieve(question, k, sources)
+        if docs is None:
+            yield NO_INDEX_MESSAGE
+            return
+
+        # Replay a cached answer for a near-identical question over the same context
+        if use_answer_cache:
+            cached_answer, cache_key = self._lookup_answer(question, docs, version)
+            if cached_answer is not None:
+                mark("first_token")
+                yield from replay(cached_answer)
+                return
+
+        prompt, model = self._prepare_model()
+        full_prompt = self._format_prompt(prompt, docs, question)
+
+        # Stream model output directly
+        answer_parts = []
+        for chunk in timed_iter(model.stream(full_prompt), "model_stream"):
+            content = chunk_text(chunk)
+            mark("first_token")
+            answer_parts.append(content)
+            yield content
+
+        footer = format_sources(docs)
+        answer_parts.append(footer)
+        yield footer
+
+        if use_answer_cache:
+            self._store_answer(cache_key, "".join(answer_parts))
+
+    # Async version of answer(). Query embedding and retrieval run concurrently
+    # with prompt and model preparation, and tokens flow through a bounded
+    # queue. Closing the generator (or cancelling its task) cancels the model
+    # request; blocking retrieval threads finish but their result is dropped.
+    async def answer_async(self, question, k=CONTEXT_CANDIDATES, use_answer_cache=ANSWER_CACHE_ENABLED, queue_size=STREAM_QUEUE_SIZE,
+                           sources=None):
+        retrieval = asyncio.create_task(asyncio.to_thread(self._retrieve, question, k, sources))
+        preparation = asyncio.create_task(asyncio.to_thread(self._prepare_model))
+        producer = None
+        try:
+            docs, version = await retrieval
+            if docs is None:
+                yield NO_INDEX_MESSAGE
+                return
+
+            # Replay a cached answer for a near-identical question over the same context
+            if use_answer_cache:
+                cached_answer, cache_key = await asyncio.to_thread(self._lookup_answer, question, docs, version)
+                if cached_answer is not None:
+                    mark("first_token")
+                    for piece in replay(cached_answer):
+                        yield piece
+                    return
+
+            prompt, model = await preparation
+            full_prompt = self._format_prompt(prompt, docs, question)
+
+            queue = asyncio.Queue(maxsize=queue_size)
+            producer = asyncio.create_task(produce_tokens(model, full_prompt, queue))
+            answer_parts = []
+            while True:
+                item = await queue.get()
+                if item is END:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                mark("first_token")
+                answer_parts.append(item)
+                yield item
+
+            footer = format_sources(docs)
+            answer_parts.append(footer)
+            yield footer
+
+            if use_answer_cache:
+                self._store_answer(cache_key, "".join(answer_parts))
+        finally:
+            for task in (retrieval, preparation, producer):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    # Keep the namespace when idle; used for shared collections rather than sessions
+    def pin(self):
+        self.index_manager.store.pin(self.namespace)
+
+    def is_pinned(self):
+        return self.index_manager.store.is_pinned(self.namespace)
+
+    # Delete the namespace's index. Does not wait for a running writer, whose
+    # publish then fails instead of restoring the index.
+    def clear(self):
+        self.index_manager.clear()
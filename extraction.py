@@ -0,0 +1,188 @@
+import io
+import os
+import shutil
+import tempfile
+from collections import deque
+from contextlib import contextmanager
+
+from config import EXTRACTION_MAX_INFLIGHT, PAGES_PER_TASK, SPILL_DIR
+
+PDF_TYPE = "application/pdf"
+DOCX_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+FILE_TYPES = {".pdf": PDF_TYPE, ".docx": DOCX_TYPE}
+
+_COPY_BUFFER_BYTES = 1024 * 1024
+
+
+# PyPDF2 and python-docx are imported on first use, keeping them out of the
+# app's cold start until a document is actually processed
+
+# Worker function: extract the text of pages [start, stop) of a PDF on disk.
+# Pages without a text layer (scans) are OCR'd when OCR is available; page
+# ranges run on the extraction pool, so scans are OCR'd in parallel.
+def _extract_pdf_pages(path, start, stop):
+    from PyPDF2 import PdfReader
+
+    from ocr import needs_ocr, ocr_available, ocr_page
+
+    pdf_reader = PdfReader(path)
+    pages = []
+    for i in range(start, stop):
+        page = pdf_reader.pages[i]
+        text = page.extract_text() or ""
+        if needs_ocr(text) and ocr_available():
+            try:
+                text = ocr_page(page) or text
+            except Exception:
+                # Unreadable or unsupported images: keep the extracted text
+                pass
+        pages.append(text)
+    return pages
+
+
+# Worker function: extract a Word document as a single page, one paragraph
+# per line. Headings are preceded by a blank line so the splitter starts a
+# new section there.
+def _extract_docx(path):
+    from docx import Document
+
+    doc = Document(path)
+    lines = []
+    for para in doc.paragraphs:
+        style = para.style.name if para.style is not None else ""
+        if lines and style.startswith(("Heading", "Title")):
+            lines.append("")
+        lines.append(para.text)
+    return ["\n".join(lines) + "\n"]
+
+
+# Function to open an uploaded or local document as a binary stream
+def open_stream(file):
+    path = getattr(file, "path", None)
+    if path:
+        return open(path, "rb")
+    if hasattr(file, "seek") and hasattr(file, "read"):
+        file.seek(0)
+        return _Unclosable(file)
+    return io.BytesIO(file.getvalue())
+
+
+# Stream wrapper that leaves the underlying upload open when closed
+class _Unclosable(io.RawIOBase):
+    def __init__(self, file):
+        self._file = file
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._file.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+# Context manager giving a filesystem path for a document. Uploads are copied
+# to a temp file in blocks, so extraction workers read pages from disk instead
+# of each receiving a copy of the whole file.
+@contextmanager
+def spill_to_disk(file):
+    path = getattr(file, "path", None)
+    if path:
+        yield path
+        return
+    if SPILL_DIR:
+        os.makedirs(SPILL_DIR, exist_ok=True)
+    suffix = os.path.splitext(getattr(file, "name", ""))[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix, dir=SPILL_DIR or None, delete=False) as tmp:
+        with open_stream(file) as stream:
+            shutil.copyfileobj(stream, tmp, _COPY_BUFFER_BYTES)
+    try:
+        yield tmp.name
+    finally:
+        os.remove(tmp.name)
+
+
+# Function to count the pages of a document on disk
+def count_pages(path, file_type):
+    if file_type == PDF_TYPE:
+        from PyPDF2 import PdfReader
+
+        return len(PdfReader(path).pages)
+    if file_type == DOCX_TYPE:
+        return 1
+    return 0
+
+
+# Function to yield (page_number, text) pairs in order while later pages are
+# being extracted on the executor. At most `max_inflight` page ranges are
+# queued or held at once, so extraction cannot run far ahead of a slow consumer.
+def iter_pages(path, file_type, executor, max_inflight=EXTRACTION_MAX_INFLIGHT):
+    if file_type == PDF_TYPE:
+        total = count_pages(path, file_type)
+        tasks = iter([(_extract_pdf_pages, path, start, min(start + PAGES_PER_TASK, total))
+                      for start in range(0, total, PAGES_PER_TASK)])
+    elif file_type == DOCX_TYPE:
+        tasks = iter([(_extract_docx, path)])
+    else:
+        return
+
+    futures = deque()
+    page_number = 0
+    try:
+        for task in tasks:
+            futures.append(executor.submit(*task))
+            if len(futures) < max_inflight:
+                continue
+            for text in futures.popleft().result():
+                page_number += 1
+                yield page_number, text
+        while futures:
+            for text in futures.popleft().result():
+                page_number += 1
+                yield page_number, text
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+# Function to group an iterable into lists of at most `size` items
+def batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# File-like document with the same interface as a Streamlit UploadedFile.
+# Documents created from a path are read from disk on demand.
+class SourceFile:
+    def __init__(self, name, type, data=None, path=None):
+        self.name = name
+        self.type = type
+        self.path = path
+        self.size = os.path.getsize(path) if path else len(data)
+        self._data = data
+
+    @classmethod
+    def from_path(cls, path):
+        return cls(os.path.basename(path), FILE_TYPES[os.path.splitext(path)[1].lower()], path=path)
+
+    def getvalue(self):
+        if self._data is not None:
+            return self._data
+        with open(self.path, "rb") as f:
+            return f.read()
+
+
+# Function to list the supported documents under a directory
+def find_documents(directory):
+    paths = []
+    for root, _, names in os.walk(directory):
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() in FILE_TYPES:
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
@@ -0,0 +1,86 @@
+import hashlib
+import math
+import threading
+import time
+
+from langchain_core.embeddings import Embeddings
+
+
+# Error raised by FakeEmbeddings to simulate a quota response
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+
+# Deterministic local stand-in for GoogleGenerativeAIEmbeddings.
+# Every `rate_limit_every`-th request fails with a 429 error.
+class FakeEmbeddings(Embeddings):
+    def __init__(self, dim=64, latency=0.0, rate_limit_every=0):
+        self.dim = dim
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _vector(self, text):
+        values = []
+        counter = 0
+        while len(values) < self.dim:
+            digest = hashlib.sha256(f"{counter}:{text}".encode("utf-8")).digest()
+            values.extend(b / 127.5 - 1.0 for b in digest)
+            counter += 1
+        values = values[:self.dim]
+        norm = math.sqrt(sum(v * v for v in values)) or 1.0
+        return [v / norm for v in values]
+
+    def _request(self):
+        with self._lock:
+            self.calls += 1
+            calls = self.calls
+        if self.latency:
+            time.sleep(self.latency)
+        if self.rate_limit_every and calls % self.rate_limit_every == 0:
+            raise FakeRateLimitError("429 Resource has been exhausted (fake)")
+
+    def embed_documents(self, texts):
+        self._request()
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        self._request()
+        return self._vector(text)
+
+
+# Deterministic local stand-in for ChatGoogleGenerativeAI. stream() waits
+# `first_token_latency` seconds, then yields the answer word by word at
+# `tokens_per_second`.
+class FakeChatModel:
+    def __init__(self, first_token_latency=0.0, tokens_per_second=0.0, answer_words=60):
+        self.first_token_latency = first_token_latency
+        self.tokens_per_second = tokens_per_second
+        self.answer_words = answer_words
+
+    def _answer(self, prompt):
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return [f"word{digest[i % len(digest)]}{i} " for i in range(self.answer_words)]
+
+    def stream(self, prompt):
+        from langchain_core.messages import AIMessageChunk
+
+        if self.first_token_latency:
+            time.sleep(self.first_token_latency)
+        for word in self._answer(str(prompt)):
+            yield AIMessageChunk(content=word)
+            if self.tokens_per_second:
+                time.sleep(1.0 / self.tokens_per_second)
+
+    async def astream(self, prompt):
+        import asyncio
+
+        from langchain_core.messages import AIMessageChunk
+
+        if self.first_token_latency:
+            await asyncio.sleep(self.first_token_latency)
+        for word in self._answer(str(prompt)):
+            yield AIMessageChunk(content=word)
+            if self.tokens_per_second:
+                await asyncio.sleep(1.0 / self.tokens_per_second)
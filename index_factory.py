@@ -0,0 +1,420 @@
+import argparse
+import json
+import math
+import time
+
+import faiss
+import numpy as np
+
+from config import (
+    FAISS_EF_SEARCH,
+    FAISS_INDEX_TYPE,
+    FAISS_IVF_MIN_CHUNKS,
+    FAISS_IVFPQ_MIN_CHUNKS,
+    FAISS_NPROBE,
+    VECTOR_DIM,
+    VECTOR_REDUCTION,
+    VECTOR_RESCORE_FACTOR,
+    VECTOR_STORAGE,
+)
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+
+# Index types that keep the original vectors and can be rebuilt losslessly
+_EXACT_STORAGE_TYPES = ("flat", "ivf", "hnsw")
+
+# FAISS wants roughly this many training points per IVF centroid
+_TRAIN_POINTS_PER_LIST = 39
+# IVF indexes are retrained once the corpus calls for this many times the
+# lists they were trained with
+_RETRAIN_GROWTH = 2
+_HNSW_NEIGHBORS = 32
+_PQ_BITS = 8
+_PQ_MAX_SUBQUANTIZERS = 64
+
+# Compact vector storage: scalar quantizer per storage type, and the ways to
+# reduce dimensionality
+VECTOR_STORAGES = ("float32", "float16", "int8")
+VECTOR_REDUCTIONS = ("truncate", "pca")
+_SCALAR_QUANTIZERS = {"float16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}
+
+
+# Function to pick an index type for a number of chunks
+def choose_index_type(n_chunks):
+    if n_chunks >= FAISS_IVFPQ_MIN_CHUNKS:
+        return "ivfpq"
+    if n_chunks >= FAISS_IVF_MIN_CHUNKS:
+        return "ivf"
+    return "flat"
+
+
+# Function to get the index that runs a search, looking through the exact
+# re-scoring and dimension reduction wrappers of a compact index
+def _search_index(index):
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexRefine):
+        index = faiss.downcast_index(index.base_index)
+    if isinstance(index, faiss.IndexPreTransform):
+        index = faiss.downcast_index(index.index)
+    return index
+
+
+# Function to tell which of INDEX_TYPES an index is. An index served with
+# re-scoring reports the type of the index it searches first, which for compact
+# copies is also the type of the exact index.
+def index_type_of(index):
+    index = _search_index(index)
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+
+def _nlist_for(n_chunks):
+    nlist = int(4 * math.sqrt(n_chunks))
+    return max(1, min(nlist, n_chunks // _TRAIN_POINTS_PER_LIST))
+
+
+def _pq_subquantizers(dim):
+    for m in range(min(_PQ_MAX_SUBQUANTIZERS, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+# Function to build and fill an index of the given type from an (n, dim) float32 matrix.
+# Types that need more training data than available fall back to a flat index.
+# PQ codes are lossy, so IVF-PQ indexes keep the exact vectors beside them, for
+# re-scoring and for retraining when the corpus grows or documents are removed.
+def build_index(vectors, index_type=FAISS_INDEX_TYPE):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n_chunks, dim = vectors.shape
+    if index_type == "auto":
+        index_type = choose_index_type(n_chunks)
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type: {index_type}")
+
+    nlist = _nlist_for(n_chunks)
+    if index_type == "ivfpq" and n_chunks < 2 ** _PQ_BITS * _TRAIN_POINTS_PER_LIST:
+        index_type = "ivf"
+    if index_type == "ivf" and n_chunks < _TRAIN_POINTS_PER_LIST:
+        index_type = "flat"
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, _HNSW_NEIGHBORS)
+    elif index_type == "ivf":
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, nlist)
+    else:
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, nlist, _pq_subquantizers(dim), _PQ_BITS)
+
+    if not index.is_trained:
+        index.train(vectors)
+    if index_type == "ivfpq":
+        index = rescoring_index(index, faiss.IndexFlatL2(dim))
+    index.add(vectors)
+    set_search_params(index)
+    return index
+
+
+# Function to build the compact serving copy of an index's vectors: scalar
+# quantized to float16 or int8 and/or reduced to `dim` dimensions, either by
+# Matryoshka truncation (the leading dimensions, renormalized) or by PCA. The
+# copy has the same index type as the exact index. PCA needs at least `dim`
+# chunks to fit; smaller collections are only quantized. Returns None when the
+# settings keep the exact vectors, or for IVF-PQ indexes, which are compressed
+# already.
+def build_compact_index(vectors, index_type, storage=VECTOR_STORAGE, dim=VECTOR_DIM, reduction=VECTOR_REDUCTION):
+    if storage not in VECTOR_STORAGES:
+        raise ValueError(f"Unknown vector storage: {storage}")
+    if reduction not in VECTOR_REDUCTIONS:
+        raise ValueError(f"Unknown dimension reduction: {reduction}")
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n_chunks, full_dim = vectors.shape
+    reduce = 0 < dim < full_dim and (reduction != "pca" or n_chunks >= dim)
+    if index_type == "ivfpq" or n_chunks == 0 or (storage == "float32" and not reduce):
+        return None
+
+    out_dim = dim if reduce else full_dim
+    qtype = _SCALAR_QUANTIZERS.get(storage)
+    if index_type == "ivf":
+        quantizer = faiss.IndexFlatL2(out_dim)
+        nlist = _nlist_for(n_chunks)
+        if qtype is None:
+            index = faiss.IndexIVFFlat(quantizer, out_dim, nlist)
+        else:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, out_dim, nlist, qtype)
+    elif index_type == "hnsw":
+        if qtype is None:
+            index = faiss.IndexHNSWFlat(out_dim, _HNSW_NEIGHBORS)
+        else:
+            index = faiss.IndexHNSWSQ(out_dim, qtype, _HNSW_NEIGHBORS)
+    elif qtype is None:
+        index = faiss.IndexFlatL2(out_dim)
+    else:
+        index = faiss.IndexScalarQuantizer(out_dim, qtype)
+
+    if reduce:
+        if reduction == "pca":
+            index = faiss.IndexPreTransform(faiss.PCAMatrix(full_dim, dim), index)
+        else:
+            index = faiss.IndexPreTransform(faiss.NormalizationTransform(dim), index)
+            index.prepend_transform(_truncation(full_dim, dim))
+    index.train(vectors)
+    index.add(vectors)
+    set_search_params(index)
+    return index
+
+
+# Transform keeping the first `dim` of `full_dim` dimensions
+def _truncation(full_dim, dim):
+    dimensions = np.arange(dim, dtype=np.int32)
+    return faiss.RemapDimensionsTransform(full_dim, dim, faiss.swig_ptr(dimensions))
+
+
+# Function to get the number of dimensions an index searches in, after any
+# dimension reduction
+def search_dim(index):
+    return _search_index(index).d
+
+
+# Function to serve a compact index with exact re-scoring: a search takes
+# k * k_factor candidates from the compact index and ranks them by their
+# exact vectors. Reconstructing a vector also reads the exact index.
+def rescoring_index(compact, exact, k_factor=VECTOR_RESCORE_FACTOR):
+    index = faiss.IndexRefine(compact, exact)
+    index.k_factor = k_factor
+    return index
+
+
+# Function to set the recall vs latency knobs on an index
+def set_search_params(index, nprobe=FAISS_NPROBE, ef_search=FAISS_EF_SEARCH):
+    index = _search_index(index)
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = min(nprobe, index.nlist)
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+
+
+# Function to build search parameters restricting a search to the given vector
+# positions. IVF probes and the HNSW beam widen with the filter's selectivity,
+# so a search over a small subset still finds its nearest neighbours.
+def filtered_search_params(index, positions, k, nprobe=FAISS_NPROBE, ef_search=FAISS_EF_SEARCH):
+    outer = faiss.downcast_index(index)
+    index = _search_index(outer)
+    selector = faiss.IDSelectorBatch(positions)
+    widen = max(1, index.ntotal // max(len(positions), 1))
+    if isinstance(index, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=min(nprobe * widen, index.nlist))
+    elif isinstance(index, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=max(min(ef_search * widen, index.ntotal), k))
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    # The parameters only hold a pointer to the selector
+    params.selector = selector
+    if isinstance(outer, faiss.IndexRefine):
+        refine_params = faiss.IndexRefineSearchParameters(base_index_params=params, k_factor=outer.k_factor)
+        refine_params.base_params = params
+        return refine_params
+    return params
+
+
+# Function to read every vector back out of an index, in id order. Indexes
+# served with re-scoring give their exact vectors.
+def reconstruct_all(index):
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexRefine):
+        index = faiss.downcast_index(index.refine_index)
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype=np.float32)
+    return index.reconstruct_n(0, index.ntotal)
+
+
+# Function to read the vectors at some positions back out of an index
+def reconstruct_positions(index, positions):
+    index = faiss.downcast_index(index)
+    if not len(positions):
+        return np.zeros((0, index.d), dtype=np.float32)
+    return np.vstack([index.reconstruct(int(position)) for position in positions])
+
+
+# Function to let IVF indexes look vectors up by position (needed for reconstruct)
+def enable_reconstruct(index):
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexRefine):
+        index = faiss.downcast_index(index.refine_index)
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+
+
+# Only flat indexes delete in place while keeping positions sequential, which
+# the vector store's position -> id map relies on. HNSW graphs cannot delete
+# at all, and IVF removal leaves gaps in the positions.
+def supports_removal(index):
+    return index_type_of(index) == "flat"
+
+
+# Function to convert an index to a flat one holding the same vectors
+def to_flat(index):
+    flat = faiss.IndexFlatL2(index.d)
+    flat.add(reconstruct_all(index))
+    return flat
+
+
+# Function to tell whether an index keeps the exact vectors it can be rebuilt from
+def has_exact_vectors(index):
+    return isinstance(faiss.downcast_index(index), faiss.IndexRefine) or index_type_of(index) in _EXACT_STORAGE_TYPES
+
+
+# Function to tell whether an IVF index was trained on a much smaller corpus
+# than it now holds: nlist grows with the training size, and a corpus calling
+# for _RETRAIN_GROWTH times the lists searches too many vectors per list
+def needs_retraining(index):
+    index = _search_index(index)
+    return isinstance(index, faiss.IndexIVF) and _nlist_for(index.ntotal) >= _RETRAIN_GROWTH * index.nlist
+
+
+# Function to rebuild a vector store's index from its exact vectors when the
+# chunk count calls for a different type, or when an IVF index needs
+# retraining. Indexes without exact vectors are left as is.
+def optimize_vectorstore(vectorstore, index_type=FAISS_INDEX_TYPE):
+    index = vectorstore.index
+    desired = choose_index_type(index.ntotal) if index_type == "auto" else index_type
+    if has_exact_vectors(index) and (desired != index_type_of(index) or needs_retraining(index)):
+        vectorstore.index = build_index(reconstruct_all(index), desired)
+    else:
+        set_search_params(vectorstore.index)
+
+
+# Function to measure recall@k and query latency of each index type against
+# the exact flat baseline
+def recall_benchmark(vectors, queries, k=10, index_types=INDEX_TYPES, nprobe=FAISS_NPROBE, ef_search=FAISS_EF_SEARCH):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    baseline = build_index(vectors, "flat")
+    _, truth = baseline.search(queries, k)
+
+    results = {}
+    for index_type in index_types:
+        start = time.perf_counter()
+        index = build_index(vectors, index_type)
+        build_seconds = time.perf_counter() - start
+        set_search_params(index, nprobe=nprobe, ef_search=ef_search)
+
+        start = time.perf_counter()
+        _, found = index.search(queries, k)
+        search_seconds = time.perf_counter() - start
+
+        hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+        results[index_type] = {
+            "built_as": index_type_of(index),
+            "recall_at_k": hits / (len(queries) * k),
+            "build_seconds": build_seconds,
+            "ms_per_query": 1000 * search_seconds / len(queries),
+        }
+    return results
+
+
+# Function to compute recall@k of found ids against the true nearest neighbours
+def _recall(truth, found):
+    return sum(len(set(t) & set(f)) for t, f in zip(truth, found)) / truth.size
+
+
+# Function to measure the memory and recall cost of compact vector storage:
+# bytes per vector of each (storage, dim, reduction) variant and recall@k of
+# its searches with and without exact re-scoring, against exact search
+def storage_benchmark(vectors, queries, variants, k=10, index_type="flat", k_factor=VECTOR_RESCORE_FACTOR):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    exact = build_index(vectors, index_type)
+    _, truth = faiss.knn(queries, vectors, k)
+
+    results = {"float32": {
+        "bytes_per_vector": len(faiss.serialize_index(exact)) / len(vectors),
+        "recall_at_k": _recall(truth, exact.search(queries, k)[1]),
+    }}
+    for storage, dim, reduction in variants:
+        compact = build_compact_index(vectors, index_type_of(exact), storage, dim, reduction)
+        if compact is None:
+            continue
+        rescoring = rescoring_index(compact, exact, k_factor)
+        start = time.perf_counter()
+        _, found = rescoring.search(queries, k)
+        search_seconds = time.perf_counter() - start
+        name = storage if not 0 < dim < vectors.shape[1] else f"{storage}/{dim}d/{reduction}"
+        results[name] = {
+            "bytes_per_vector": len(faiss.serialize_index(compact)) / len(vectors),
+            "recall_at_k": _recall(truth, compact.search(queries, k)[1]),
+            "recall_at_k_rescored": _recall(truth, found),
+            "ms_per_query_rescored": 1000 * search_seconds / len(queries),
+        }
+    return results
+
+
+# Function to measure the recall of a compact index served with re-scoring
+# against exact search over its own vectors, using stored vectors with a
+# little noise as queries. Returns None for indexes without a compact copy.
+def rescoring_recall(index, queries=100, k=10, seed=0):
+    index = faiss.downcast_index(index)
+    if not isinstance(index, faiss.IndexRefine) or index.ntotal == 0:
+        return None
+    enable_reconstruct(index)
+    vectors = reconstruct_all(index.refine_index)
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(vectors), min(queries, len(vectors)), replace=False)
+    noise = rng.standard_normal((len(picks), vectors.shape[1])).astype(np.float32)
+    sample = vectors[picks] + 0.1 * vectors.std() * noise
+    k = min(k, len(vectors))
+    _, truth = faiss.knn(sample, vectors, k)
+    return {
+        "k": k,
+        "recall_at_k": _recall(truth, index.base_index.search(sample, k)[1]),
+        "recall_at_k_rescored": _recall(truth, index.search(sample, k)[1]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k benchmark of FAISS index types or vector storage against exact search")
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=FAISS_NPROBE)
+    parser.add_argument("--ef-search", type=int, default=FAISS_EF_SEARCH)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--storage",
+        action="store_true",
+        help="Compare compact vector storage (float16, int8, truncation, PCA) on a flat index instead",
+    )
+    args = parser.parse_args()
+
+    # Clustered random vectors roughly resemble real embedding distributions
+    rng = np.random.default_rng(args.seed)
+    centers = rng.standard_normal((max(1, args.chunks // 100), args.dim)).astype(np.float32)
+    labels = rng.integers(0, len(centers), args.chunks + args.queries)
+    data = centers[labels] + 0.3 * rng.standard_normal((len(labels), args.dim)).astype(np.float32)
+    if args.storage:
+        variants = [
+            ("float16", 0, "truncate"),
+            ("int8", 0, "truncate"),
+            ("float16", args.dim // 2, "truncate"),
+            ("float16", args.dim // 4, "pca"),
+            ("int8", args.dim // 4, "pca"),
+        ]
+        print(json.dumps(storage_benchmark(data[:args.chunks], data[args.chunks:], variants, k=args.k), indent=2))
+        return
+    results = recall_benchmark(
+        data[:args.chunks], data[args.chunks:], k=args.k, nprobe=args.nprobe, ef_search=args.ef_search
+    )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from config import HYBRID_CANDIDATES, HYBRID_SEARCH, RRF_K, SESSION_GC_INTERVAL_SECONDS, VERSION_CHECK_SECONDS
+from answer_cache import AnswerCache
+from bm25 import BM25Index, reciprocal_rank_fusion
+from ingest import IngestManifest
+from metadata_index import MetadataIndex
+from retrieval_cache import RetrievalCache
+from session_store import SessionStore
+from telemetry import span
+
+# FAISS, LangChain and the embedding clients are imported inside the methods
+# that need them, so creating a manager for a session without an index (every
+# fresh app session) does not load them.
+
+
+# Keeps one namespace's FAISS index loaded between questions. The index is
+# reloaded when this manager publishes a new version with save() or clear(),
+# or when another process has published one (checked every
+# VERSION_CHECK_SECONDS). Snapshots are memory-mapped read-only, so processes
+# serving the same version share its pages through the OS page cache.
+class IndexManager:
+    def __init__(self, store, namespace, get_embeddings):
+        self.store = store
+        self.namespace = namespace
+        self.get_embeddings = get_embeddings
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.load_seconds_saved = 0.0
+        self.last_used = time.monotonic()
+        # Serializes writers; readers keep using the cached copy meanwhile
+        self.write_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._vectorstore = None
+        self._lexical_index = None
+        self._metadata_index = None
+        self._last_load_seconds = 0.0
+        self._checked_at = 0.0
+        self.retrieval_cache = RetrievalCache()
+        self.answer_cache = AnswerCache()
+
+    def exists(self):
+        return self.store.current_version(self.namespace) is not None
+
+    # Function to load a version's vector store. Snapshots are memory-mapped
+    # unless the copy is loaded for update.
+    def _load(self, version, read_only=True):
+        from snapshot import load_snapshot
+
+        path = self.store.version_dir(self.namespace, version)
+        return load_snapshot(path, self.get_embeddings(), read_only=read_only)
+
+    # Function to load a version for serving: (vectorstore, lexical index, metadata
+    # index). The lexical index is memory-mapped, and not opened at all without
+    # hybrid search.
+    def _open(self, version):
+        from index_factory import enable_reconstruct, set_search_params
+
+        vectorstore = self._load(version)
+        set_search_params(vectorstore.index)
+        enable_reconstruct(vectorstore.index)
+        lexical_index = None
+        if HYBRID_SEARCH:
+            lexical_index = BM25Index.load(self.store.version_dir(self.namespace, version))
+        return vectorstore, lexical_index, MetadataIndex.from_vectorstore(vectorstore)
+
+    # Function to check whether the published version differs from the loaded one.
+    # Reads the CURRENT pointer at most every VERSION_CHECK_SECONDS.
+    def _stale(self):
+        now = time.monotonic()
+        if now - self._checked_at < VERSION_CHECK_SECONDS:
+            return False
+        self._checked_at = now
+        return self.store.current_version(self.namespace) != self.version
+
+    # Function to return the loaded index, reading it from disk only when it is
+    # not loaded or a newer version has been published. Every load counts as a
+    # cache miss; hits are counted once per question by similarity_search().
+    # Returns ((vectorstore, lexical index, metadata index, version), whether it
+    # was loaded by this call), read together under the lock; the first item is
+    # None when there is no index.
+    def _acquire(self):
+        self.last_used = time.monotonic()
+        self.store.touch(self.namespace)
+        with self._lock:
+            if self._vectorstore is not None and not self._stale():
+                return self._loaded(), False
+
+            version = self.store.current_version(self.namespace)
+            self._checked_at = time.monotonic()
+            if version is None:
+                self._vectorstore = None
+                self._lexical_index = None
+                self._metadata_index = None
+                self.version = None
+                return None, False
+
+            start = time.perf_counter()
+            with span("index_load"):
+                self._vectorstore, self._lexical_index, self._metadata_index = self._open(version)
+            self._record_load(start)
+            self.version = version
+            return self._loaded(), True
+
+    def _loaded(self):
+        return self._vectorstore, self._lexical_index, self._metadata_index, self.version
+
+    # Function to count a load from disk as a miss; called with the lock held
+    def _record_load(self, start):
+        self.misses += 1
+        self._last_load_seconds = time.perf_counter() - start
+
+    # Return the loaded index and its version, or (None, None) when there is none
+    def get_vectorstore(self):
+        loaded, _ = self._acquire()
+        if loaded is None:
+            return None, None
+        return loaded[0], loaded[3]
+
+    # Context manager for writers: serializes them within this process and,
+    # through a lock file, with writers in other processes
+    @contextmanager
+    def writing(self):
+        with self.write_lock, self.store.writer_lock(self.namespace):
+            yield
+
+    # Return a private copy of the current index for a writer to modify,
+    # together with its manifest and lexical index. The copy is None when
+    # there is no index. The lexical index stays memory-mapped and keeps its
+    # changes in memory, so loading it and saving it again are cheap.
+    def load_for_update(self):
+        version = self.store.current_version(self.namespace)
+        if version is None:
+            return None, IngestManifest(), BM25Index()
+        version_dir = self.store.version_dir(self.namespace, version)
+        return self._load(version, read_only=False), IngestManifest.load(version_dir), BM25Index.load(version_dir)
+
+    # Return the top-k chunks for a question, or None when there is no index.
+    # With `sources`, only chunks of those documents are searched.
+    def similarity_search(self, question, k, sources=None):
+        return self.retrieve(question, k, sources)[0]
+
+    # Return (top-k chunks, version of the index they were found in); the
+    # chunks are None when there is no index
+    def retrieve(self, question, k, sources=None):
+        loaded, fresh = self._acquire()
+        if loaded is None:
+            return None, None
+        if not fresh:
+            with self._lock:
+                self.hits += 1
+                self.load_seconds_saved += self._last_load_seconds
+        vectorstore, lexical_index, metadata_index, version = loaded
+
+        def search(vector):
+            return self._hybrid_search(vectorstore, lexical_index, metadata_index, question, vector, k, sources)
+
+        docs = self.retrieval_cache.search(self.get_embeddings(), question, version, k, search, sources)
+        return docs, version
+
+    # Dense search fused with BM25 results by reciprocal rank fusion
+    def _hybrid_search(self, vectorstore, lexical_index, metadata_index, question, vector, k, sources=None):
+        use_lexical = HYBRID_SEARCH and lexical_index is not None and len(lexical_index)
+        fetch_k = max(k, HYBRID_CANDIDATES) if use_lexical else k
+        with span("similarity_search"):
+            params, allowed = None, None
+            if sources:
+                from index_factory import filtered_search_params
+
+                selected, allowed = metadata_index.select(sources)
+                if not len(selected):
+                    return []
+                params = filtered_search_params(vectorstore.index, selected, fetch_k)
+            _, positions = vectorstore.index.search(np.asarray([vector], dtype=np.float32), fetch_k, params=params)
+            dense_ids = [vectorstore.index_to_docstore_id[i] for i in positions[0] if i != -1]
+            if use_lexical:
+                with span("lexical_search"):
+                    lexical_ids = [doc_id for doc_id, _ in lexical_index.search(question, fetch_k, allowed)]
+                doc_ids = reciprocal_rank_fusion([dense_ids, lexical_ids], k=RRF_K)[:k]
+            else:
+                doc_ids = dense_ids[:k]
+            return [vectorstore.docstore.search(doc_id) for doc_id in doc_ids]
+
+    # Return the stored vectors of retrieved chunks, or None if one is not in the index
+    def chunk_vectors(self, docs):
+        loaded, _ = self._acquire()
+        if loaded is None:
+            return None
+        vectorstore, _, metadata_index, _ = loaded
+        positions = [metadata_index.position(doc.id) for doc in docs]
+        if None in positions:
+            return None
+        from index_factory import reconstruct_positions
+
+        return reconstruct_positions(vectorstore.index, positions)
+
+    # Return the names of the indexed documents
+    def sources(self):
+        loaded, _ = self._acquire()
+        if loaded is None:
+            return []
+        return loaded[2].sources()
+
+    # Return the (cached) embedding of a question
+    def embed_query(self, question):
+        return self.retrieval_cache.embed_query(self.get_embeddings(), question)
+
+    def load_manifest(self):
+        version = self.store.current_version(self.namespace)
+        if version is None:
+            return IngestManifest()
+        return IngestManifest.load(self.store.version_dir(self.namespace, version))
+
+    # Publish an updated index with its manifest as a new version snapshot and
+    # swap in its memory-mapped copy, releasing the writer's in-memory one. The
+    # FAISS index type is switched first if the chunk count calls for it. Raises
+    # StaleVersionError if base_version is no longer current (e.g. the
+    # namespace was cleared while the writer worked).
+    def save(self, vectorstore, manifest, lexical_index, base_version):
+        from index_factory import optimize_vectorstore
+        from snapshot import write_snapshot
+
+        optimize_vectorstore(vectorstore)
+
+        def write(path):
+            write_snapshot(vectorstore, path)
+            manifest.save(path)
+            lexical_index.save(path)
+
+        version = self.store.publish(self.namespace, write, base_version=base_version)
+        start = time.perf_counter()
+        with span("index_load"):
+            loaded = self._open(version)
+        with self._lock:
+            self._vectorstore, self._lexical_index, self._metadata_index = loaded
+            self._record_load(start)
+            self.version = version
+
+    # Unpublish the index and drop the cached copy
+    def clear(self):
+        self.store.clear(self.namespace)
+        with self._lock:
+            self._vectorstore = None
+            self._lexical_index = None
+            self._metadata_index = None
+            self.version = None
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "namespace": self.namespace,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "last_load_seconds": self._last_load_seconds,
+                "load_seconds_saved": self.load_seconds_saved,
+                "version": self.version,
+                "index_type": _index_type(self._vectorstore),
+                "vector_storage": getattr(getattr(self._vectorstore, "docstore", None), "vector_storage", None),
+                "bytes_per_chunk": _bytes_per_chunk(self._vectorstore),
+            }
+
+    # Function to measure the recall lost by serving compact vectors, against
+    # exact search; None without a compact copy
+    def vector_recall(self, queries=100, k=10):
+        vectorstore, _ = self.get_vectorstore()
+        if vectorstore is None:
+            return None
+        from index_factory import rescoring_recall
+
+        return rescoring_recall(vectorstore.index, queries=queries, k=k)
+
+
+def _index_type(vectorstore):
+    if vectorstore is None:
+        return None
+    from index_factory import index_type_of
+
+    return index_type_of(vectorstore.index)
+
+
+def _bytes_per_chunk(vectorstore):
+    bytes_per_chunk = getattr(getattr(vectorstore, "docstore", None), "bytes_per_chunk", None)
+    return bytes_per_chunk() if bytes_per_chunk else None
+
+
+# Process-wide registry of per-namespace index managers sharing one embeddings
+# client and chat model. A background thread removes abandoned namespaces from disk and memory.
+class IndexRegistry:
+    def __init__(self, store=None, gc_interval=SESSION_GC_INTERVAL_SECONDS):
+        self.store = store or SessionStore()
+        self._managers = {}
+        self._embeddings = None
+        self._chat_model = None
+        self._lock = threading.Lock()
+        if gc_interval:
+            thread = threading.Thread(target=self._gc_loop, args=(gc_interval,), daemon=True)
+            thread.start()
+
+    def get_embeddings(self):
+        with self._lock:
+            if self._embeddings is None:
+                from backends import create_embeddings, embedding_model_name
+                from embedding_cache import CachedEmbeddings, EmbeddingCache
+                from embedding_scheduler import EmbeddingScheduler
+
+                self._embeddings = CachedEmbeddings(
+                    EmbeddingScheduler(create_embeddings()),
+                    EmbeddingCache(),
+                    embedding_model_name(),
+                )
+            return self._embeddings
+
+    # Function to return the embeddings client only if it was already built,
+    # e.g. for statistics that must not pull in the embedding SDK
+    def loaded_embeddings(self):
+        with self._lock:
+            return self._embeddings
+
+    # Chat model shared by every namespace, created on first use
+    def get_chat_model(self):
+        with self._lock:
+            if self._chat_model is None:
+                from backends import create_chat_model
+
+                self._chat_model = create_chat_model()
+            return self._chat_model
+
+    def get(self, namespace):
+        with self._lock:
+            manager = self._managers.get(namespace)
+            if manager is None:
+                manager = IndexManager(self.store, namespace, self.get_embeddings)
+                self._managers[namespace] = manager
+            return manager
+
+    def collect_garbage(self):
+        removed = set(self.store.collect_garbage())
+        with self._lock:
+            for namespace, manager in list(self._managers.items()):
+                idle = time.monotonic() - manager.last_used > SESSION_GC_INTERVAL_SECONDS
+                if namespace in removed or (idle and not manager.exists()):
+                    del self._managers[namespace]
+        return removed
+
+    def _gc_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.collect_garbage()
+            except OSError:
+                pass
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import time
+
+from bm25 import BM25Index
+from config import CHECKPOINT_INTERVAL_SECONDS
+from session_store import SessionStore
+
+MANIFEST_FILE = "manifest.json"
+CHECKPOINT_FILE = "checkpoint.json"
+_HASH_BLOCK_BYTES = 1024 * 1024
+
+
+# Function to hash a binary stream block by block
+def stream_hash(stream):
+    digest = hashlib.sha256()
+    for block in iter(lambda: stream.read(_HASH_BLOCK_BYTES), b""):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+# Function to build stable chunk ids for a document
+def chunk_ids_for(doc_hash, count, start=0):
+    return [f"{doc_hash[:16]}:{i}" for i in range(start, start + count)]
+
+
+# Records which chunk ids in the index belong to which document (by file hash)
+class IngestManifest:
+    def __init__(self, documents=None):
+        self.documents = documents or {}
+
+    @classmethod
+    def load(cls, index_dir):
+        path = os.path.join(index_dir, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f)["documents"])
+
+    def save(self, index_dir):
+        os.makedirs(index_dir, exist_ok=True)
+        path = os.path.join(index_dir, MANIFEST_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"documents": self.documents}, f)
+        os.replace(tmp_path, path)
+
+    def add(self, doc_hash, name, chunk_ids):
+        self.documents[doc_hash] = {"name": name, "chunk_ids": list(chunk_ids)}
+
+    def remove(self, doc_hash):
+        return self.documents.pop(doc_hash)["chunk_ids"]
+
+    # Compare uploaded file hashes with the manifest. Lists keep the upload
+    # (and manifest) order, so chunk ids, checkpoints and snapshots are the
+    # same on every run.
+    def diff(self, upload_hashes):
+        upload_hashes = list(dict.fromkeys(upload_hashes))
+        uploaded = set(upload_hashes)
+        added = [h for h in upload_hashes if h not in self.documents]
+        removed = [h for h in self.documents if h not in uploaded]
+        unchanged = [h for h in upload_hashes if h in self.documents]
+        return added, removed, unchanged
+
+
+# Partial result of an interrupted ingest run, saved to its own directory so
+# the live index is untouched until the run completes. A checkpoint records
+# the index version it was built on and is only resumed from while that
+# version is still current.
+class IngestCheckpoint:
+    _NAMESPACE = "index"
+
+    def __init__(self, directory, interval=CHECKPOINT_INTERVAL_SECONDS):
+        self.store = SessionStore(directory)
+        self.interval = interval
+        self._saved_at = time.monotonic()
+
+    # Return (vectorstore, manifest, lexical index) saved on top of base_version, or None
+    def load(self, base_version, embeddings):
+        from snapshot import load_snapshot
+
+        version = self.store.current_version(self._NAMESPACE)
+        if version is None:
+            return None
+        path = self.store.version_dir(self._NAMESPACE, version)
+        with open(os.path.join(path, CHECKPOINT_FILE), "r", encoding="utf-8") as f:
+            if json.load(f)["base_version"] != base_version:
+                return None
+        return load_snapshot(path, embeddings, read_only=False), IngestManifest.load(path), BM25Index.load(path)
+
+    # Save the run's progress, at most once per interval unless forced
+    def save(self, base_version, vectorstore, manifest, lexical_index, force=False):
+        if not force and time.monotonic() - self._saved_at < self.interval:
+            return
+        from snapshot import write_snapshot
+
+        def write(path):
+            write_snapshot(vectorstore, path, compact=False)
+            manifest.save(path)
+            lexical_index.save(path)
+            with open(os.path.join(path, CHECKPOINT_FILE), "w", encoding="utf-8") as f:
+                json.dump({"base_version": base_version}, f)
+
+        self.store.publish(self._NAMESPACE, write)
+        self.store.collect_garbage(idle_seconds=float("inf"), grace_seconds=0)
+        self._saved_at = time.monotonic()
@@ -0,0 +1,268 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from config import JOB_STALE_SECONDS, JOB_WORKERS, JOBS_DB, JOBS_DIR
+from engine import Engine
+from extraction import SourceFile, open_stream
+from ingest import IngestCheckpoint
+from telemetry import telemetry
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Write job progress to the database at most this often
+_PROGRESS_INTERVAL_SECONDS = 0.5
+_POLL_SECONDS = 1.0
+# A running job's heartbeat is refreshed this often, whatever phase it is in
+_HEARTBEAT_SECONDS = max(1.0, JOB_STALE_SECONDS / 5)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    status TEXT NOT NULL,
+    files TEXT NOT NULL,
+    remove_missing INTEGER NOT NULL,
+    progress TEXT NOT NULL DEFAULT '{}',
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat_at REAL
+)
+"""
+
+_queue = None
+_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# SQLite-backed queue of ingestion jobs run by background worker threads, so
+# processing outlives the script run (and browser tab) that submitted it.
+# Uploaded files are copied into the job's directory. Jobs checkpoint their
+# progress there, and a job whose worker died (process restart) is resumed
+# by the next worker once its heartbeat is older than JOB_STALE_SECONDS. The
+# heartbeat is sent from a timer thread, so long save or removal phases and
+# waits for the namespace's writer lock do not look like a dead worker.
+# Several processes may share the database; claiming a job is atomic.
+class JobQueue:
+    def __init__(self, db_path=JOBS_DB, jobs_dir=JOBS_DIR, workers=JOB_WORKERS):
+        self.db_path = db_path
+        self.jobs_dir = jobs_dir
+        self._wakeup = threading.Event()
+        with self._connect() as db:
+            db.execute(_SCHEMA)
+        for _ in range(workers):
+            thread = threading.Thread(target=self._worker_loop, daemon=True)
+            thread.start()
+
+    # Context manager for a connection that commits on success and is then closed
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.row_factory = sqlite3.Row
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _job_dir(self, job_id):
+        return os.path.join(self.jobs_dir, job_id)
+
+    # Queue an ingestion of `files` into a namespace and return the job id
+    def submit(self, namespace, files, remove_missing=True):
+        job_id = uuid.uuid4().hex
+        files_dir = os.path.join(self._job_dir(job_id), "files")
+        os.makedirs(files_dir, exist_ok=True)
+        saved = []
+        for number, file in enumerate(files):
+            path = os.path.join(files_dir, f"{number}-{os.path.basename(file.name)}")
+            with open_stream(file) as stream, open(path, "wb") as f:
+                shutil.copyfileobj(stream, f, 1024 * 1024)
+            saved.append({"name": file.name, "type": file.type, "path": path})
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO jobs (id, namespace, status, files, remove_missing, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, namespace, QUEUED, json.dumps(saved), int(remove_missing), time.time()),
+            )
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job_dict(row) if row else None
+
+    # Return the most recent jobs of a namespace, newest first
+    def jobs(self, namespace, limit=10):
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT * FROM jobs WHERE namespace = ? ORDER BY created_at DESC LIMIT ?", (namespace, limit)
+            ).fetchall()
+        return [_job_dict(row) for row in rows]
+
+    # Cancel a queued or running job; a running job stops at its next progress
+    # report or batch, and does not publish its changes
+    def cancel(self, job_id):
+        with self._connect() as db:
+            queued = db.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                (CANCELLED, time.time(), job_id, QUEUED),
+            ).rowcount
+            db.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                (CANCELLED, time.time(), job_id, RUNNING),
+            )
+        if queued:
+            shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+
+    # Function to atomically take the oldest queued job, or a running job
+    # whose worker stopped reporting
+    def _claim(self):
+        now = time.time()
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute(
+                "SELECT * FROM jobs WHERE status = ? OR (status = ? AND heartbeat_at < ?) ORDER BY created_at LIMIT 1",
+                (QUEUED, RUNNING, now - JOB_STALE_SECONDS),
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, started_at = COALESCE(started_at, ?), "
+                "heartbeat_at = ? WHERE id = ?",
+                (RUNNING, now, now, row["id"]),
+            )
+        return _job_dict(row)
+
+    def _worker_loop(self):
+        while True:
+            try:
+                job = self._claim()
+            except sqlite3.Error:
+                job = None
+            if job is None:
+                self._wakeup.wait(_POLL_SECONDS)
+                self._wakeup.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job):
+        job_id = job["id"]
+        progress = dict(job["progress"])
+        reported_at = 0.0
+
+        def check_cancelled():
+            with self._connect() as db:
+                self._check_running(db, job_id)
+
+        # Record progress and heartbeat; stop if the job was cancelled
+        def report(file_name, pages_done, total_pages):
+            nonlocal reported_at
+            progress[file_name] = [pages_done, total_pages]
+            now = time.monotonic()
+            if now - reported_at < _PROGRESS_INTERVAL_SECONDS and pages_done < total_pages:
+                return
+            reported_at = now
+            with self._connect() as db:
+                self._check_running(db, job_id)
+                db.execute(
+                    "UPDATE jobs SET progress = ?, heartbeat_at = ? WHERE id = ?",
+                    (json.dumps(progress), time.time(), job_id),
+                )
+
+        files = [SourceFile(f["name"], f["type"], path=f["path"]) for f in job["files"]]
+        checkpoint = IngestCheckpoint(os.path.join(self._job_dir(job_id), "checkpoint"))
+        try:
+            with self._heartbeat(job_id), telemetry.trace("ingest") as trace:
+                added, removed, unchanged = Engine(job["namespace"]).ingest_files(
+                    files,
+                    progress=report,
+                    remove_missing=job["remove_missing"],
+                    checkpoint=checkpoint,
+                    check_cancelled=check_cancelled,
+                )
+        except JobCancelled:
+            pass
+        except Exception as exc:
+            self._finish(job_id, FAILED, error=f"{type(exc).__name__}: {exc}")
+        else:
+            result = {
+                "added": len(added),
+                "removed": len(removed),
+                "unchanged": len(unchanged),
+                "timings": trace.to_dict(),
+            }
+            self._finish(job_id, DONE, result=result)
+        shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+
+    # Raise JobCancelled if the job is no longer running
+    @staticmethod
+    def _check_running(db, job_id):
+        status = db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()["status"]
+        if status != RUNNING:
+            raise JobCancelled(job_id)
+
+    # Context manager refreshing a running job's heartbeat every _HEARTBEAT_SECONDS
+    @contextmanager
+    def _heartbeat(self, job_id):
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(_HEARTBEAT_SECONDS):
+                try:
+                    with self._connect() as db:
+                        db.execute(
+                            "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = ?",
+                            (time.time(), job_id, RUNNING),
+                        )
+                except sqlite3.Error:
+                    pass
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ? AND status = ?",
+                (status, json.dumps(result) if result else None, error, time.time(), job_id, RUNNING),
+            )
+
+
+def _job_dict(row):
+    job = dict(row)
+    job["files"] = json.loads(job["files"])
+    job["progress"] = json.loads(job["progress"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    job["remove_missing"] = bool(job["remove_missing"])
+    return job
+
+
+# Shared queue so each process runs one set of job workers
+def get_job_queue():
+    global _queue
+    with _lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
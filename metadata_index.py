@@ -0,0 +1,45 @@
+import numpy as np
+
+
+# Maps each source document to its FAISS positions, so a search can be
+# restricted to some documents before it runs rather than filtered after.
+# Built whenever an index version is loaded or saved. Snapshot docstores
+# already hold the chunk ids, sources and id positions, so only one sorted
+# position array is built on top of them: each source's positions are a slice.
+class MetadataIndex:
+    def __init__(self, ids, sources, position):
+        self.ids = ids
+        # Function to get a chunk id's FAISS position, or None
+        self.position = position
+        codes = {}
+        numbers = np.fromiter(
+            (codes.setdefault(source, len(codes)) for source in sources), dtype=np.int64, count=len(sources)
+        )
+        order = np.argsort(numbers, kind="stable")
+        bounds = np.searchsorted(numbers[order], np.arange(len(codes) + 1))
+        self.positions = {
+            source: order[bounds[code]:bounds[code + 1]] for source, code in codes.items() if source is not None
+        }
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore):
+        docstore = vectorstore.docstore
+        position = getattr(docstore, "position", None)
+        if position is not None:
+            return cls(docstore.ids, docstore.sources, position)
+        ids = [vectorstore.index_to_docstore_id[i] for i in range(len(vectorstore.index_to_docstore_id))]
+        source_of = getattr(docstore, "source_of", None)
+        if source_of is not None:
+            sources = [source_of(doc_id) for doc_id in ids]
+        else:
+            sources = [getattr(docstore.search(doc_id), "metadata", {}).get("source") for doc_id in ids]
+        return cls(ids, sources, {doc_id: i for i, doc_id in enumerate(ids)}.get)
+
+    def sources(self):
+        return sorted(self.positions)
+
+    # Function to get the FAISS positions and chunk ids of the given sources
+    def select(self, sources):
+        selected = [self.positions[source] for source in sources if source in self.positions]
+        positions = np.concatenate(selected) if selected else np.zeros(0, dtype=np.int64)
+        return positions, {self.ids[position] for position in positions.tolist()}
@@ -0,0 +1,76 @@
+import functools
+import hashlib
+import io
+import os
+import tempfile
+
+from config import OCR_CACHE_DIR, OCR_ENABLED, OCR_LANGUAGE, OCR_MIN_CHARS
+
+try:
+    import pytesseract
+    from PIL import Image
+except ImportError:  # optional: scanned pages are indexed without text
+    pytesseract = None
+
+
+# Function to check once per process whether OCR can run: it is enabled and
+# pytesseract can find the tesseract binary
+@functools.lru_cache(maxsize=None)
+def ocr_available():
+    if not OCR_ENABLED or pytesseract is None:
+        return False
+    try:
+        pytesseract.get_tesseract_version()
+    except (pytesseract.TesseractNotFoundError, OSError):
+        return False
+    return True
+
+
+# Function to decide whether an extracted page has too little text to be a
+# text page, i.e. it is probably a scan
+def needs_ocr(text):
+    return len(text.strip()) < OCR_MIN_CHARS
+
+
+def _cache_path(digest):
+    return os.path.join(OCR_CACHE_DIR, digest[:2], f"{digest}.txt")
+
+
+def _read_cache(digest):
+    try:
+        with open(_cache_path(digest), "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+# Write through a temp file and rename, so extraction workers in other
+# processes never read a partial entry
+def _write_cache(digest, text):
+    path = _cache_path(digest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=os.path.dirname(path), delete=False) as tmp:
+        tmp.write(text)
+    os.replace(tmp.name, path)
+
+
+# Function to OCR the images of a PyPDF2 page. The result is cached under a
+# hash of the image bytes and language, so the same scan is only OCR'd once
+# whichever document or session it arrives in.
+def ocr_page(page):
+    images = [image.data for image in page.images]
+    if not images:
+        return ""
+    digest = hashlib.sha256(OCR_LANGUAGE.encode("utf-8"))
+    for data in images:
+        digest.update(hashlib.sha256(data).digest())
+    digest = digest.hexdigest()
+
+    text = _read_cache(digest)
+    if text is None:
+        text = "\n".join(
+            pytesseract.image_to_string(Image.open(io.BytesIO(data)), lang=OCR_LANGUAGE).strip()
+            for data in images
+        )
+        _write_cache(digest, text)
+    return text
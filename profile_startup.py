@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+_APP = os.path.join(_ROOT, "app.py")
+
+# "import time: <self us> | <cumulative us> | <indent><module>" from python -X importtime
+_IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+
+# Function to import the app in a fresh interpreter with -X importtime and
+# return the total import time and the cost of every imported module
+def profile_imports(env):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = []
+    for line in proc.stderr.splitlines():
+        match = _IMPORT_TIME_LINE.match(line)
+        if match:
+            modules.append({
+                "module": match.group(4),
+                "depth": len(match.group(3)) // 2,
+                "self_ms": int(match.group(1)) / 1000,
+                "cumulative_ms": int(match.group(2)) / 1000,
+            })
+    total = next(module["cumulative_ms"] for module in modules if module["module"] == "app")
+    return total, modules
+
+
+# SDKs the main page must not import before a document is processed or a
+# question is asked
+_DEFERRED_MODULES = ("langchain_google_genai", "google.genai", "langchain_core", "langchain_community", "faiss")
+
+
+# Function to run the app script with Streamlit's test harness: one cold run
+# (which imports the app's modules), warm reruns, and a run of the About page
+def profile_runs(reruns):
+    from streamlit.testing.v1 import AppTest
+
+    from telemetry import telemetry
+
+    app = AppTest.from_file(_APP, default_timeout=60)
+    start = time.perf_counter()
+    app.run()
+    first_run = time.perf_counter() - start
+
+    rerun_times = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app.run()
+        rerun_times.append(time.perf_counter() - start)
+
+    about = AppTest.from_file(_APP, default_timeout=60)
+    about.session_state["page"] = "about"
+    start = time.perf_counter()
+    about.run()
+    about_run = time.perf_counter() - start
+
+    errors = [str(error.value) for error in list(app.exception) + list(about.exception)]
+    deferred = [module for module in _DEFERRED_MODULES if module in sys.modules]
+    return first_run, rerun_times, about_run, telemetry.last.get("rerun"), errors, deferred
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report DocBlinker import time and Streamlit script run times")
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--top", type=int, default=15, help="Number of most expensive modules to list")
+    parser.add_argument("--import-budget-ms", type=float, help="Fail when importing app.py takes longer")
+    parser.add_argument("--rerun-budget-ms", type=float, help="Fail when the median warm rerun takes longer")
+    parser.add_argument("--backend", default="google",
+                        help="Backend the app is configured with; the default profiles the real import path")
+    parser.add_argument("--out", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    # Throwaway index and job directories. No document is processed and no
+    # question asked, so the Google backend is not contacted.
+    workdir = tempfile.mkdtemp(prefix="docblinker-profile-")
+    os.environ["DOCBLINKER_BACKEND"] = args.backend
+    os.environ["DOCBLINKER_INDEX_DIR"] = os.path.join(workdir, "faiss_index")
+    os.environ["DOCBLINKER_EMBEDDING_CACHE_DIR"] = os.path.join(workdir, "embedding_cache")
+    os.environ["DOCBLINKER_JOBS_DB"] = os.path.join(workdir, "jobs.sqlite3")
+    os.environ["DOCBLINKER_JOBS_DIR"] = os.path.join(workdir, "jobs")
+    os.environ.setdefault("GOOGLE_API_KEY", "offline")
+
+    import_ms, modules = profile_imports(dict(os.environ))
+    first_run, rerun_times, about_run, last_rerun, errors, deferred = profile_runs(args.reruns)
+    rerun_ms = statistics.median(rerun_times) * 1000 if rerun_times else None
+
+    report = {
+        "import": {
+            "app_ms": import_ms,
+            "direct_imports": [module for module in modules if module["depth"] == 1],
+            "heaviest_modules": sorted(modules, key=lambda module: module["self_ms"], reverse=True)[:args.top],
+        },
+        "runs": {
+            "first_run_ms": first_run * 1000,
+            "rerun_p50_ms": rerun_ms,
+            "rerun_max_ms": max(rerun_times) * 1000 if rerun_times else None,
+            "about_page_run_ms": about_run * 1000,
+            "last_rerun_stages": last_rerun,
+            "errors": errors,
+            "deferred_modules_imported": deferred,
+        },
+    }
+
+    over_budget = []
+    if args.import_budget_ms is not None and import_ms > args.import_budget_ms:
+        over_budget.append(f"import {import_ms:.0f}ms > {args.import_budget_ms:.0f}ms")
+    if args.rerun_budget_ms is not None and rerun_ms is not None and rerun_ms > args.rerun_budget_ms:
+        over_budget.append(f"rerun {rerun_ms:.0f}ms > {args.rerun_budget_ms:.0f}ms")
+    if deferred:
+        over_budget.append(f"main page imported {', '.join(deferred)}")
+    report["over_budget"] = over_budget
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        sys.stdout.write(output + "\n")
+    if over_budget or errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
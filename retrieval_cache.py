@@ -0,0 +1,100 @@
+import re
+import threading
+from collections import OrderedDict
+
+from config import RETRIEVAL_CACHE_SIZE
+from telemetry import span
+
+
+# Function to normalize a question so trivial variations share a cache entry
+def normalize_question(text):
+    text = re.sub(r"\s+", " ", text.strip().lower())
+    return text.rstrip(" ?!.")
+
+
+# Thread-safe LRU cache with hit/miss counters
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Caches query embeddings and top-k results for repeated questions.
+# Results are tied to an index version and dropped when the version changes.
+class RetrievalCache:
+    def __init__(self, maxsize=RETRIEVAL_CACHE_SIZE):
+        self.query_vectors = LRUCache(maxsize)
+        self.results = LRUCache(maxsize)
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        with self._lock:
+            if version != self._version:
+                self.results.clear()
+                self._version = version
+
+    # Function to embed a question, reusing the cached vector when possible
+    def embed_query(self, embeddings, question):
+        key = normalize_question(question)
+        vector = self.query_vectors.get(key)
+        if vector is None:
+            with span("query_embedding"):
+                vector = embeddings.embed_query(question)
+            self.query_vectors.put(key, vector)
+        return vector
+
+    # Function to return cached top-k results, calling search_fn(vector) on a miss.
+    # Results filtered to some sources are cached separately. Entries are
+    # keyed by the index version searched, and a search that finishes after
+    # a newer version was seen is not cached.
+    def search(self, embeddings, question, version, k, search_fn, sources=None):
+        self._check_version(version)
+        key = (normalize_question(question), k, frozenset(sources) if sources else None, version)
+        docs = self.results.get(key)
+        if docs is None:
+            docs = search_fn(self.embed_query(embeddings, question))
+            with self._lock:
+                if self._version == version:
+                    self.results.put(key, docs)
+        return docs
+
+    def stats(self):
+        return {
+            "query_vectors": self.query_vectors.stats(),
+            "results": self.results.stats(),
+        }
@@ -0,0 +1,242 @@
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from config import INDEX_DIR, SESSION_IDLE_SECONDS, VERSION_GRACE_SECONDS
+
+CURRENT_FILE = "CURRENT"
+LAST_ACCESS_FILE = "last_access"
+LOCK_FILE = "WRITE_LOCK"
+POINTER_LOCK_FILE = "CURRENT.lock"
+PINNED_FILE = "PINNED"
+VERSION_PREFIX = "v-"
+
+# Touch a namespace's last_access file at most this often
+_TOUCH_INTERVAL_SECONDS = 60
+
+# publish() default: replace whatever version is current
+_UNCHECKED = object()
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within one process
+    fcntl = None
+
+
+# Raised by publish() when the namespace's current version is no longer the
+# one the writer started from, e.g. because it was cleared meanwhile
+class StaleVersionError(Exception):
+    pass
+
+
+# Function to turn a session or collection name into a safe directory name
+def safe_namespace(namespace):
+    name = re.sub(r"[^A-Za-z0-9_-]", "_", namespace)
+    if not name:
+        raise ValueError("Namespace must not be empty")
+    return name
+
+
+# Stores one index per namespace (session or collection) under a common root.
+# Each write goes to a new immutable version directory and becomes visible by
+# atomically replacing the namespace's CURRENT pointer file, so readers never
+# see a partially written index.
+#
+#   <root>/<namespace>/CURRENT        name of the live version directory
+#   <root>/<namespace>/v-<id>/        index files of one version
+#   <root>/<namespace>/last_access    mtime used for garbage collection
+#   <root>/<namespace>/PINNED         present for collections kept when idle
+#   <root>/<namespace>/WRITE_LOCK     flock()ed by the process publishing
+#   <root>/<namespace>/CURRENT.lock   flock()ed briefly while CURRENT changes
+class SessionStore:
+    def __init__(self, root=INDEX_DIR):
+        self.root = root
+        self._touched = {}
+        self._lock = threading.Lock()
+
+    def namespace_dir(self, namespace):
+        return os.path.join(self.root, safe_namespace(namespace))
+
+    # Return the live version name of a namespace, or None when it has no index
+    def current_version(self, namespace):
+        try:
+            with open(os.path.join(self.namespace_dir(namespace), CURRENT_FILE), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def version_dir(self, namespace, version):
+        return os.path.join(self.namespace_dir(namespace), version)
+
+    # Write a new version with write_fn(path) and atomically make it current.
+    # With base_version, the version is discarded and StaleVersionError raised
+    # if the current version changed since the writer read it.
+    def publish(self, namespace, write_fn, base_version=_UNCHECKED):
+        namespace_dir = self.namespace_dir(namespace)
+        os.makedirs(namespace_dir, exist_ok=True)
+        version = f"{VERSION_PREFIX}{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        version_dir = os.path.join(namespace_dir, version)
+        try:
+            write_fn(version_dir)
+        except Exception:
+            shutil.rmtree(version_dir, ignore_errors=True)
+            raise
+
+        pointer = os.path.join(namespace_dir, CURRENT_FILE)
+        tmp_pointer = f"{pointer}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_pointer, "w", encoding="utf-8") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        with self._pointer_lock(namespace_dir):
+            previous = self.current_version(namespace)
+            stale = base_version is not _UNCHECKED and previous != base_version
+            if not stale:
+                os.replace(tmp_pointer, pointer)
+        if stale:
+            os.remove(tmp_pointer)
+            shutil.rmtree(version_dir, ignore_errors=True)
+            raise StaleVersionError(f"{namespace} changed from {base_version} to {previous}")
+
+        # Start the grace period of the superseded version now
+        if previous and os.path.isdir(os.path.join(namespace_dir, previous)):
+            os.utime(os.path.join(namespace_dir, previous))
+        self.touch(namespace, force=True)
+        return version
+
+    # Context manager serializing the writers of a namespace across processes,
+    # so concurrent publishes cannot each start from the same version and lose
+    # one another's changes
+    @contextmanager
+    def writer_lock(self, namespace):
+        namespace_dir = self.namespace_dir(namespace)
+        while True:
+            os.makedirs(namespace_dir, exist_ok=True)
+            lock_path = os.path.join(namespace_dir, LOCK_FILE)
+            with open(lock_path, "a", encoding="utf-8") as f:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                    # collect_garbage() may have deleted the namespace while we
+                    # waited; the lock is only valid on the file still in place
+                    try:
+                        if os.stat(lock_path).st_ino != os.fstat(f.fileno()).st_ino:
+                            continue
+                    except FileNotFoundError:
+                        continue
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                return
+
+    # Context manager yielding whether the writer lock of a namespace directory
+    # was free; it is held until exit so no writer can start meanwhile
+    @contextmanager
+    def _try_writer_lock(self, namespace_dir):
+        lock_path = os.path.join(namespace_dir, LOCK_FILE)
+        if fcntl is None or not os.path.exists(lock_path):
+            yield True
+            return
+        with open(lock_path, "a", encoding="utf-8") as f:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    # Context manager held only while the CURRENT pointer is read and replaced,
+    # so clear() never waits for a writer building a version
+    @contextmanager
+    def _pointer_lock(self, namespace_dir):
+        with open(os.path.join(namespace_dir, POINTER_LOCK_FILE), "a", encoding="utf-8") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    # Mark a namespace as a shared collection that is never deleted for being idle
+    def pin(self, namespace):
+        namespace_dir = self.namespace_dir(namespace)
+        os.makedirs(namespace_dir, exist_ok=True)
+        with open(os.path.join(namespace_dir, PINNED_FILE), "a", encoding="utf-8"):
+            pass
+
+    def is_pinned(self, namespace):
+        return os.path.exists(os.path.join(self.namespace_dir(namespace), PINNED_FILE))
+
+    # Unpublish a namespace's index; its files are removed by collect_garbage().
+    # A writer in progress is not waited for: its publish() fails as stale.
+    def clear(self, namespace):
+        namespace_dir = self.namespace_dir(namespace)
+        if not os.path.isdir(namespace_dir):
+            return
+        with self._pointer_lock(namespace_dir):
+            try:
+                os.remove(os.path.join(namespace_dir, CURRENT_FILE))
+            except FileNotFoundError:
+                pass
+
+    # Record that a namespace is still in use
+    def touch(self, namespace, force=False):
+        now = time.time()
+        with self._lock:
+            if not force and now - self._touched.get(namespace, 0) < _TOUCH_INTERVAL_SECONDS:
+                return
+            self._touched[namespace] = now
+        namespace_dir = self.namespace_dir(namespace)
+        if os.path.isdir(namespace_dir):
+            with open(os.path.join(namespace_dir, LAST_ACCESS_FILE), "a", encoding="utf-8"):
+                pass
+            os.utime(os.path.join(namespace_dir, LAST_ACCESS_FILE))
+
+    def _last_access(self, namespace_dir):
+        try:
+            return os.path.getmtime(os.path.join(namespace_dir, LAST_ACCESS_FILE))
+        except FileNotFoundError:
+            return os.path.getmtime(namespace_dir)
+
+    # Delete idle unpinned namespaces and superseded versions. Returns removed namespaces.
+    def collect_garbage(self, idle_seconds=SESSION_IDLE_SECONDS, grace_seconds=VERSION_GRACE_SECONDS):
+        if not os.path.isdir(self.root):
+            return []
+        now = time.time()
+        removed = []
+        for namespace in os.listdir(self.root):
+            namespace_dir = os.path.join(self.root, namespace)
+            if not os.path.isdir(namespace_dir):
+                continue
+            # Skip namespaces with a writer in progress, e.g. an ingest job
+            # still writing a version that is not published yet
+            with self._try_writer_lock(namespace_dir) as free:
+                if not free:
+                    continue
+                pinned = os.path.exists(os.path.join(namespace_dir, PINNED_FILE))
+                if not pinned and now - self._last_access(namespace_dir) > idle_seconds:
+                    shutil.rmtree(namespace_dir, ignore_errors=True)
+                    with self._lock:
+                        self._touched.pop(namespace, None)
+                    removed.append(namespace)
+                    continue
+
+                current = self.current_version(namespace)
+                for entry in os.listdir(namespace_dir):
+                    path = os.path.join(namespace_dir, entry)
+                    if (
+                        entry.startswith(VERSION_PREFIX)
+                        and entry != current
+                        and now - os.path.getmtime(path) > grace_seconds
+                    ):
+                        shutil.rmtree(path, ignore_errors=True)
+        return removed
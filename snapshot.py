@@ -0,0 +1,279 @@
+import json
+import mmap
+import os
+
+import faiss
+import numpy as np
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from config import SNAPSHOT_COMPRESSION, SNAPSHOT_MMAP, VECTOR_REDUCTION, VECTOR_STORAGE
+from index_factory import build_compact_index, index_type_of, reconstruct_all, rescoring_index, search_dim
+
+try:
+    import zstandard
+except ImportError:  # optional: chunk texts are stored uncompressed
+    zstandard = None
+
+# Snapshot layout inside an index version directory:
+#   vectors.faiss          FAISS index with the exact vectors, memory-mapped on load
+#   vectors.compact.faiss  optional quantized / reduced copy searched when serving;
+#                          for IVF-PQ the PQ index, with a flat index of the exact
+#                          vectors in vectors.faiss
+#   chunks.bin             one JSON record {id, text, metadata} per chunk, in index order
+#   chunks.offsets         int64 .npy array: record i is chunks.bin[offsets[i]:offsets[i + 1]]
+#   chunks.json            index type, vector storage, compression, chunk ids and sources
+VECTORS_FILE = "vectors.faiss"
+COMPACT_VECTORS_FILE = "vectors.compact.faiss"
+CHUNKS_FILE = "chunks.bin"
+OFFSETS_FILE = "chunks.offsets.npy"
+CHUNKS_META_FILE = "chunks.json"
+
+_ZSTD_LEVEL = 3
+
+
+def _compressor(compression):
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=_ZSTD_LEVEL).compress
+    return lambda data: data
+
+
+def _decompressor(compression):
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("This index snapshot is zstd-compressed; install the zstandard package to load it")
+        return zstandard.ZstdDecompressor().decompress
+    return lambda data: data
+
+
+def _encode_record(doc_id, doc):
+    record = json.dumps({"id": doc_id, "text": doc.page_content, "metadata": doc.metadata}, ensure_ascii=False)
+    return record.encode("utf-8")
+
+
+# Function to write a vector store as a snapshot: the FAISS index as-is and the
+# chunk texts as length-prefixed records instead of a pickled docstore. With
+# `compact`, a compact copy of the vectors is written for serving when
+# VECTOR_STORAGE / VECTOR_DIM ask for one. IVF-PQ indexes are always written as
+# their PQ index plus exact vectors.
+def write_snapshot(vectorstore, path, compression=SNAPSHOT_COMPRESSION, compact=True):
+    if compression == "zstd" and zstandard is None:
+        compression = "none"
+    compress = _compressor(compression)
+    os.makedirs(path, exist_ok=True)
+    index = faiss.downcast_index(vectorstore.index)
+    index_type = index_type_of(index)
+    vector_storage = None
+    if isinstance(index, faiss.IndexRefine):
+        exact_index, compact_index, storage = index.refine_index, index.base_index, "pq"
+    else:
+        exact_index, compact_index, storage = index, None, VECTOR_STORAGE
+        if compact:
+            compact_index = build_compact_index(reconstruct_all(index), index_type)
+    faiss.write_index(exact_index, os.path.join(path, VECTORS_FILE))
+    if compact_index is not None:
+        faiss.write_index(compact_index, os.path.join(path, COMPACT_VECTORS_FILE))
+        dim = search_dim(compact_index)
+        vector_storage = {
+            "storage": storage,
+            "dim": dim,
+            "reduction": VECTOR_REDUCTION if dim < index.d else None,
+        }
+
+    # Records of an arena docstore in the same compression are copied as stored
+    docstore = vectorstore.docstore
+    copy_records = isinstance(docstore, ArenaDocstore) and docstore.compression == compression
+    count = vectorstore.index.ntotal
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    ids = []
+    sources = []
+    with open(os.path.join(path, CHUNKS_FILE), "wb") as f:
+        for position in range(count):
+            doc_id = vectorstore.index_to_docstore_id[position]
+            if copy_records:
+                f.write(docstore.record(doc_id))
+                source = docstore.source_of(doc_id)
+            else:
+                doc = docstore.search(doc_id)
+                f.write(compress(_encode_record(doc_id, doc)))
+                source = doc.metadata.get("source")
+            offsets[position + 1] = f.tell()
+            ids.append(doc_id)
+            sources.append(source)
+    np.save(os.path.join(path, OFFSETS_FILE), offsets)
+    with open(os.path.join(path, CHUNKS_META_FILE), "w", encoding="utf-8") as f:
+        json.dump({
+            "index_type": index_type,
+            "vector_storage": vector_storage,
+            "compression": compression,
+            "ids": ids,
+            "sources": sources,
+        }, f)
+
+
+# Read-only docstore over a snapshot's chunk file. Records are memory-mapped and
+# decoded on lookup, so loading costs only the id list, and processes serving
+# the same snapshot share its pages through the OS cache.
+class SnapshotDocstore(Docstore):
+    def __init__(self, path):
+        with open(os.path.join(path, CHUNKS_META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.path = path
+        self.index_type = meta.get("index_type")
+        self.vector_storage = meta.get("vector_storage")
+        self.ids = meta["ids"]
+        self.sources = meta["sources"]
+        self.compression = meta["compression"]
+        self._decompress = _decompressor(self.compression)
+        self._position = {doc_id: position for position, doc_id in enumerate(self.ids)}
+        self._offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+        self._data = b""
+        if self.ids:
+            with open(os.path.join(path, CHUNKS_FILE), "rb") as f:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def source_of(self, doc_id):
+        return self.sources[self._position[doc_id]]
+
+    # Function to get a chunk id's position in the index, or None
+    def position(self, doc_id):
+        return self._position.get(doc_id)
+
+    def search(self, search):
+        position = self._position.get(search)
+        if position is None:
+            return f"ID {search} not found."
+        start, end = int(self._offsets[position]), int(self._offsets[position + 1])
+        record = json.loads(self._decompress(self._data[start:end]))
+        return Document(page_content=record["text"], metadata=record["metadata"], id=record["id"])
+
+    def add(self, texts):
+        raise NotImplementedError("Snapshot docstores are read-only; load the index for update instead")
+
+    def delete(self, ids):
+        raise NotImplementedError("Snapshot docstores are read-only; load the index for update instead")
+
+    # Function to report the snapshot's size on disk per chunk, by part
+    def bytes_per_chunk(self):
+        def size(name):
+            file_path = os.path.join(self.path, name)
+            return os.path.getsize(file_path) if os.path.exists(file_path) else 0
+
+        count = max(len(self.ids), 1)
+        exact = size(VECTORS_FILE)
+        serving = size(COMPACT_VECTORS_FILE) or exact
+        texts = size(CHUNKS_FILE) + size(OFFSETS_FILE) + size(CHUNKS_META_FILE)
+        return {
+            "serving_vectors": serving / count,
+            "exact_vectors": exact / count,
+            "texts": texts / count,
+        }
+
+
+# Writable docstore for index writers. Chunk records are appended to one byte
+# arena (compressed like snapshot records) instead of being held as a Document
+# per chunk; deleted records are dropped when the next snapshot is written.
+class ArenaDocstore(Docstore, AddableMixin):
+    def __init__(self, compression=SNAPSHOT_COMPRESSION):
+        if compression == "zstd" and zstandard is None:
+            compression = "none"
+        self.compression = compression
+        self._compress = _compressor(compression)
+        self._decompress = _decompressor(compression)
+        self._data = bytearray()
+        self._spans = {}
+        self._sources = {}
+
+    # Function to copy a snapshot docstore's records into an arena in one piece
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        docstore = cls(snapshot.compression)
+        docstore._data = bytearray(snapshot._data)
+        offsets = snapshot._offsets.tolist()
+        docstore._spans = {doc_id: (offsets[i], offsets[i + 1]) for i, doc_id in enumerate(snapshot.ids)}
+        docstore._sources = dict(zip(snapshot.ids, snapshot.sources))
+        return docstore
+
+    def __len__(self):
+        return len(self._spans)
+
+    def add(self, texts):
+        overlapping = set(texts).intersection(self._spans)
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        for doc_id, doc in texts.items():
+            start = len(self._data)
+            self._data += self._compress(_encode_record(doc_id, doc))
+            self._spans[doc_id] = (start, len(self._data))
+            self._sources[doc_id] = doc.metadata.get("source")
+
+    def delete(self, ids):
+        missing = set(ids).difference(self._spans)
+        if missing:
+            raise ValueError(f"Tried to delete ids that do not exist: {missing}")
+        for doc_id in ids:
+            del self._spans[doc_id]
+            del self._sources[doc_id]
+
+    # Function to get a chunk's stored (compressed) record
+    def record(self, doc_id):
+        start, end = self._spans[doc_id]
+        return bytes(self._data[start:end])
+
+    def source_of(self, doc_id):
+        return self._sources[doc_id]
+
+    def search(self, search):
+        if search not in self._spans:
+            return f"ID {search} not found."
+        record = json.loads(self._decompress(self.record(search)))
+        return Document(page_content=record["text"], metadata=record["metadata"], id=record["id"])
+
+
+# Function to pick the faiss read flags that memory-map an index type: IVF
+# inverted lists map with IO_FLAG_MMAP, flat and HNSW vector storage with
+# IO_FLAG_MMAP_IFC (added in faiss 1.11, hence the requirement). The two cannot
+# be combined for IVF.
+def _mmap_flags(index_type):
+    if index_type in ("ivf", "ivfpq"):
+        return faiss.IO_FLAG_MMAP
+    return faiss.IO_FLAG_MMAP_IFC
+
+
+# IVF-PQ snapshots keep their exact vectors in a flat index
+def _exact_index_type(index_type):
+    return "flat" if index_type == "ivfpq" else index_type
+
+
+# Function to load a snapshot. Read-only loads memory-map the vectors and chunk
+# texts, and serve a compact copy of the vectors with re-scoring against the
+# exact ones, which are then always memory-mapped. Loads for update read the
+# exact vectors (and for IVF-PQ the trained PQ index) and the chunk records
+# into memory so they can be modified.
+def load_snapshot(path, embeddings, read_only=True):
+    vectors_path = os.path.join(path, VECTORS_FILE)
+    compact_path = os.path.join(path, COMPACT_VECTORS_FILE)
+    if read_only:
+        docstore = SnapshotDocstore(path)
+        flags = faiss.IO_FLAG_READ_ONLY
+        if SNAPSHOT_MMAP:
+            flags |= _mmap_flags(docstore.index_type)
+        if docstore.vector_storage:
+            compact = faiss.read_index(compact_path, flags)
+            exact_flags = faiss.IO_FLAG_READ_ONLY | _mmap_flags(_exact_index_type(docstore.index_type))
+            index = rescoring_index(compact, faiss.read_index(vectors_path, exact_flags))
+        else:
+            index = faiss.read_index(vectors_path, flags)
+        index_to_docstore_id = dict(enumerate(docstore.ids))
+    else:
+        index = faiss.read_index(vectors_path)
+        snapshot = SnapshotDocstore(path)
+        if (snapshot.vector_storage or {}).get("storage") == "pq":
+            index = rescoring_index(faiss.read_index(compact_path), index)
+        docstore = ArenaDocstore.from_snapshot(snapshot)
+        index_to_docstore_id = dict(enumerate(snapshot.ids))
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
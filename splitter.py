@@ -0,0 +1,151 @@
+import re
+from bisect import bisect_right
+from itertools import chain
+
+from config import CHUNK_OVERLAP, CHUNK_SIZE
+from context_builder import estimate_tokens
+
+# A run of blank lines; the text after it starts a new section (Word headings
+# are preceded by one)
+_BLANK_LINES = re.compile(r"\n(?:[^\S\n]*\n)+")
+# The start of a line or sentence, after any leading whitespace
+_SENTENCE_START = re.compile(r"(?:\n|[.!?]+\s)\s*")
+
+
+# Function to find the end of the last run of blank lines in text[pos:end]
+# that ends at or after `start`, or -1
+def _section_end(text, pos, start, end):
+    match = None
+    for match in _BLANK_LINES.finditer(text, pos, end):
+        pass
+    return match.end() if match is not None and match.end() >= start else -1
+
+
+# Single-pass, structure-aware splitter. Document text is buffered a page at a
+# time and cut into chunks of up to chunk_size characters at the strongest
+# boundary near each chunk's end: a new section (after a blank line) once the
+# chunk is a quarter full, otherwise a page, line, sentence or word break once
+# it is half full. Breaks are found with string searches back from the end of
+# each chunk's window, so the work per chunk does not grow with the number of
+# lines or paragraphs in it.
+# Chunks overlap by up to chunk_overlap characters, starting at a line,
+# sentence or word, except at section boundaries.
+class TextSplitter:
+    def __init__(self, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = min(chunk_overlap, chunk_size // 2)
+
+    # Function to split (page_number, text) pairs. Yields (text, metadata)
+    # where metadata holds the first and last page of the chunk, its
+    # character offsets in the document text (pages joined by newlines) and
+    # its estimated token count.
+    def split_pages(self, pages):
+        size = self.chunk_size
+        quarter = size // 4
+        page_offsets = []
+        page_numbers = []
+        # Buffered document text from offset `base`; the next chunk starts at
+        # `pos` in it, with `carried` characters of overlap
+        text = ""
+        base = 0
+        pos = 0
+        carried = 0
+        # A final None flushes the rest of the text, unless only overlap is left
+        for page in chain(pages, [None]):
+            if page is None:
+                limit = carried
+            else:
+                page_number, page = page
+                limit = size
+                if page_offsets:
+                    base += pos
+                    text = text[pos:] + "\n" + page
+                    pos = 0
+                    page_offsets.append(base + len(text) - len(page))
+                else:
+                    text = page
+                    page_offsets.append(0)
+                page_numbers.append(page_number)
+
+            length = len(text)
+            while length - pos > limit:
+                if length - pos <= size:
+                    cut, section = length, True
+                else:
+                    end = pos + size
+                    low = pos + carried + 1
+                    section_start = pos + quarter
+                    if section_start < low:
+                        section_start = low
+                    cut = text.rfind("\n\n", section_start - 2, end)
+                    # Blank lines holding spaces are only found by the slower
+                    # search, needed only if a line break follows
+                    if text.find("\n", cut + 2 if cut != -1 else section_start - 1, end) != -1:
+                        cut = _section_end(text, pos, section_start, end)
+                    elif cut != -1:
+                        cut += 2
+                    section = cut != -1
+                    if not section:
+                        page_start = page_offsets[bisect_right(page_offsets, base + end) - 1] - base
+                        cut = self._cut(text, pos, low, page_start)
+
+                raw = text[pos:cut]
+                left = raw.lstrip()
+                chunk = left.rstrip()
+                if chunk:
+                    start = base + pos + len(raw) - len(left)
+                    stop = start + len(chunk)
+                    # Forget pages that ended before this chunk
+                    keep = bisect_right(page_offsets, start) - 1
+                    if keep:
+                        del page_offsets[:keep], page_numbers[:keep]
+                    yield chunk, {
+                        "page": page_numbers[0],
+                        "page_end": page_numbers[bisect_right(page_offsets, stop - 1) - 1],
+                        "start": start,
+                        "end": stop,
+                        "tokens": estimate_tokens(chunk),
+                    }
+
+                if section:
+                    pos, carried = cut, 0
+                else:
+                    pos = self._overlap_start(text, pos, cut)
+                    carried = cut - pos
+
+    # Function to pick where to cut the chunk starting at `pos` when there is
+    # no section break: the latest page, line, sentence or word break past
+    # half of chunk_size, else the latest break at or past `low`, else
+    # chunk_size characters in
+    def _cut(self, text, pos, low, page_start):
+        end = pos + self.chunk_size
+        half = max(low, pos + self.chunk_size // 2)
+        if half <= page_start <= end:
+            return page_start
+        line = text.rfind("\n", half - 1, end)
+        if line != -1:
+            return line + 1
+        sentence = max(text.rfind(". ", half - 2, end), text.rfind("? ", half - 2, end), text.rfind("! ", half - 2, end))
+        if sentence != -1:
+            return sentence + 2
+        word = text.rfind(" ", half - 1, end)
+        if word != -1:
+            return word + 1
+        word = max(text.rfind(" ", low - 1, end), text.rfind("\n", low - 1, end))
+        return word + 1 if word != -1 else end
+
+    # Function to find where the overlap copied from the end of a chunk into
+    # the next one starts: the first line or sentence within chunk_overlap
+    # characters of the cut, else the first whole word; the cut itself when
+    # there is neither
+    def _overlap_start(self, text, pos, cut):
+        start = max(pos + 1, cut - self.chunk_overlap)
+        if start >= cut:
+            return cut
+        match = _SENTENCE_START.search(text, start, cut)
+        if match is not None and match.end() < cut:
+            return match.end()
+        word = text.find(" ", start, cut)
+        if word != -1 and word + 1 < cut:
+            return word + 1
+        return cut
@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+from config import UI_UPDATE_CHARS, UI_UPDATE_INTERVAL_SECONDS
+from telemetry import record
+
+# Sentinel put on the token queue when the model stream is finished
+END = object()
+
+
+# Function to get the text of a streamed model chunk
+def chunk_text(chunk):
+    # Prefer plain content over repr to keep output human-friendly
+    content = getattr(chunk, "content", None)
+    if content is None:
+        content = str(chunk)
+    return content
+
+
+# Producer task: stream model output into a bounded queue. The queue applies
+# backpressure; cancelling the task cancels the upstream model request.
+async def produce_tokens(model, prompt, queue):
+    start = time.perf_counter()
+    try:
+        async for chunk in model.astream(prompt):
+            await queue.put(chunk_text(chunk))
+        await queue.put(END)
+    except asyncio.CancelledError:
+        raise
+    except Exception as exc:
+        await queue.put(exc)
+    finally:
+        record("model_stream", time.perf_counter() - start)
+
+
+# Function to merge streamed pieces into larger updates, emitted when either
+# `interval` seconds have passed or `max_chars` characters are buffered. No
+# update is longer than `max_chars`: the buffer is emitted before a piece would
+# overflow it, and longer pieces are split. The first piece is emitted
+# immediately.
+async def coalesce(pieces, interval=UI_UPDATE_INTERVAL_SECONDS, max_chars=UI_UPDATE_CHARS):
+    buffer = []
+    size = 0
+    last_emit = 0.0
+    try:
+        async for piece in pieces:
+            if buffer and size + len(piece) > max_chars:
+                yield "".join(buffer)
+                buffer, size, last_emit = [], 0, time.monotonic()
+            while len(piece) > max_chars:
+                yield piece[:max_chars]
+                piece, last_emit = piece[max_chars:], time.monotonic()
+            buffer.append(piece)
+            size += len(piece)
+            now = time.monotonic()
+            if size >= max_chars or now - last_emit >= interval:
+                yield "".join(buffer)
+                buffer, size, last_emit = [], 0, now
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        # Close the source promptly so upstream work is cancelled
+        await pieces.aclose()
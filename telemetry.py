@@ -0,0 +1,197 @@
+import contextvars
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from config import TELEMETRY_JSONL
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current_trace = contextvars.ContextVar("docblinker_trace", default=None)
+
+
+# Timing breakdown of one question turn or ingest run. Spans record self time:
+# while a nested span runs, its parent's clock is paused, so the stage times
+# add up to the traced total minus untraced time. Each thread nests its spans
+# separately; stages that run concurrently on different threads overlap.
+class Trace:
+    def __init__(self, kind):
+        self.kind = kind
+        self.started_at = time.time()
+        self.stages = {}
+        self.marks = {}
+        self.total = None
+        self._t0 = time.perf_counter()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    # Add time to a stage
+    def add(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    @contextmanager
+    def span(self, name):
+        stack = self._stack()
+        now = time.perf_counter()
+        if stack:
+            parent = stack[-1]
+            self.add(parent[0], now - parent[1])
+        stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            _, start = stack.pop()
+            self.add(name, now - start)
+            if stack:
+                stack[-1][1] = now
+
+    # Record the first time an event happens, relative to the trace start
+    def mark(self, name):
+        with self._lock:
+            if name not in self.marks:
+                self.marks[name] = time.perf_counter() - self._t0
+
+    def finish(self):
+        self.total = time.perf_counter() - self._t0
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "started_at": self.started_at,
+                "total": self.total,
+                "stages": dict(self.stages),
+                "marks": dict(self.marks),
+            }
+
+
+# Cumulative histogram in the Prometheus layout
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+# Process-wide collector of traces: keeps per-stage histograms and the last
+# trace of each kind, and optionally appends traces to a JSONL file.
+class Telemetry:
+    def __init__(self, jsonl_path=TELEMETRY_JSONL):
+        self.jsonl_path = jsonl_path
+        self.histograms = {}
+        self.last = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def trace(self, kind):
+        trace = Trace(kind)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+            trace.finish()
+            self.record(trace)
+
+    def record(self, trace):
+        data = trace.to_dict()
+        observations = dict(data["stages"])
+        observations.update(data["marks"])
+        observations["total"] = trace.total
+        with self._lock:
+            for stage, seconds in observations.items():
+                self.histograms.setdefault((trace.kind, stage), Histogram()).observe(seconds)
+            self.last[trace.kind] = data
+            if self.jsonl_path:
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(data) + "\n")
+
+    # Function to render all histograms in the Prometheus text exposition format
+    def prometheus_text(self):
+        lines = [
+            "# HELP docblinker_stage_seconds Time spent per pipeline stage.",
+            "# TYPE docblinker_stage_seconds histogram",
+        ]
+        with self._lock:
+            for (kind, stage), histogram in sorted(self.histograms.items()):
+                labels = f'kind="{kind}",stage="{stage}"'
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'docblinker_stage_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'docblinker_stage_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"docblinker_stage_seconds_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"docblinker_stage_seconds_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+telemetry = Telemetry()
+
+
+# Function to get the peak resident memory of this process in bytes, or None
+# where the platform does not report it
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+# Time a stage of the current trace; does nothing outside a trace
+@contextmanager
+def span(name):
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    with trace.span(name):
+        yield
+
+
+# Mark an event (e.g. "first_token") on the current trace
+def mark(name):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.mark(name)
+
+
+# Add time to a stage of the current trace
+def record(name, seconds):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+# Function to wrap an iterator so only the time spent producing items counts
+# towards the stage, not the time the consumer spends between items
+def timed_iter(iterable, name):
+    iterator = iter(iterable)
+    while True:
+        with span(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
@@ -0,0 +1,52 @@
+from langchain_core.documents import Document
+
+from answer_cache import AnswerCache, context_key, replay
+from fakes import FakeEmbeddings
+
+EMBEDDINGS = FakeEmbeddings(dim=32)
+CONTEXT = context_key([Document(page_content="alpha"), Document(page_content="beta")])
+
+
+def test_near_duplicate_questions_reuse_the_answer():
+    cache = AnswerCache(threshold=0.95, ttl=60)
+    vector = EMBEDDINGS.embed_query("what is alpha")
+    cache.store(vector, CONTEXT, "v1", "Alpha is the first letter.")
+    assert cache.lookup([2 * value for value in vector], CONTEXT, "v1") == "Alpha is the first letter."
+    assert cache.lookup(EMBEDDINGS.embed_query("something else"), CONTEXT, "v1") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+
+
+def test_a_different_context_or_index_version_misses():
+    cache = AnswerCache(threshold=0.95, ttl=60)
+    vector = EMBEDDINGS.embed_query("what is alpha")
+    cache.store(vector, CONTEXT, "v1", "answer")
+    assert cache.lookup(vector, context_key([Document(page_content="alpha")]), "v1") is None
+    # A new index version drops every entry
+    assert cache.lookup(vector, CONTEXT, "v2") is None
+    assert cache.lookup(vector, CONTEXT, "v1") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_entries_expire_and_are_bounded():
+    now = [100.0]
+    cache = AnswerCache(threshold=0.95, ttl=60, clock=lambda: now[0])
+    vector = EMBEDDINGS.embed_query("what is alpha")
+    cache.store(vector, CONTEXT, "v1", "answer")
+    now[0] += 60
+    assert cache.lookup(vector, CONTEXT, "v1") == "answer"
+    now[0] += 0.5
+    assert cache.lookup(vector, CONTEXT, "v1") is None
+    assert cache.stats()["size"] == 0
+
+    cache = AnswerCache(threshold=0.95, ttl=60, maxsize=2)
+    vectors = EMBEDDINGS.embed_documents(["one", "two", "three"])
+    for number, vector in enumerate(vectors):
+        cache.store(vector, CONTEXT, "v1", str(number))
+    assert [cache.lookup(vector, CONTEXT, "v1") for vector in vectors] == [None, "1", "2"]
+
+
+def test_replay_streams_the_whole_answer():
+    answer = "Alpha is  the first\nletter. "
+    assert "".join(replay(answer)) == answer
+    assert list(replay(answer)) == ["Alpha ", "is  ", "the ", "first\n", "letter. "]
@@ -0,0 +1,69 @@
+import pytest
+
+from bm25 import BM25Index, tokenize
+
+
+def test_tokenize_keeps_accented_and_non_latin_words():
+    assert tokenize("Café 東京") == ["café", "東京"]
+    assert tokenize("हिंदी में पानी।") == ["हिंदी", "में", "पानी"]
+    assert tokenize("தமிழ்") == ["தமிழ்"]
+    assert tokenize("STRASSE") == tokenize("Straße")
+    # Decomposed and precomposed accents produce the same term
+    assert tokenize("café") == tokenize("café")
+
+
+def test_tokenize_splits_identifiers_into_parts():
+    assert tokenize("SKU-1234 ERR_42") == ["sku-1234", "sku", "1234", "err_42", "err", "42"]
+
+
+def test_search_matches_non_latin_terms():
+    index = BM25Index()
+    index.add("hi", "पानी की आपूर्ति")
+    index.add("fr", "le café est fermé")
+    index.add("en", "water supply")
+    assert [doc_id for doc_id, _ in index.search("पानी", 3)] == ["hi"]
+    assert [doc_id for doc_id, _ in index.search("CAFÉ", 3)] == ["fr"]
+
+
+def test_saved_index_scores_like_the_in_memory_one(tmp_path):
+    index = BM25Index()
+    for i in range(20):
+        index.add(f"doc:{i}", " ".join(["alpha"] * (i % 3 + 1) + ["beta"] * (i % 5) + [f"term{i}"]))
+    index.remove_many(["doc:3", "doc:4"])
+    expected = index.search("alpha beta", 5)
+    index.save(str(tmp_path))
+
+    loaded = BM25Index.load(str(tmp_path))
+    assert len(loaded) == 18
+    assert loaded.search("alpha beta", 5) == pytest.approx(expected)
+    assert loaded.search("term7", 3, allowed={"doc:8"}) == []
+
+    loaded.remove("doc:7")
+    loaded.add("doc:20", "term7 gamma")
+    assert [doc_id for doc_id, _ in loaded.search("term7", 3)] == ["doc:20"]
+
+
+def test_save_writes_only_the_changes(tmp_path):
+    first, second = tmp_path / "v1", tmp_path / "v2"
+    index = BM25Index()
+    for i in range(10):
+        index.add(f"doc:{i}", f"alpha term{i}")
+    index.save(str(first))
+    before = {path.name: path.read_bytes() for path in (first / "lexical").iterdir()}
+
+    index = BM25Index.load(str(first))
+    index.remove("doc:0")
+    index.add("doc:10", "alpha beta")
+    index.save(str(second))
+
+    # The first version is untouched and its segment is shared, not rewritten
+    assert {path.name: path.read_bytes() for path in (first / "lexical").iterdir()} == before
+    for name in before:
+        if name.endswith(".npy"):
+            assert (second / "lexical" / name).stat().st_ino == (first / "lexical" / name).stat().st_ino
+    assert len(list((second / "lexical").glob("*.ids.npy"))) == 2
+
+    loaded = BM25Index.load(str(second))
+    assert len(loaded) == 10
+    assert loaded.search("term0", 3) == []
+    assert [doc_id for doc_id, _ in loaded.search("beta", 3)] == ["doc:10"]
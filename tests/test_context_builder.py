@@ -0,0 +1,64 @@
+from langchain_core.documents import Document
+
+from context_builder import CHARS_PER_TOKEN, build_context, estimate_tokens, mmr_order
+from fakes import FakeEmbeddings
+
+TEXT = "".join(f"word{i:04d} " for i in range(400))
+
+
+def _chunk(start, end, doc="a", chunk_id=None):
+    text = TEXT[start:end]
+    return Document(
+        page_content=text,
+        metadata={"doc": doc, "source": f"{doc}.pdf", "start": start, "end": end, "tokens": estimate_tokens(text)},
+        id=chunk_id or f"{doc}:{start}",
+    )
+
+
+def test_overlapping_chunks_are_merged():
+    docs = [_chunk(0, 1000), _chunk(800, 1800), _chunk(0, 1000, doc="b")]
+    packed = build_context(docs, token_budget=10_000)
+    assert [(doc.metadata["doc"], doc.metadata["start"], doc.metadata["end"]) for doc in packed] == [
+        ("a", 0, 1000), ("a", 1000, 1800), ("b", 0, 1000),
+    ]
+    assert packed[1].page_content == TEXT[1000:1800]
+    assert packed[1].metadata["tokens"] == estimate_tokens(TEXT[1000:1800])
+    assert packed[1].id == "a:800"
+
+
+def test_chunks_covered_by_the_context_are_dropped():
+    docs = [_chunk(0, 1000), _chunk(500, 1020), Document(page_content="same"), Document(page_content="same")]
+    packed = build_context(docs, token_budget=10_000)
+    assert [doc.page_content for doc in packed] == [TEXT[:1000], "same"]
+
+
+def test_the_token_budget_is_respected():
+    docs = [_chunk(start, start + 400) for start in range(0, len(TEXT), 400)]
+    packed = build_context(docs, token_budget=350)
+    assert sum(doc.metadata["tokens"] for doc in packed) <= 350
+    assert [doc.metadata["start"] for doc in packed] == [0, 400, 800]
+
+    # A first chunk larger than the budget is truncated rather than dropped
+    packed = build_context([_chunk(0, 2000)], token_budget=100)
+    assert packed[0].page_content == TEXT[:100 * CHARS_PER_TOKEN]
+    assert build_context([]) == []
+
+
+def test_mmr_moves_redundant_chunks_after_distinct_ones():
+    embeddings = FakeEmbeddings(dim=32)
+    query = embeddings.embed_query("question")
+    relevant, other = embeddings.embed_documents(["relevant", "other"])
+    # A near-copy of the most relevant chunk, and a distinct less relevant one
+    best = [q + r for q, r in zip(query, relevant)]
+    copy = [b + 0.01 * o for b, o in zip(best, other)]
+    distinct = [0.3 * q + o for q, o in zip(query, other)]
+    assert mmr_order(query, [best, copy, distinct], lambda_mult=0.5) == [0, 2, 1]
+    assert mmr_order(query, [best, copy, distinct], lambda_mult=1.0) == [0, 1, 2]
+
+    # The context is packed in MMR order
+    vectors = [copy, distinct, best]
+    docs = [_chunk(0, 400, doc=doc) for doc in "abc"]
+    order = mmr_order(query, vectors)
+    assert order[0] == 2
+    packed = build_context(docs, query, vectors, token_budget=220)
+    assert packed == [docs[i] for i in order[:2]]
@@ -0,0 +1,91 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+import embedding_cache
+from embedding_cache import EmbeddingCache
+
+# Each worker stores vectors that identify their key, then checks that every
+# key it reads back still maps to its own vector. A small cache forces rows to
+# be grown, evicted and reused while the other worker does the same.
+WORKER = textwrap.dedent("""
+    import sys
+    from embedding_cache import EmbeddingCache
+
+    cache_dir, name = sys.argv[1], sys.argv[2]
+    cache = EmbeddingCache(cache_dir, max_entries=64)
+    for i in range(300):
+        cache.put_many([(f"{name}-{i}-{j}", [float(i), float(j), float(ord(name[0]))]) for j in range(3)])
+        keys = [f"{name}-{k}-{j}" for k in range(max(0, i - 5), i + 1) for j in range(3)]
+        for key, vector in zip(keys, cache.get_many(keys)):
+            _, k, j = key.split("-")
+            if vector is not None and vector != [float(k), float(j), float(ord(name[0]))]:
+                sys.exit(f"{key} returned {vector}")
+""")
+
+
+def test_two_processes_share_a_cache_dir(tmp_path):
+    cache_dir = str(tmp_path / "embedding_cache")
+    # The workers import the cache from the same directory as this process
+    path = [os.path.dirname(os.path.abspath(embedding_cache.__file__)), os.environ.get("PYTHONPATH")]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, path)))
+    workers = [
+        subprocess.Popen([sys.executable, "-c", WORKER, cache_dir, name], env=env, stderr=subprocess.PIPE, text=True)
+        for name in ("a", "b")
+    ]
+    for worker in workers:
+        _, stderr = worker.communicate(timeout=120)
+        assert worker.returncode == 0, stderr
+
+    # The persisted index is consistent too
+    cache = EmbeddingCache(cache_dir, max_entries=64)
+    assert cache.stats()["entries"] == 64
+    for name in ("a", "b"):
+        keys = [f"{name}-299-{j}" for j in range(3)]
+        for key, vector in zip(keys, cache.get_many(keys)):
+            if vector is not None:
+                assert vector == [299.0, float(key[-1]), float(ord(name))]
+
+
+def test_dimension_change_replaces_the_vectors(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_entries=8)
+    cache.put("a", [1.0, 2.0])
+    other = EmbeddingCache(str(tmp_path), max_entries=8)
+    assert other.get("a") == [1.0, 2.0]
+    other.put("b", [1.0, 2.0, 3.0])
+    assert cache.get("a") is None
+    assert cache.get("b") == [1.0, 2.0, 3.0]
+
+
+def test_crash_after_eviction_does_not_return_another_texts_vector(tmp_path, monkeypatch):
+    cache = EmbeddingCache(str(tmp_path), max_entries=2)
+    cache.put_many([("a", [1.0, 1.0]), ("b", [2.0, 2.0])])
+
+    # Simulate a crash after the new vector is written but before the final index is
+    original = cache._write_index
+
+    def crash_before_final_write(exclude=()):
+        if not exclude:
+            raise RuntimeError("crash")
+        original(exclude)
+
+    monkeypatch.setattr(cache, "_write_index", crash_before_final_write)
+    with pytest.raises(RuntimeError):
+        cache.put("c", [3.0, 3.0])
+
+    reopened = EmbeddingCache(str(tmp_path), max_entries=2)
+    assert reopened.get_many(["a", "b", "c"]) == [None, [2.0, 2.0], None]
+
+
+def test_evicted_entries_stay_evicted_after_reopening(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_entries=3)
+    cache.put_many([(key, [float(i)] * 2) for i, key in enumerate("abcde")])
+    assert cache.get_many(list("abcde")) == [None, None, [2.0, 2.0], [3.0, 3.0], [4.0, 4.0]]
+
+    reopened = EmbeddingCache(str(tmp_path), max_entries=3)
+    assert reopened.get_many(list("abcde")) == [None, None, [2.0, 2.0], [3.0, 3.0], [4.0, 4.0]]
+    reopened.put("f", [5.0, 5.0])
+    assert EmbeddingCache(str(tmp_path), max_entries=3).get_many(list("cdef")) == [None, [3.0, 3.0], [4.0, 4.0], [5.0, 5.0]]
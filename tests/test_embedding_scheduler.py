@@ -0,0 +1,78 @@
+import pytest
+
+from embedding_scheduler import EmbeddingScheduler, is_rate_limit_error
+from fakes import FakeEmbeddings, FakeRateLimitError
+
+TEXTS = [f"text {i}" for i in range(10)]
+
+
+# FakeEmbeddings that records the texts of every request, including failed ones
+class RecordingEmbeddings(FakeEmbeddings):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requests = []
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.requests.append(list(texts))
+        return super().embed_documents(texts)
+
+
+def _scheduler(embeddings, **kwargs):
+    kwargs.setdefault("max_workers", 1)
+    return EmbeddingScheduler(embeddings, requests_per_minute=60000, base_delay=0.0, **kwargs)
+
+
+def test_texts_are_split_into_batches():
+    embeddings = RecordingEmbeddings(dim=8)
+    scheduler = _scheduler(embeddings, batch_size=4)
+    assert scheduler.embed_documents(TEXTS) == [embeddings._vector(text) for text in TEXTS]
+    assert [len(batch) for batch in embeddings.requests] == [4, 4, 2]
+    assert scheduler.embed_documents([]) == []
+
+
+def test_concurrent_batches_keep_the_input_order():
+    embeddings = FakeEmbeddings(dim=8, latency=0.01)
+    scheduler = _scheduler(embeddings, batch_size=1, max_workers=4)
+    assert scheduler.embed_documents(TEXTS) == [embeddings._vector(text) for text in TEXTS]
+
+
+def test_a_rate_limited_batch_is_retried_alone():
+    # The third request fails with a 429
+    embeddings = RecordingEmbeddings(dim=8, rate_limit_every=3)
+    scheduler = _scheduler(embeddings, batch_size=4)
+    vectors = scheduler.embed_documents(TEXTS)
+    assert vectors == [embeddings._vector(text) for text in TEXTS]
+    assert embeddings.requests == [TEXTS[:4], TEXTS[4:8], TEXTS[8:], TEXTS[8:]]
+
+
+def test_retries_stop_after_max_retries():
+    embeddings = FakeEmbeddings(dim=8, rate_limit_every=1)
+    scheduler = _scheduler(embeddings, max_retries=2)
+    with pytest.raises(FakeRateLimitError):
+        scheduler.embed_documents(TEXTS)
+    assert embeddings.calls == 3
+
+
+def test_other_errors_are_not_retried():
+    class FailingEmbeddings(FakeEmbeddings):
+        def embed_documents(self, texts):
+            self._request()
+            raise ValueError("bad input")
+
+    embeddings = FailingEmbeddings(dim=8)
+    with pytest.raises(ValueError):
+        _scheduler(embeddings).embed_documents(TEXTS)
+    assert embeddings.calls == 1
+    assert not is_rate_limit_error(ValueError("bad input"))
+    assert is_rate_limit_error(FakeRateLimitError("429"))
+
+
+def test_stats_count_chunks_requests_and_retries():
+    scheduler = _scheduler(FakeEmbeddings(dim=8, rate_limit_every=3), batch_size=4)
+    scheduler.embed_documents(TEXTS)
+    scheduler.embed_query("question")
+    stats = scheduler.stats()
+    assert (stats["chunks"], stats["requests"], stats["retries"]) == (10, 5, 1)
+    assert stats["seconds"] > 0
+    assert stats["chunks_per_second"] == pytest.approx(10 / stats["seconds"])
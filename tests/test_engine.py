@@ -0,0 +1,159 @@
+import asyncio
+import functools
+
+import pytest
+
+import engine
+import index_factory
+from engine import Engine
+from extraction import PDF_TYPE, SourceFile
+from fakes import FakeChatModel, FakeEmbeddings
+from index_manager import IndexRegistry
+from ingest import IngestCheckpoint, stream_hash
+from session_store import SessionStore
+from streaming import coalesce
+
+EMBEDDINGS = FakeEmbeddings(dim=16)
+
+
+# Registry using the fake embeddings directly, without the on-disk cache
+class _Registry(IndexRegistry):
+    def get_embeddings(self):
+        return EMBEDDINGS
+
+
+# Function to make an upload whose single page is `words` repeated in sentences
+def _file(name, word, sentences=40):
+    text = " ".join(f"{word.capitalize()} sentence number {i} about {word}." for i in range(sentences))
+    return SourceFile(name, PDF_TYPE, data=text.encode("utf-8"))
+
+
+def _hash(file):
+    with engine.open_stream(file) as stream:
+        return stream_hash(stream)
+
+
+@pytest.fixture
+def extracted(monkeypatch):
+    # Uploads hold plain text standing for one extracted page; records the
+    # names of the files read
+    names = []
+
+    def iter_pages(path, file_type, executor):
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        names.append(text.split()[0].lower())
+        yield 1, text
+
+    monkeypatch.setattr(engine, "count_pages", lambda path, file_type: 1)
+    monkeypatch.setattr(engine, "iter_pages", iter_pages)
+    return names
+
+
+@pytest.fixture
+def docs_engine(tmp_path, extracted):
+    return Engine("session", _Registry(SessionStore(str(tmp_path / "index")), gc_interval=0))
+
+
+# Function to return every chunk in the published index
+def _chunks(docs_engine):
+    vectorstore, _ = docs_engine.index_manager.get_vectorstore()
+    return [vectorstore.docstore.search(doc_id) for doc_id in vectorstore.index_to_docstore_id.values()]
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_reingest_adds_changed_files_and_deletes_removed_ones(docs_engine, extracted, monkeypatch, index_type):
+    # HNSW indexes cannot delete in place, so removal goes through to_flat()
+    monkeypatch.setattr(
+        index_factory, "optimize_vectorstore", functools.partial(index_factory.optimize_vectorstore, index_type=index_type)
+    )
+    alpha, beta, gamma = _file("a.pdf", "alpha"), _file("b.pdf", "beta"), _file("c.pdf", "gamma")
+    added, removed, unchanged = docs_engine.ingest_files([alpha, beta, gamma])
+    assert (len(added), removed, unchanged) == (3, [], [])
+    assert index_factory.index_type_of(docs_engine.index_manager.get_vectorstore()[0].index) == index_type
+    assert sorted(docs_engine.sources()) == ["a.pdf", "b.pdf", "c.pdf"]
+
+    extracted.clear()
+    changed = _file("b.pdf", "delta")
+    added, removed, unchanged = docs_engine.ingest_files([alpha, changed])
+    assert added == [_hash(changed)]
+    assert sorted(removed) == sorted([_hash(beta), _hash(gamma)])
+    assert unchanged == [_hash(alpha)]
+    # Only the changed file is extracted again
+    assert extracted == ["delta"]
+
+    chunks = _chunks(docs_engine)
+    assert sorted(docs_engine.sources()) == ["a.pdf", "b.pdf"]
+    assert {(doc.metadata["source"], doc.page_content.split()[0]) for doc in chunks} == {
+        ("a.pdf", "Alpha"), ("b.pdf", "Delta"),
+    }
+    for doc in docs_engine.query("beta gamma sentence", k=len(chunks)):
+        assert "beta" not in doc.page_content and "gamma" not in doc.page_content
+
+    # Nothing changed: nothing is extracted or published
+    version = docs_engine.index_manager.get_vectorstore()[1]
+    assert docs_engine.ingest_files([alpha, changed]) == ([], [], [_hash(alpha), _hash(changed)])
+    assert docs_engine.index_manager.get_vectorstore()[1] == version
+
+
+def test_an_interrupted_ingest_resumes_from_its_checkpoint(docs_engine, extracted, tmp_path):
+    files = [_file("a.pdf", "alpha"), _file("b.pdf", "beta")]
+    checkpoint = IngestCheckpoint(str(tmp_path / "checkpoint"), interval=0)
+
+    # Cancel while the second file is embedded, after the first was checkpointed
+    def cancel_on_beta():
+        if extracted[-1] == "beta":
+            raise RuntimeError("cancelled")
+
+    with pytest.raises(RuntimeError):
+        docs_engine.ingest_files(files, checkpoint=checkpoint, check_cancelled=cancel_on_beta)
+    assert docs_engine.sources() == []
+
+    extracted.clear()
+    added, _, _ = docs_engine.ingest_files(files, checkpoint=IngestCheckpoint(str(tmp_path / "checkpoint"), interval=0))
+    assert added == [_hash(file) for file in files]
+    # The checkpointed file is not extracted again
+    assert extracted == ["beta"]
+    chunks = _chunks(docs_engine)
+    assert sorted(docs_engine.sources()) == ["a.pdf", "b.pdf"]
+    assert len({doc.id for doc in chunks}) == len(chunks)
+    assert {doc.page_content.split()[0] for doc in chunks} == {"Alpha", "Beta"}
+
+
+# Slow fake model that records whether its stream was cancelled
+class _SlowChatModel(FakeChatModel):
+    def __init__(self):
+        super().__init__(tokens_per_second=200, answer_words=1000)
+        self.cancelled = False
+
+    async def astream(self, prompt):
+        try:
+            async for chunk in super().astream(prompt):
+                yield chunk
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+def test_stopping_an_async_answer_early_cancels_the_model_stream(docs_engine, monkeypatch):
+    docs_engine.ingest_files([_file("a.pdf", "alpha")])
+    model = _SlowChatModel()
+    monkeypatch.setattr(docs_engine.registry, "get_chat_model", lambda: model)
+
+    async def read_pieces(count):
+        pieces = []
+        stream = coalesce(docs_engine.answer_async("alpha", use_answer_cache=False), interval=0.0, max_chars=8)
+        async for piece in stream:
+            pieces.append(piece)
+            if len(pieces) == count:
+                break
+        await stream.aclose()
+        await asyncio.sleep(0)
+        # Checked before asyncio.run() cancels whatever is left
+        return pieces, model.cancelled, asyncio.all_tasks() - {asyncio.current_task()}
+
+    pieces, cancelled, pending = asyncio.run(read_pieces(5))
+    assert len(pieces) == 5
+    assert all(len(piece) <= 8 for piece in pieces)
+    assert cancelled
+    assert not pending
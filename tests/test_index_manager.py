@@ -0,0 +1,101 @@
+import functools
+
+import pytest
+
+from langchain_community.vectorstores import FAISS
+
+import index_factory
+import index_manager
+from bm25 import BM25Index
+from fakes import FakeEmbeddings
+from index_manager import IndexManager
+from ingest import IngestManifest
+from session_store import SessionStore
+from snapshot import ArenaDocstore
+
+TEXTS = [f"chunk {i} about topic {i % 4}" for i in range(12)]
+
+
+def _manager(tmp_path):
+    embeddings = FakeEmbeddings(dim=16)
+    return IndexManager(SessionStore(str(tmp_path)), "session", lambda: embeddings)
+
+
+def _save(manager, texts, base_version=None, metadatas=None):
+    ids = [f"doc:{i}" for i in range(len(texts))]
+    vectorstore = FAISS.from_texts(texts, manager.get_embeddings(), metadatas=metadatas, ids=ids, docstore=ArenaDocstore())
+    lexical_index = BM25Index()
+    for chunk_id, text in zip(ids, texts):
+        lexical_index.add(chunk_id, text)
+    manager.save(vectorstore, IngestManifest(), lexical_index, base_version)
+
+
+def test_stats_count_one_lookup_per_question(tmp_path):
+    manager = _manager(tmp_path)
+    _save(manager, TEXTS)
+    # The version swapped in by save() is a load
+    stats = manager.stats()
+    assert (stats["hits"], stats["misses"]) == (0, 1)
+    assert stats["last_load_seconds"] > 0
+
+    for question in ("topic 1", "topic 2", "topic 1"):
+        docs = manager.similarity_search(question, k=3)
+        manager.chunk_vectors(docs)
+        manager.sources()
+    stats = manager.stats()
+    assert (stats["hits"], stats["misses"]) == (3, 1)
+    assert stats["load_seconds_saved"] == 3 * stats["last_load_seconds"]
+
+
+def test_a_reader_loads_the_published_version_once(tmp_path):
+    _save(_manager(tmp_path), TEXTS)
+    reader = _manager(tmp_path)
+    reader.similarity_search("topic 1", k=3)
+    reader.similarity_search("topic 3", k=3)
+    stats = reader.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_results_are_cached_under_the_version_they_came_from(tmp_path, monkeypatch):
+    manager = _manager(tmp_path)
+    _save(manager, TEXTS)
+    _, first = manager.get_vectorstore()
+    acquire = manager._acquire
+
+    # A new version is swapped in between loading the index and searching it
+    def acquire_then_publish():
+        loaded = acquire()
+        monkeypatch.setattr(manager, "_acquire", acquire)
+        _save(manager, ["replacement text"], base_version=first)
+        return loaded
+
+    monkeypatch.setattr(manager, "_acquire", acquire_then_publish)
+    docs, version = manager.retrieve("topic 1", k=3)
+    assert version == first
+    assert all(doc.page_content in TEXTS for doc in docs)
+
+    docs, version = manager.retrieve("topic 1", k=3)
+    assert version != first
+    assert [doc.page_content for doc in docs] == ["replacement text"]
+
+
+@pytest.mark.parametrize("hybrid", [False, True])
+@pytest.mark.parametrize("index_type", ["flat", "ivf", "hnsw"])
+def test_a_sources_filter_returns_only_chunks_of_those_sources(tmp_path, monkeypatch, index_type, hybrid):
+    monkeypatch.setattr(
+        index_factory, "optimize_vectorstore", functools.partial(index_factory.optimize_vectorstore, index_type=index_type)
+    )
+    monkeypatch.setattr(index_manager, "HYBRID_SEARCH", hybrid)
+    manager = _manager(tmp_path)
+    # The query words only appear in b.pdf, which also holds most chunks
+    texts = [f"alpha passage {i}" for i in range(40)] + [f"beta query words {i}" for i in range(200)]
+    sources = ["a.pdf"] * 40 + ["b.pdf"] * 200
+    _save(manager, texts, metadatas=[{"source": source} for source in sources])
+    assert index_factory.index_type_of(manager.get_vectorstore()[0].index) == index_type
+
+    unfiltered = manager.similarity_search("beta query words", k=10)
+    assert "b.pdf" in {doc.metadata["source"] for doc in unfiltered}
+    docs = manager.similarity_search("beta query words", k=10, sources=["a.pdf"])
+    assert len(docs) == 10
+    assert {doc.metadata["source"] for doc in docs} == {"a.pdf"}
+    assert manager.similarity_search("beta query words", k=10, sources=["missing.pdf"]) == []
@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+
+import pytest
+
+from langchain_community.vectorstores import FAISS
+
+import jobs
+from bm25 import BM25Index
+from extraction import PDF_TYPE, SourceFile
+from fakes import FakeEmbeddings
+from ingest import IngestCheckpoint, IngestManifest
+from snapshot import ArenaDocstore
+
+EMBEDDINGS = FakeEmbeddings(dim=8)
+
+
+# Stand-in for Engine: ingest_files() runs the test's `ingest` function
+class FakeEngine:
+    ingest = None
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+
+    def ingest_files(self, files, progress=None, remove_missing=True, checkpoint=None, check_cancelled=None):
+        return FakeEngine.ingest(files, progress, checkpoint, check_cancelled)
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "Engine", FakeEngine)
+    return jobs.JobQueue(str(tmp_path / "jobs.sqlite3"), str(tmp_path / "jobs"), workers=0)
+
+
+@pytest.fixture
+def upload(tmp_path):
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(b"%PDF-1.4 fake")
+    return SourceFile("doc.pdf", PDF_TYPE, path=str(path))
+
+
+def _set_heartbeat(queue, job_id, heartbeat_at):
+    with queue._connect() as db:
+        db.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (heartbeat_at, job_id))
+
+
+def test_a_job_is_claimed_once(queue, upload):
+    job_id = queue.submit("session", [upload])
+    assert queue._claim()["id"] == job_id
+    assert queue._claim() is None
+    assert queue.get(job_id)["status"] == jobs.RUNNING
+
+
+def test_queues_sharing_a_database_never_claim_the_same_job(queue, upload):
+    job_ids = {queue.submit("session", [upload]) for _ in range(20)}
+    other = jobs.JobQueue(queue.db_path, queue.jobs_dir, workers=0)
+    claimed = []
+
+    def claim_all(job_queue):
+        while (job := job_queue._claim()) is not None:
+            claimed.append(job["id"])
+
+    threads = [threading.Thread(target=claim_all, args=(job_queue,)) for job_queue in (queue, other, queue, other)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == sorted(job_ids)
+
+
+def test_cancelling_a_queued_job_removes_it(queue, upload):
+    job_id = queue.submit("session", [upload])
+    queue.cancel(job_id)
+    assert queue.get(job_id)["status"] == jobs.CANCELLED
+    assert not os.path.exists(queue._job_dir(job_id))
+    assert queue._claim() is None
+
+
+def test_reset_while_running_stops_the_job_before_it_publishes(queue, upload):
+    job_id = queue.submit("session", [upload])
+    published = []
+
+    def ingest(files, progress, checkpoint, check_cancelled):
+        progress("doc.pdf", 1, 2)
+        # The session is reset while the job works
+        for job in queue.jobs("session"):
+            queue.cancel(job["id"])
+        progress("doc.pdf", 2, 2)
+        check_cancelled()
+        published.append(files)
+        return [], [], []
+
+    FakeEngine.ingest = ingest
+    queue._run(queue._claim())
+    job = queue.get(job_id)
+    assert job["status"] == jobs.CANCELLED
+    assert job["result"] is None
+    assert published == []
+    assert not os.path.exists(queue._job_dir(job_id))
+
+
+def test_a_stale_job_resumes_from_its_checkpoint(queue, upload):
+    job_id = queue.submit("session", [upload])
+    first = queue._claim()
+    # A fresh heartbeat keeps other workers away
+    assert queue._claim() is None
+
+    # The first worker checkpoints one document, then its process dies
+    texts = ["first chunk", "second chunk"]
+    vectorstore = FAISS.from_texts(texts, EMBEDDINGS, ids=["a:0", "a:1"], docstore=ArenaDocstore())
+    manifest = IngestManifest()
+    manifest.add("a", "a.pdf", ["a:0", "a:1"])
+    lexical_index = BM25Index()
+    for chunk_id, text in zip(["a:0", "a:1"], texts):
+        lexical_index.add(chunk_id, text)
+    checkpoint = IngestCheckpoint(os.path.join(queue._job_dir(first["id"]), "checkpoint"))
+    checkpoint.save(None, vectorstore, manifest, lexical_index, force=True)
+    _set_heartbeat(queue, job_id, time.time() - jobs.JOB_STALE_SECONDS - 1)
+
+    restored = []
+
+    def ingest(files, progress, checkpoint, check_cancelled):
+        vectorstore, manifest, _ = checkpoint.load(None, EMBEDDINGS)
+        restored.append((sorted(manifest.documents), len(vectorstore.index_to_docstore_id)))
+        return ["b"], [], ["a"]
+
+    FakeEngine.ingest = ingest
+    second = queue._claim()
+    assert second["id"] == job_id
+    queue._run(second)
+    assert restored == [(["a"], 2)]
+    job = queue.get(job_id)
+    assert job["status"] == jobs.DONE
+    assert job["attempts"] == 2
+    assert (job["result"]["added"], job["result"]["unchanged"]) == (1, 1)
+
+
+def test_the_heartbeat_is_refreshed_during_long_phases(queue, upload, monkeypatch):
+    monkeypatch.setattr(jobs, "_HEARTBEAT_SECONDS", 0.05)
+    job_id = queue.submit("session", [upload])
+    beats = []
+
+    def ingest(files, progress, checkpoint, check_cancelled):
+        beats.append(queue.get(job_id)["heartbeat_at"])
+        time.sleep(0.3)
+        beats.append(queue.get(job_id)["heartbeat_at"])
+        return [], [], []
+
+    FakeEngine.ingest = ingest
+    queue._run(queue._claim())
+    assert beats[1] > beats[0]
+    assert queue.get(job_id)["status"] == jobs.DONE
+
+
+def test_a_failed_job_records_its_error(queue, upload):
+    job_id = queue.submit("session", [upload])
+
+    def ingest(files, progress, checkpoint, check_cancelled):
+        raise ValueError("broken file")
+
+    FakeEngine.ingest = ingest
+    queue._run(queue._claim())
+    job = queue.get(job_id)
+    assert job["status"] == jobs.FAILED
+    assert job["error"] == "ValueError: broken file"
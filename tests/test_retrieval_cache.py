@@ -0,0 +1,62 @@
+from fakes import FakeEmbeddings
+from retrieval_cache import LRUCache, RetrievalCache, normalize_question
+
+
+# Function to make a search function that counts its calls
+def _search(calls):
+    def search(vector):
+        calls.append(vector)
+        return [f"result {len(calls)}"]
+
+    return search
+
+
+def test_normalized_questions_share_an_entry():
+    assert normalize_question("  What is  Alpha?? ") == normalize_question("what is alpha")
+    embeddings = FakeEmbeddings(dim=8)
+    cache = RetrievalCache(maxsize=8)
+    calls = []
+    first = cache.search(embeddings, "What is alpha?", "v1", 3, _search(calls))
+    assert cache.search(embeddings, "what is  alpha", "v1", 3, _search(calls)) == first
+    assert len(calls) == 1
+    assert embeddings.calls == 1
+    # A different k or source filter is a separate entry
+    cache.search(embeddings, "what is alpha", "v1", 5, _search(calls))
+    cache.search(embeddings, "what is alpha", "v1", 3, _search(calls), sources=["a.pdf"])
+    assert len(calls) == 3
+    assert embeddings.calls == 1
+
+
+def test_a_new_index_version_invalidates_results_but_not_query_vectors():
+    embeddings = FakeEmbeddings(dim=8)
+    cache = RetrievalCache(maxsize=8)
+    calls = []
+    cache.search(embeddings, "question", "v1", 3, _search(calls))
+    assert cache.search(embeddings, "question", "v2", 3, _search(calls)) == ["result 2"]
+    assert cache.search(embeddings, "question", "v2", 3, _search(calls)) == ["result 2"]
+    assert len(calls) == 2
+    assert embeddings.calls == 1
+
+
+def test_lru_cache_evicts_the_least_recently_used_entry():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert [cache.get(key) for key in "abc"] == [1, None, 3]
+    stats = cache.stats()
+    assert (stats["size"], stats["hits"], stats["misses"]) == (2, 3, 1)
+
+
+def test_a_search_that_finishes_after_a_newer_version_is_not_cached():
+    embeddings = FakeEmbeddings(dim=8)
+    cache = RetrievalCache(maxsize=8)
+
+    # The v1 search is still running when a v2 search completes
+    def slow_v1_search(vector):
+        cache.search(embeddings, "question", "v2", 3, lambda vector: ["new"])
+        return ["old"]
+
+    assert cache.search(embeddings, "question", "v1", 3, slow_v1_search) == ["old"]
+    assert cache.search(embeddings, "question", "v2", 3, lambda vector: ["searched again"]) == ["new"]
@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+from session_store import SessionStore, StaleVersionError
+
+
+def _write(path):
+    os.makedirs(path)
+    with open(os.path.join(path, "data"), "w", encoding="utf-8") as f:
+        f.write("x")
+
+
+def test_garbage_collection_skips_namespaces_being_written(tmp_path):
+    store = SessionStore(str(tmp_path))
+    store.publish("session", _write)
+    with store.writer_lock("session"):
+        assert store.collect_garbage(idle_seconds=0, grace_seconds=0) == []
+        assert store.current_version("session") is not None
+    assert store.collect_garbage(idle_seconds=0, grace_seconds=0) == ["session"]
+
+    # A writer starting after the namespace was removed gets a fresh lock file
+    with store.writer_lock("session"):
+        assert os.path.exists(os.path.join(store.namespace_dir("session"), "WRITE_LOCK"))
+
+
+def test_publish_on_a_cleared_namespace_is_discarded(tmp_path):
+    store = SessionStore(str(tmp_path))
+    base = store.publish("session", _write)
+    # Clearing does not wait for the writer, whose publish then fails
+    with store.writer_lock("session"):
+        store.clear("session")
+        with pytest.raises(StaleVersionError):
+            store.publish("session", _write, base_version=base)
+    assert store.current_version("session") is None
+    assert [entry for entry in os.listdir(store.namespace_dir("session")) if entry.startswith("v-")] == [base]
+    assert store.publish("session", _write, base_version=None) is not None
@@ -0,0 +1,115 @@
+import functools
+import os
+
+import faiss
+import numpy as np
+import pytest
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+import snapshot
+from fakes import FakeEmbeddings
+from index_factory import build_compact_index, build_index, index_type_of
+from snapshot import ArenaDocstore, load_snapshot, write_snapshot
+
+EMBEDDINGS = FakeEmbeddings(dim=16)
+
+
+# Function to build a vector store of `count` random chunks with metadata. Like
+# real embeddings, the vectors mostly vary along a few directions.
+def _vectorstore(count, index_type="flat", compression="none", dim=16):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((count, 6)) @ rng.standard_normal((6, dim)) + 0.01 * rng.standard_normal((count, dim))
+    vectors = vectors.astype(np.float32)
+    ids = [f"doc:{i}" for i in range(count)]
+    docstore = ArenaDocstore(compression)
+    docstore.add({
+        doc_id: Document(
+            page_content=f"chunk {i} — café",
+            metadata={"source": f"file{i % 3}.pdf", "page": i + 1, "start": i * 10, "end": i * 10 + 9},
+            id=doc_id,
+        )
+        for i, doc_id in enumerate(ids)
+    })
+    index = build_index(vectors, index_type)
+    return FAISS(EMBEDDINGS, index, docstore, dict(enumerate(ids))), vectors
+
+
+def _neighbours(vectorstore, queries, k=5):
+    _, positions = vectorstore.index.search(queries, k)
+    return [[vectorstore.index_to_docstore_id[i] for i in row] for row in positions]
+
+
+def _assert_round_trip(original, loaded):
+    assert loaded.index.ntotal == original.index.ntotal
+    assert loaded.index_to_docstore_id == original.index_to_docstore_id
+    for doc_id in original.index_to_docstore_id.values():
+        doc, expected = loaded.docstore.search(doc_id), original.docstore.search(doc_id)
+        assert (doc.id, doc.page_content, doc.metadata) == (doc_id, expected.page_content, expected.metadata)
+
+
+@pytest.mark.parametrize("compression", ["none", "zstd"])
+@pytest.mark.parametrize("read_only", [True, False])
+def test_snapshot_round_trip(tmp_path, compression, read_only):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    original, vectors = _vectorstore(200, compression=compression)
+    write_snapshot(original, str(tmp_path), compression=compression, compact=False)
+    loaded = load_snapshot(str(tmp_path), EMBEDDINGS, read_only=read_only)
+    _assert_round_trip(original, loaded)
+    assert _neighbours(loaded, vectors[:20]) == _neighbours(original, vectors[:20])
+    assert loaded.docstore.search("missing") == "ID missing not found."
+
+    # A store loaded for update can be changed and saved again
+    if not read_only:
+        loaded.delete(["doc:0"])
+        write_snapshot(loaded, str(tmp_path / "next"), compression=compression, compact=False)
+        reloaded = load_snapshot(str(tmp_path / "next"), EMBEDDINGS)
+        assert len(reloaded.docstore) == 199
+        assert reloaded.docstore.search("doc:1").page_content == "chunk 1 — café"
+
+
+@pytest.mark.parametrize("storage, dim, reduction", [("int8", 0, "truncate"), ("float16", 8, "pca")])
+def test_compact_copy_is_served_with_exact_rescoring(tmp_path, monkeypatch, storage, dim, reduction):
+    monkeypatch.setattr(snapshot, "VECTOR_STORAGE", storage)
+    monkeypatch.setattr(snapshot, "VECTOR_REDUCTION", reduction)
+    monkeypatch.setattr(
+        snapshot, "build_compact_index",
+        functools.partial(build_compact_index, storage=storage, dim=dim, reduction=reduction),
+    )
+    original, vectors = _vectorstore(400)
+    write_snapshot(original, str(tmp_path), compression="none")
+    assert os.path.exists(os.path.join(tmp_path, snapshot.COMPACT_VECTORS_FILE))
+
+    loaded = load_snapshot(str(tmp_path), EMBEDDINGS)
+    assert isinstance(faiss.downcast_index(loaded.index), faiss.IndexRefine)
+    assert loaded.docstore.vector_storage == {
+        "storage": storage, "dim": dim or 16, "reduction": reduction if dim else None,
+    }
+    _assert_round_trip(original, loaded)
+    # Candidates re-scored against the exact vectors rank like the original
+    assert [row[0] for row in _neighbours(loaded, vectors[:50])] == [f"doc:{i}" for i in range(50)]
+    expected, found = _neighbours(original, vectors[:50]), _neighbours(loaded, vectors[:50])
+    recall = np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(expected, found)])
+    assert recall >= 0.9
+    assert np.allclose(loaded.index.reconstruct(7), vectors[7])
+
+    # Loads for update read the exact vectors only
+    updatable = load_snapshot(str(tmp_path), EMBEDDINGS, read_only=False)
+    assert index_type_of(updatable.index) == "flat"
+    assert _neighbours(updatable, vectors[:20]) == _neighbours(original, vectors[:20])
+
+
+def test_ivfpq_round_trip_keeps_its_exact_vectors(tmp_path):
+    original, vectors = _vectorstore(10_000, index_type="ivfpq", dim=8)
+    assert isinstance(faiss.downcast_index(original.index), faiss.IndexRefine)
+    write_snapshot(original, str(tmp_path), compression="none")
+
+    for read_only in (True, False):
+        loaded = load_snapshot(str(tmp_path), EMBEDDINGS, read_only=read_only)
+        assert isinstance(faiss.downcast_index(loaded.index), faiss.IndexRefine)
+        assert index_type_of(loaded.index) == "ivfpq"
+        assert loaded.docstore.search("doc:9999").metadata["page"] == 10_000
+        assert _neighbours(loaded, vectors[:20]) == _neighbours(original, vectors[:20])
+        assert np.allclose(loaded.index.reconstruct(42), vectors[42])
@@ -0,0 +1,94 @@
+import random
+from bisect import bisect_right
+
+import pytest
+
+from context_builder import estimate_tokens
+from splitter import TextSplitter
+
+WORDS = "contract clause supplier payment invoice delivery warranty pump valve pressure sensor".split()
+
+
+def _sentence(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 14))).capitalize() + "."
+
+
+def _paragraph_pages(rng, count=6):
+    return [
+        (number, "\n\n".join(" ".join(_sentence(rng) for _ in range(rng.randint(2, 6))) for _ in range(rng.randint(2, 5))))
+        for number in range(1, count + 1)
+    ]
+
+
+def _long_line_pages(rng, count=4):
+    return [(number, " ".join(_sentence(rng) for _ in range(rng.randint(20, 40)))) for number in range(1, count + 1)]
+
+
+def _short_line_pages(rng, count=4):
+    return [(number, "\n".join(_sentence(rng) for _ in range(rng.randint(20, 45)))) for number in range(1, count + 1)]
+
+
+# Function to check every chunk against the document text and the bounds
+def _check(splitter, pages):
+    text = "\n".join(page for _, page in pages)
+    page_starts = []
+    offset = 0
+    for _, page in pages:
+        page_starts.append(offset)
+        offset += len(page) + 1
+
+    chunks = list(splitter.split_pages(pages))
+    assert chunks
+    previous_end = 0
+    for chunk, metadata in chunks:
+        assert 0 < len(chunk) <= splitter.chunk_size
+        assert chunk == chunk.strip()
+        assert text[metadata["start"]:metadata["end"]] == chunk
+        assert metadata["page"] == pages[bisect_right(page_starts, metadata["start"]) - 1][0]
+        assert metadata["page_end"] == pages[bisect_right(page_starts, metadata["end"] - 1) - 1][0]
+        assert metadata["tokens"] == estimate_tokens(chunk)
+        # Chunks move forward and repeat at most chunk_overlap characters
+        assert metadata["start"] >= previous_end - splitter.chunk_overlap
+        assert metadata["end"] > previous_end
+        previous_end = metadata["end"]
+
+    # Nothing but whitespace is left out
+    covered = [False] * len(text)
+    for _, metadata in chunks:
+        covered[metadata["start"]:metadata["end"]] = [True] * (metadata["end"] - metadata["start"])
+    assert all(covered[i] or text[i].isspace() for i in range(len(text)))
+    return chunks
+
+
+@pytest.mark.parametrize("make_pages", [_paragraph_pages, _long_line_pages, _short_line_pages])
+@pytest.mark.parametrize("chunk_size, chunk_overlap", [(1000, 200), (300, 50), (120, 0)])
+def test_chunks_respect_size_overlap_and_offsets(make_pages, chunk_size, chunk_overlap):
+    pages = make_pages(random.Random(chunk_size))
+    _check(TextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap), pages)
+
+
+def test_chunks_spanning_pages_record_first_and_last_page():
+    pages = [(3, "alpha " * 30), (4, "beta " * 30), (5, "gamma " * 30)]
+    chunks = _check(TextSplitter(chunk_size=500, chunk_overlap=0), pages)
+    assert chunks[0][1]["page"] == 3
+    assert chunks[-1][1]["page_end"] == 5
+    assert any(metadata["page"] != metadata["page_end"] for _, metadata in chunks)
+
+
+def test_sections_start_new_chunks_without_overlap():
+    first = "First section. " * 20
+    second = "Second section. " * 20
+    pages = [(1, first.strip() + "\n  \n" + second.strip())]
+    chunks = _check(TextSplitter(chunk_size=400, chunk_overlap=100), pages)
+    assert [chunk for chunk, _ in chunks] == [first.strip(), second.strip()]
+
+
+def test_words_longer_than_a_chunk_are_cut():
+    pages = [(1, "x" * 250 + " tail")]
+    chunks = _check(TextSplitter(chunk_size=100, chunk_overlap=20), pages)
+    assert chunks[0][0] == "x" * 100
+    assert chunks[-1][0].endswith("tail")
+
+
+def test_empty_pages_yield_nothing():
+    assert list(TextSplitter().split_pages([(1, ""), (2, "  \n ")])) == []
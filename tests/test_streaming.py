@@ -0,0 +1,48 @@
+import asyncio
+
+from streaming import coalesce
+
+PIECES = ["a" * 3, "b" * 7, "c" * 25, "d" * 9, "e", "f" * 12, "g" * 4]
+
+
+# Function to stream pieces asynchronously, recording in `closed` when the
+# stream is closed
+async def _source(pieces, closed):
+    try:
+        for piece in pieces:
+            await asyncio.sleep(0)
+            yield piece
+    finally:
+        closed.append(True)
+
+
+async def _collect(updates, limit=None):
+    collected = []
+    async for update in updates:
+        collected.append(update)
+        if limit is not None and len(collected) == limit:
+            break
+    await updates.aclose()
+    return collected
+
+
+def test_updates_are_never_longer_than_max_chars():
+    closed = []
+    updates = asyncio.run(_collect(coalesce(_source(PIECES, closed), interval=60.0, max_chars=10)))
+    assert "".join(updates) == "".join(PIECES)
+    assert all(0 < len(update) <= 10 for update in updates)
+    # The first piece is emitted at once, later ones once 10 characters are buffered
+    assert updates[:3] == ["aaa", "bbbbbbb", "c" * 10]
+    assert closed
+
+
+def test_each_piece_is_an_update_once_the_interval_has_passed():
+    updates = asyncio.run(_collect(coalesce(_source(PIECES, []), interval=0.0, max_chars=100)))
+    assert updates == PIECES
+
+
+def test_stopping_early_closes_the_source():
+    closed = []
+    updates = asyncio.run(_collect(coalesce(_source(PIECES * 100, closed), interval=60.0, max_chars=20), limit=2))
+    assert len(updates) == 2
+    assert closed